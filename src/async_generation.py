@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步生成接口
+Asyncio Generation API
+
+在 asyncio 事件循环中生成交易数据文件而不阻塞事件循环：
+- 生成在线程池中执行，FullTransactionMerger.generate_file 以流式输出方式写入桥接对象，
+  每写入一块（文件头 / 每批记录 / 文件尾）就交给事件循环中的异步迭代器
+- 背压: 未被消费的数据块数达到上限时生成线程暂停，消费者取走数据后继续
+- 提前停止读取时应调用 aclose()（或以 async with 使用数据块流），生成线程随之结束
+- 多个文件可以在同一个事件循环中并发生成，每个生成任务使用由同一个基础合并器 fork 出的合并器
+  （共享已加载的字典和流水号计数器，并发生成的流水号不重复；生成结束后放回池中复用）
+- 未指定输出文件名的任务在标准文件名后追加任务序号（同一秒内并发生成的文件名不会相同）；
+  generate_to 写入带 path 属性的输出（如 AsyncFileSink）时，附属文件按该路径命名
+
+    async with AsyncTransactionGenerator() as generator:
+        async for chunk in generator.stream("M", count=5000):
+            await sink.write(chunk)
+        await asyncio.gather(*(generator.generate_to(AsyncFileSink(path), "M", 1000) for path in paths))
+
+注意: 并发生成的任务共用 random 模块的全局随机状态，指定种子也不能保证并发时结果可复现。
+"""
+
+import asyncio
+import inspect
+import itertools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from full_txn_merger import FullTransactionMerger
+
+# 每个生成任务未被消费的数据块上限（每块约一批记录，见 WRITE_BATCH_SIZE）
+DEFAULT_MAX_PENDING = 4
+# 同时执行的生成任务上限（线程池大小）
+DEFAULT_MAX_CONCURRENCY = 32
+
+_DONE = object()
+
+
+class GenerationCancelled(Exception):
+    """消费者提前停止迭代时在生成线程中抛出，用于结束生成"""
+
+
+class _ChunkWriter:
+    """生成线程中的输出流：每次写入编码为字节后交给事件循环，等待可用额度实现背压"""
+
+    def __init__(self, stream: "AsyncBatchStream"):
+        self._stream = stream
+
+    def write(self, data: str) -> int:
+        stream = self._stream
+        stream._credits.acquire()
+        if stream._cancelled.is_set():
+            raise GenerationCancelled("消费者已停止读取")
+        stream._loop.call_soon_threadsafe(stream._queue.put_nowait, data.encode("ascii"))
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class AsyncBatchStream:
+    """异步数据块流类：以异步迭代器方式逐块返回生成的文件内容(bytes)
+    迭代结束后 path 为生成函数的返回值（附属文件对应的文件路径）
+    """
+
+    def __init__(self, start: Callable[["_ChunkWriter"], "asyncio.Future"], max_pending: int = DEFAULT_MAX_PENDING):
+        """初始化
+        Args:
+            start: 启动生成的函数，参数为输出流，返回执行生成的 Future
+            max_pending: 未被消费的数据块上限
+        """
+        if max_pending < 1:
+            raise ValueError(f"未消费数据块上限必须大于0: {max_pending}")
+        self._start = start
+        self._max_pending = max_pending
+        self._credits = threading.Semaphore(max_pending)
+        self._cancelled = threading.Event()
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._future: Optional[asyncio.Future] = None
+        self.path: Optional[str] = None
+
+    def __aiter__(self) -> "AsyncBatchStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._future is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._future = self._start(_ChunkWriter(self))
+            self._future.add_done_callback(lambda _: self._queue.put_nowait(_DONE))
+        item = await self._queue.get()
+        if item is _DONE:
+            self.path = await self._future  # 生成中的异常在此重新抛出
+            raise StopAsyncIteration
+        self._credits.release()
+        return item
+
+    def cancel(self):
+        """通知生成线程结束（不等待）"""
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        for _ in range(self._max_pending):
+            self._credits.release()
+
+    async def aclose(self):
+        """停止读取：通知生成线程结束并等待其退出"""
+        if self._future is None or self._future.done():
+            return
+        self.cancel()
+        try:
+            await self._future
+        except GenerationCancelled:
+            pass
+
+    async def __aenter__(self) -> "AsyncBatchStream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class AsyncFileSink:
+    """异步文件输出类：写入在线程池中执行"""
+
+    def __init__(self, path: str, executor=None):
+        self.path = path
+        self._executor = executor
+        self._file = None
+
+    async def write(self, data: bytes):
+        loop = asyncio.get_running_loop()
+        if self._file is None:
+            self._file = await loop.run_in_executor(self._executor, open, self.path, "wb")
+        await loop.run_in_executor(self._executor, self._file.write, data)
+
+    async def close(self):
+        if self._file is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._file.close)
+            self._file = None
+
+
+async def _write_to_sink(sink: Any, data: bytes):
+    """写入异步输出：支持 write 为协程的对象，以及 asyncio.StreamWriter 等 write + drain 的对象"""
+    result = sink.write(data)
+    if inspect.isawaitable(result):
+        await result
+    drain = getattr(sink, "drain", None)
+    if drain is not None:
+        await drain()
+
+
+class AsyncTransactionGenerator:
+    """异步交易数据生成器类"""
+
+    def __init__(self, config_dir: str = "config", max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_pending: int = DEFAULT_MAX_PENDING, **merger_options: Any):
+        """初始化
+        Args:
+            config_dir: 配置目录
+            max_concurrency: 同时执行的生成任务上限，超出的任务排队等待
+            max_pending: 每个生成任务未被消费的数据块上限
+            merger_options: 创建 FullTransactionMerger 的其他关键字参数（如 unique_doc_numbers）
+        """
+        self.config_dir = config_dir
+        self.max_pending = max_pending
+        self.merger_options = merger_options
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="galaxy-gen")
+        # 基础合并器（首次生成时加载字典）及由其 fork 出的空闲合并器，生成任务之间复用
+        self._base: Optional[FullTransactionMerger] = None
+        self._idle: List[FullTransactionMerger] = []
+        self._lock = threading.Lock()
+        # 生成任务序号，用作标准文件名的后缀
+        self._task_numbers = itertools.count(1)
+        # 未关闭的数据块流，关闭生成器时通知其生成线程结束，避免线程因等待背压额度而无法退出
+        self._streams = weakref.WeakSet()
+
+    def _run(self, method: str, *args: Any, **kwargs: Any):
+        """在生成线程中执行：取出(或 fork)一个空闲合并器调用其方法，结束后放回"""
+        with self._lock:
+            merger = self._idle.pop() if self._idle else None
+            if merger is None:
+                if self._base is None:
+                    self._base = FullTransactionMerger(self.config_dir, **self.merger_options)
+                merger = self._base.fork()
+        try:
+            return getattr(merger, method)(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._idle.append(merger)
+
+    def _task_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """未指定输出文件名和后缀时，按任务序号追加标准文件名后缀（同 BatchRunner）"""
+        if not kwargs.get("output_filename") and not kwargs.get("filename_suffix"):
+            with self._lock:
+                number = next(self._task_numbers)
+            kwargs = dict(kwargs, filename_suffix=f"_{number:03d}")
+        return kwargs
+
+    def stream(self, file_type: str, count: int = 1, **kwargs: Any) -> AsyncBatchStream:
+        """流式生成一个文件，以异步迭代器方式逐块返回文件内容(bytes)
+        Args:
+            file_type: 文件类型 B 或 M
+            count: 交易记录数量
+            kwargs: generate_file 的其他参数（output_stream 除外；不能生成索引文件）
+        """
+        kwargs = self._task_kwargs(kwargs)
+
+        def start(writer: _ChunkWriter) -> asyncio.Future:
+            return asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: self._run("generate_file", file_type, count,
+                                                  output_stream=writer, **kwargs))
+
+        stream = AsyncBatchStream(start, self.max_pending)
+        self._streams.add(stream)
+        return stream
+
+    async def generate_to(self, sink: Any, file_type: str, count: int = 1, **kwargs: Any) -> str:
+        """生成一个文件写入异步输出（如 AsyncFileSink、asyncio.StreamWriter），输出较慢时生成随之暂停
+        输出有 path 属性且未指定 output_filename 时，附属文件按该路径命名（<路径>.control.json 等，
+        路径不以 .txt 结尾时补全），否则按带任务序号的标准文件名写入输出目录
+        Returns:
+            str: 附属文件(控制文件等)对应的文件路径
+        """
+        sink_path = getattr(sink, "path", None)
+        if isinstance(sink_path, str) and not kwargs.get("output_filename"):
+            kwargs = dict(kwargs, output_filename=os.path.abspath(sink_path))
+        stream = self.stream(file_type, count, **kwargs)
+        async with stream:
+            async for chunk in stream:
+                await _write_to_sink(sink, chunk)
+        if isinstance(sink, AsyncFileSink):
+            await sink.close()
+        return stream.path
+
+    async def generate_file(self, file_type: str, count: int = 1, **kwargs: Any) -> str:
+        """在线程池中生成文件到输出目录（与 FullTransactionMerger.generate_file 参数相同）
+        未指定 output_filename 时标准文件名追加任务序号，同一秒内并发生成的文件互不覆盖
+        """
+        kwargs = self._task_kwargs(kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: self._run("generate_file", file_type, count, **kwargs))
+
+    def close(self):
+        """结束未读完的数据块流并关闭线程池"""
+        for stream in list(self._streams):
+            stream.cancel()
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncTransactionGenerator":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务运行器
+Batch Job Runner
+
+读取带 // 注释的JSON任务配置（单个任务或任务列表），在进程池中并发生成文件，
+所有工作进程共享同一份预加载的字典快照，运行结束后输出每个任务的耗时和输出路径。
+任务可指定 processing_date，按该日期的时钟生成历史文件；补数时按日期范围每天生成一个任务，
+结束后写入列出全部输出文件的清单。
+指定运行清单时记录每个任务的输出文件和完成状态，配合检查点间隔，中断后以 resume 方式重新运行
+会跳过已完成的文件，未完成的文件从各自的检查点继续。
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from txn_errors import ConfigError, FileTypeError
+from checkpoint import JOB_DONE, JOB_RUNNING, run_params_digest, start_run_manifest, update_run_manifest
+from common_transaction import SERIAL_COUNTER_DIGITS
+from full_txn_merger import FullTransactionMerger
+from fault_injection import FaultInjector, parse_fault_spec
+from linked_scenarios import LinkedScenario
+from progress import PROGRESS_REPORTERS, ConsoleProgress
+from galaxy_layout import MAX_RECORDS_PER_FILE
+from reconciliation import CONTROL_FILE_SUFFIX
+from utils.clock import FixedClock, SystemClock, date_range, parse_date
+from utils.json_comments import load_json_with_comments
+from utils.unique_numbers import UniqueDocumentNumbers
+
+# 决定任务输出内容的参数（运行清单按其摘要校验恢复的运行与原运行一致）
+_JOB_PARAMS = ("index", "file_type", "count", "business_types", "output", "faults", "fault_seed",
+               "processing_date", "seed")
+
+# 工作进程内的预热合并器（由进程池初始化函数设置）
+_worker_merger = None
+# 运行清单的进程间共享锁
+_manifest_lock = None
+
+
+def _init_worker(merger: FullTransactionMerger, manifest_lock=None):
+    """进程池初始化函数：接收父进程预加载好的合并器作为字典快照
+    Args:
+        manifest_lock: 运行清单的共享锁
+    """
+    global _worker_merger, _manifest_lock
+    _worker_merger = merger
+    _manifest_lock = manifest_lock
+
+
+def _job_seed(seed: Optional[int], index: int) -> Optional[int]:
+    """由批次种子派生各任务的种子，未指定种子时各任务使用系统熵"""
+    return None if seed is None else seed * 1000003 + index
+
+
+def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中执行单个任务"""
+    merger = _worker_merger
+    # 各工作进程的合并器都来自同一份快照（随机状态相同），每个任务都重新设置随机源；
+    # 流水号计数从本任务的起始值开始（由任务顺序决定，与在哪个进程中执行无关）
+    merger.reseed_random(job.get("seed"))
+    merger.common.transaction_counter = job.get("serial_base", 0) + 1
+    if job.get("run_key") is not None:
+        # 文档号唯一模式：每个任务一个分片，保证整个批次内不重复
+        merger.use_doc_numbers(UniqueDocumentNumbers(job["run_key"], job["index"] - 1, job["shard_count"]))
+    # 工作进程会复用合并器执行多个任务，每个任务都重新设置时钟；指定种子时时钟固定不推进（可复现）
+    if job.get("clock_date"):
+        merger.use_clock(FixedClock.for_date(job["clock_date"], job.get("clock_time", "09:00:00"),
+                                             advance=job.get("seed") is None))
+    else:
+        merger.use_clock(SystemClock())
+    result = {
+        "index": job["index"],
+        "processing_date": job.get("processing_date"),
+        "file_type": job["file_type"],
+        "count": job["count"],
+        "output": None,
+        "elapsed": 0.0,
+        "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        progress = None
+        if job.get("progress") == "bar":
+            # 多个任务并发输出，逐行打印并标注任务序号
+            progress = ConsoleProgress(inline=False, label=str(job["index"]))
+        elif job.get("progress"):
+            progress = PROGRESS_REPORTERS[job["progress"]](label=str(job["index"]))
+        faults = None
+        if job.get("faults"):
+            faults = FaultInjector(job["faults"], job.get("fault_seed"))
+        filepath = job.get("filepath")
+        manifest_path = job.get("run_manifest")
+        if manifest_path is not None:
+            # 先在运行清单中记录输出路径，中断后按该路径找到本文件的检查点
+            if filepath is None:
+                filepath = merger.output_path(job["file_type"], job.get("output"), job.get("filename_suffix", ""))
+            update_run_manifest(manifest_path, job["index"], filepath, JOB_RUNNING, _manifest_lock)
+        result["output"] = merger.generate_file(
+            file_type=job["file_type"],
+            count=job["count"],
+            output_filename=job.get("output"),
+            business_types=job.get("business_types"),
+            filename_suffix=job.get("filename_suffix", ""),
+            write_control=job.get("write_control", True),
+            faults=faults,
+            progress=progress,
+            checkpoint_every=job.get("checkpoint_every"),
+            resume=job.get("resume", False),
+            filepath=filepath,
+        )
+        if manifest_path is not None:
+            update_run_manifest(manifest_path, job["index"], result["output"], JOB_DONE, _manifest_lock)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def load_batch_config(config_path: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """读取批量任务配置
+    支持三种写法：
+    1. 单个任务: {"file_type": "M", "business_types": [...]}
+    2. 任务列表: [{...}, {...}]
+    3. 带全局选项: {"workers": 4, "unique_doc_numbers": true, "linked": {"rate": 0.05}, "jobs": [{...}, ...]}
+    任务可通过 "faults" / "fault_seed" 配置故障注入（规格串见 fault_injection 模块），
+    通过 "processing_date" (YYYY-MM-DD) 按指定处理日期生成，通过 "seed" 指定本任务的随机种子
+    （全局选项 "seed" 为批次种子，未单独指定的任务由它和任务序号派生）
+    Returns:
+        Tuple[List[Dict], Dict]: (规范化后的任务列表, 全局选项)
+    """
+    data = load_json_with_comments(config_path)
+    options: Dict[str, Any] = {}
+    if isinstance(data, list):
+        raw_jobs = data
+    elif isinstance(data, dict) and "jobs" in data:
+        raw_jobs = data["jobs"]
+        options = {key: value for key, value in data.items() if key != "jobs"}
+    elif isinstance(data, dict):
+        raw_jobs = [data]
+    else:
+        raise ConfigError(f"配置文件格式错误: {config_path}")
+    if not raw_jobs:
+        raise ConfigError(f"配置文件中没有任务: {config_path}")
+    return [_normalize_job(raw, index) for index, raw in enumerate(raw_jobs, 1)], options
+
+
+def _normalize_job(raw: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """校验并规范化单个任务配置"""
+    if not isinstance(raw, dict):
+        raise ConfigError(f"第{index}个任务配置格式错误: {raw}")
+    file_type = raw.get("file_type")
+    if file_type not in ["B", "M"]:
+        raise FileTypeError(f"第{index}个任务的文件类型不支持: {file_type}，只支持 B 或 M")
+    business_types = raw.get("business_types")
+    if business_types:
+        count = sum(int(item.get("count", 1)) for item in business_types)
+    else:
+        count = int(raw.get("count", 1))
+    if not 1 <= count <= MAX_RECORDS_PER_FILE:
+        raise ConfigError(f"第{index}个任务的交易记录数量必须在1-{MAX_RECORDS_PER_FILE}之间，当前值: {count}")
+    processing_date = raw.get("processing_date")
+    if processing_date:
+        processing_date = parse_date(str(processing_date)).isoformat()
+    if raw.get("faults"):
+        # 提前校验故障规格，避免进入进程池后才报错
+        parse_fault_spec(raw["faults"])
+    return {
+        "index": index,
+        "file_type": file_type,
+        "count": count,
+        "business_types": business_types,
+        "output": raw.get("output"),
+        "faults": raw.get("faults"),
+        "fault_seed": raw.get("fault_seed"),
+        "seed": raw.get("seed"),
+        "processing_date": processing_date,
+    }
+
+
+def build_backfill_jobs(start: str, end: str, file_type: str, count: int,
+                        business_types: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """按日期范围生成补数任务（每个处理日期一个文件）
+    Args:
+        start: 起始处理日期 (YYYY-MM-DD)
+        end: 结束处理日期 (含)
+        file_type: 文件类型 B 或 M
+        count: 每天的交易记录数量
+        business_types: 每天的业务类型配置，为空时按 count 随机选择交易类型
+    """
+    raw_jobs = [{
+        "file_type": file_type,
+        "count": count,
+        "business_types": business_types,
+        "processing_date": day.isoformat(),
+    } for day in date_range(start, end)]
+    return [_normalize_job(raw, index) for index, raw in enumerate(raw_jobs, 1)]
+
+
+def write_backfill_manifest(results: List[Dict[str, Any]], manifest_path: str,
+                            **extra: Any) -> str:
+    """写入补数清单（按处理日期列出输出文件、控制文件、耗时和错误）"""
+    files = []
+    for result in sorted(results, key=lambda result: result["processing_date"] or ""):
+        output = result["output"]
+        control_file = output + CONTROL_FILE_SUFFIX if output else None
+        files.append({
+            "processing_date": result["processing_date"],
+            "file_type": result["file_type"],
+            "count": result["count"],
+            "output": output,
+            "control_file": control_file if control_file and os.path.exists(control_file) else None,
+            "elapsed": round(result["elapsed"], 3),
+            "error": result["error"],
+        })
+    content = {
+        **extra,
+        "file_count": sum(1 for item in files if item["error"] is None),
+        "failed_count": sum(1 for item in files if item["error"] is not None),
+        "files": files,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(content, f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+
+class BatchRunner:
+    """批量任务运行器类"""
+
+    def __init__(self, config_dir: str = "config", workers: int = None,
+                 unique_doc_numbers: bool = False, run_key: str = None,
+                 write_control: bool = True, linked: Dict[str, Any] = None,
+                 progress: str = None, seed: int = None):
+        """初始化运行器
+        Args:
+            config_dir: 配置目录
+            workers: 进程池大小，默认为CPU核数
+            unique_doc_numbers: 是否启用文档号唯一模式（整个批次内不重复）
+            run_key: 文档号唯一模式的运行密钥，不同批次不能重用（计数器不持久化，重用会重新发放相同的文档号）
+            write_control: 是否为每个输出文件写入对账控制文件
+            linked: 关联交易场景参数 (LinkedScenario 的关键字参数)，每个工作进程一个蓄水池，
+                    只有同一进程内执行的任务之间可以相互关联，关联链不跨工作进程；
+                    多进程运行时不能指定 state_path（各进程的蓄水池会互相覆盖同一个状态文件）
+            progress: 进度输出方式 (bar / json)，输出到标准错误，为空时不输出进度
+            seed: 批次随机种子，未指定种子的任务由它和任务序号派生；为空时各任务使用系统熵
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.unique_doc_numbers = unique_doc_numbers
+        self.run_key = run_key
+        self.write_control = write_control
+        if progress and progress not in PROGRESS_REPORTERS:
+            raise ConfigError(f"不支持的进度输出方式: {progress}，支持: {', '.join(PROGRESS_REPORTERS)}")
+        self.progress = progress
+        self.seed = seed
+        # 在父进程中预加载一次全部字典，作为所有工作进程共享的快照
+        self.merger = FullTransactionMerger(config_dir)
+        if linked:
+            self.merger.use_linked_scenario(LinkedScenario(**linked))
+
+    def run(self, jobs: List[Dict[str, Any]], run_manifest: str = None, checkpoint_every: int = None,
+            resume: bool = False) -> List[Dict[str, Any]]:
+        """并发执行任务列表
+        Args:
+            run_manifest: 运行清单路径，指定时记录每个任务的输出文件和完成状态
+            checkpoint_every: 每个文件的检查点间隔(记录数)，需要指定运行清单
+            resume: 按运行清单恢复中断的运行：跳过已完成的文件，未完成的文件从检查点继续
+        Returns:
+            List[Dict]: 按任务序号排序的执行结果（跳过的任务 skipped 为真）
+        """
+        if (checkpoint_every is not None or resume) and run_manifest is None:
+            raise ConfigError("批量任务使用检查点或恢复运行时必须指定运行清单")
+        jobs = [dict(job) for job in jobs]
+        run_key = None
+        if self.unique_doc_numbers:
+            run_key = self.run_key or UniqueDocumentNumbers().run_key
+        # 处理日期各不相同时，标准文件名中的时间戳已能区分各任务
+        dates = [job.get("processing_date") for job in jobs]
+        distinct_dates = None not in dates and len(set(dates)) == len(dates)
+        today = date.today().isoformat()
+        for job in jobs:
+            job["run_key"] = run_key
+            job["shard_count"] = len(jobs)
+            if len(jobs) > 1 and not job.get("output") and not distinct_dates:
+                # 并发任务可能在同一秒内生成，标准文件名追加任务序号避免覆盖
+                job["filename_suffix"] = f"_{job['index']:03d}"
+            if job.get("seed") is None:
+                job["seed"] = _job_seed(self.seed, job["index"])
+            # 时钟日期：处理日期，指定种子时默认为当天（与命令行 --seed 相同）
+            job["clock_date"] = job.get("processing_date") or (today if job["seed"] is not None else None)
+            job["write_control"] = self.write_control
+            job["progress"] = self.progress
+
+        self._assign_serial_bases(jobs)
+
+        skipped = []
+        if run_manifest is not None:
+            manifest = start_run_manifest(run_manifest, run_params_digest(jobs, _JOB_PARAMS), resume,
+                                          run_key=run_key, run_date=today)
+            pending = []
+            for job in jobs:
+                # 恢复的运行沿用原运行的文档号密钥和时钟日期（隔天恢复时文件内容仍与原运行一致）
+                job["run_key"] = manifest.get("run_key")
+                if job["clock_date"] is not None and not job.get("processing_date"):
+                    job["clock_date"] = manifest.get("run_date", today)
+                entry = manifest["jobs"].get(str(job["index"]))
+                if entry is not None and entry["status"] == JOB_DONE and os.path.exists(entry["output"]):
+                    skipped.append({
+                        "index": job["index"], "processing_date": job.get("processing_date"),
+                        "file_type": job["file_type"], "count": job["count"], "output": entry["output"],
+                        "elapsed": 0.0, "error": None, "skipped": True,
+                    })
+                    continue
+                if entry is not None:
+                    # 未完成的文件按原路径从检查点继续
+                    job["filepath"] = entry["output"]
+                    job["resume"] = True
+                job["run_manifest"] = run_manifest
+                job["checkpoint_every"] = checkpoint_every
+                pending.append(job)
+            jobs = pending
+            if not jobs:
+                return sorted(skipped, key=lambda result: result["index"])
+
+        workers = min(self.workers, len(jobs))
+        linked = self.merger.linked
+        if workers > 1 and linked is not None and linked.state_path:
+            raise ConfigError("多进程批量任务不能使用关联场景状态文件（关联链不跨工作进程），"
+                              "请去掉状态文件或使用 --workers 1")
+        if workers <= 1:
+            _init_worker(self.merger)
+            return sorted(skipped + [_run_job(job) for job in jobs], key=lambda result: result["index"])
+
+        results = skipped
+        manifest_lock = multiprocessing.Lock() if run_manifest is not None else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.merger, manifest_lock)) as executor:
+            futures = [executor.submit(_run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+        return sorted(results, key=lambda result: result["index"])
+
+    @staticmethod
+    def _assign_serial_bases(jobs: List[Dict[str, Any]]):
+        """为每个任务确定流水号计数的起始值：时钟日期相同的任务按任务顺序依次排列计数区间，
+        同一时钟日期内的流水号计数互不重叠（与并行写入按记录序号编号相同），结果与进程数和调度顺序无关
+        """
+        totals: Dict[Any, int] = defaultdict(int)
+        for job in jobs:
+            day = job["clock_date"]
+            job["serial_base"] = totals[day]
+            totals[day] += job["count"]
+        capacity = 10 ** SERIAL_COUNTER_DIGITS
+        for day, total in totals.items():
+            # 时钟固定在同一日期时刻的任务共用同一段时间戳，总记录数不能超过流水号计数的容量
+            if day is not None and total > capacity:
+                raise ConfigError(f"处理日期 {day} 的任务记录总数 {total} 超过流水号计数容量 {capacity}，"
+                                  f"同一日期的流水号会重复，请分为多个批次")
+
+    @staticmethod
+    def print_summary(results: List[Dict[str, Any]], total_elapsed: float):
+        """打印批量任务汇总"""
+        print(f"\n📋 批量任务汇总 (共 {len(results)} 个任务, 总耗时 {total_elapsed:.2f}s)")
+        print(f"    {'序号':<4} {'类型':<4} {'记录数':>8} {'耗时(s)':>9} {'记录/秒':>10}  输出")
+        for result in results:
+            elapsed = result["elapsed"]
+            rate = result["count"] / elapsed if elapsed > 0 else 0.0
+            status = result["output"] if result["error"] is None else f"❌ {result['error']}"
+            if result.get("skipped"):
+                status = f"♻️ 已完成(跳过) {status}"
+            print(f"    {result['index']:<4} {result['file_type']:<4} {result['count']:>8} "
+                  f"{elapsed:>9.2f} {rate:>10.0f}  {status}")
+        failed = sum(1 for result in results if result["error"] is not None)
+        if failed:
+            print(f"    ⚠️ 失败任务数: {failed}")
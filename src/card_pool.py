@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+卡号池
+Card Pool
+
+生成、存储和抽样大批量卡号：
+1. 按BIN范围分组批量生成唯一且通过Luhn校验的卡号（numpy向量化，千万级秒级完成）
+2. 每张卡有独立的有效期(YYMM)
+3. 卡号池保存为 .npy 结构化数组（附带 .json 元数据），抽样时以内存映射方式打开
+4. 抽样支持倾斜分布（少量热点卡 / Zipf），用于复现按卡聚合的负载
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from txn_errors import CardNumberError, ConfigError
+
+# 卡号池记录结构: 卡号(整数), 有效期(YYMM), BIN分组下标
+POOL_DTYPE = np.dtype([("pan", "<u8"), ("expiry", "<u2"), ("bin_group", "<u2")])
+# CARD_NUMBER字段最长19位
+MAX_PAN_LENGTH = 19
+
+
+def luhn_check_digits(bodies: np.ndarray, body_length: int) -> np.ndarray:
+    """向量化计算Luhn校验位
+    Args:
+        bodies: 不含校验位的卡号主体(uint64数组)
+        body_length: 卡号主体位数
+    Returns:
+        np.ndarray: 每个卡号的校验位
+    """
+    remaining = bodies.copy()
+    total = np.zeros(len(bodies), dtype=np.uint64)
+    for position in range(body_length):
+        digit = remaining % 10
+        remaining //= 10
+        if position % 2 == 0:
+            # 从右往左数(校验位之前)的奇数位乘2，大于9时减9
+            digit = digit * 2
+            digit = np.where(digit > 9, digit - 9, digit)
+        total += digit
+    return (10 - total % 10) % 10
+
+
+def is_luhn_valid(pan: str) -> bool:
+    """校验单个卡号是否通过Luhn校验"""
+    total = 0
+    for position, char in enumerate(reversed(pan)):
+        digit = int(char)
+        if position % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def _month_index(yymm: str) -> int:
+    """YYMM转为月份序号"""
+    if len(yymm) != 4 or not yymm.isdigit() or not 1 <= int(yymm[2:]) <= 12:
+        raise ConfigError(f"有效期格式错误，应为YYMM: {yymm}")
+    return int(yymm[:2]) * 12 + int(yymm[2:]) - 1
+
+
+def generate_card_pool(bin_ranges: List[Dict[str, Any]], count: int,
+                       expiry_from: str = "2701", expiry_to: str = "3912",
+                       seed: Optional[int] = None) -> np.ndarray:
+    """批量生成唯一且通过Luhn校验的卡号池
+    Args:
+        bin_ranges: BIN范围列表，如 [{"bin": "557726", "length": 16, "weight": 3}, ...]
+        count: 卡号总数（按weight分配到各BIN范围）
+        expiry_from: 最早有效期(YYMM)
+        expiry_to: 最晚有效期(YYMM)
+        seed: 随机种子
+    Returns:
+        np.ndarray: POOL_DTYPE结构化数组，顺序已随机打乱
+    """
+    if not bin_ranges:
+        raise CardNumberError("至少需要一个BIN范围")
+    if count < 1:
+        raise CardNumberError(f"卡号数量必须大于0，当前值: {count}")
+    rng = np.random.default_rng(seed)
+
+    weights = np.array([float(item.get("weight", 1)) for item in bin_ranges])
+    group_counts = np.floor(weights / weights.sum() * count).astype(np.int64)
+    group_counts[0] += count - group_counts.sum()
+
+    first_month, last_month = _month_index(expiry_from), _month_index(expiry_to)
+    if last_month < first_month:
+        raise ConfigError(f"有效期范围错误: {expiry_from} - {expiry_to}")
+
+    pool = np.empty(count, dtype=POOL_DTYPE)
+    start = 0
+    for group, (item, group_count) in enumerate(zip(bin_ranges, group_counts)):
+        bin_prefix = str(item["bin"])
+        length = int(item.get("length", 16))
+        if not bin_prefix.isdigit() or bin_prefix.startswith("0"):
+            raise CardNumberError(f"BIN格式错误: {bin_prefix}")
+        if length > MAX_PAN_LENGTH:
+            raise CardNumberError(f"卡号长度不能超过{MAX_PAN_LENGTH}位: {length}")
+        account_digits = length - len(bin_prefix) - 1
+        if account_digits < 1:
+            raise CardNumberError(f"BIN {bin_prefix} 过长，卡号长度为 {length}")
+        domain = 10 ** account_digits
+        if group_count > domain:
+            raise CardNumberError(f"BIN {bin_prefix} 最多只能生成 {domain} 个卡号，请求数量 {group_count}")
+
+        # 账户号无放回抽样保证唯一，再拼接BIN并追加Luhn校验位
+        accounts = rng.choice(domain, size=int(group_count), replace=False).astype(np.uint64)
+        bodies = np.uint64(int(bin_prefix) * domain) + accounts
+        pans = bodies * np.uint64(10) + luhn_check_digits(bodies, length - 1)
+
+        months = rng.integers(first_month, last_month + 1, size=int(group_count))
+        end = start + int(group_count)
+        pool["pan"][start:end] = pans
+        pool["expiry"][start:end] = (months // 12) * 100 + months % 12 + 1
+        pool["bin_group"][start:end] = group
+        start = end
+
+    # 打乱顺序，使热点卡/Zipf排名与BIN分组无关
+    return pool[rng.permutation(count)]
+
+
+def save_card_pool(pool: np.ndarray, path: str, bin_ranges: List[Dict[str, Any]]):
+    """保存卡号池(.npy)及元数据(.json)"""
+    np.save(path, pool)
+    meta = {"count": int(len(pool)), "bin_ranges": bin_ranges}
+    with open(_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def load_card_pool(path: str) -> np.ndarray:
+    """以内存映射方式打开卡号池"""
+    pool = np.load(path, mmap_mode="r")
+    if pool.dtype != POOL_DTYPE:
+        raise CardNumberError(f"卡号池格式错误: {path}")
+    if len(pool) == 0:
+        raise CardNumberError(f"卡号池为空: {path}")
+    return pool
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+class CardSampler:
+    """卡号池抽样器类
+    批量抽取下标并转换为Python值，抽样开销按批摊销。
+    skew 配置:
+        {"mode": "uniform"}                                  均匀分布（默认）
+        {"mode": "hot", "hot_cards": 10, "hot_share": 0.3}   前10张卡占30%的交易
+        {"mode": "zipf", "exponent": 1.1}                    按排名的Zipf分布
+    """
+
+    def __init__(self, pool: np.ndarray, skew: Optional[Dict[str, Any]] = None,
+                 seed: Optional[int] = None, batch_size: int = 4096):
+        self.pool = pool
+        self.skew = dict(skew or {"mode": "uniform"})
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        # 已抽取的缓冲每个线程各一份，取卡不加锁；只有补充缓冲时加锁使用共享的随机数生成器
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        mode = self.skew.get("mode", "uniform")
+        if mode not in ("uniform", "hot", "zipf"):
+            raise ConfigError(f"不支持的卡号抽样分布: {mode}")
+        if mode == "hot":
+            hot_cards = int(self.skew.get("hot_cards", 1))
+            hot_share = float(self.skew.get("hot_share", 0.5))
+            if not 1 <= hot_cards <= len(pool) or not 0.0 <= hot_share <= 1.0:
+                raise ConfigError(f"热点卡配置错误: hot_cards={hot_cards}, hot_share={hot_share}")
+        self._mode = mode
+
+    @classmethod
+    def from_config(cls, dict_dir: str, config: Dict[str, Any]) -> "CardSampler":
+        """根据 card_numbers.yaml 中 card_pools 的配置创建抽样器"""
+        path = config["path"]
+        if not os.path.isabs(path):
+            path = os.path.join(dict_dir, path)
+        return cls(load_card_pool(path), config.get("skew"), config.get("seed"))
+
+    def reseed(self, seed: Optional[int]):
+        """重置随机种子并丢弃所有线程已抽取的缓冲"""
+        with self._lock:
+            self.rng = np.random.default_rng(seed)
+            self._local = threading.local()
+
+    @property
+    def _buffer(self) -> List[Tuple[int, int]]:
+        """当前线程已抽取的缓冲"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = []
+        return buffer
+
+    @_buffer.setter
+    def _buffer(self, buffer: List[Tuple[int, int]]):
+        self._local.buffer = buffer
+
+    def _draw_indices(self, size: int) -> np.ndarray:
+        """按配置的分布抽取一批卡号下标"""
+        total = len(self.pool)
+        if self._mode == "hot":
+            hot_cards = int(self.skew.get("hot_cards", 1))
+            hot = self.rng.random(size) < float(self.skew.get("hot_share", 0.5))
+            return np.where(hot, self.rng.integers(0, hot_cards, size), self.rng.integers(0, total, size))
+        if self._mode == "zipf":
+            # 连续幂律分布的逆CDF近似，O(1)抽样，无需预计算排名表
+            exponent = float(self.skew.get("exponent", 1.1))
+            u = self.rng.random(size)
+            if abs(exponent - 1.0) < 1e-9:
+                ranks = np.power(float(total), u)
+            else:
+                power = 1.0 - exponent
+                ranks = np.power((total ** power - 1.0) * u + 1.0, 1.0 / power)
+            return np.clip(ranks.astype(np.int64) - 1, 0, total - 1)
+        return self.rng.integers(0, total, size)
+
+    def next(self) -> Tuple[str, str]:
+        """抽取一张卡
+        Returns:
+            Tuple[str, str]: (卡号, 有效期YYMM)
+        """
+        buffer = self._buffer
+        if not buffer:
+            with self._lock:
+                indices = self._draw_indices(self.batch_size)
+            cards = self.pool[indices]
+            buffer = list(zip(cards["pan"].tolist(), cards["expiry"].tolist()))
+            buffer.reverse()
+            self._buffer = buffer
+        pan, expiry = buffer.pop()
+        return str(pan), f"{expiry:04d}"
+
+    def __getstate__(self):
+        # 跨进程传递时保留内存映射的文件路径，避免序列化整个卡号池
+        # 锁和线程局部缓冲不能跨进程传递，只保留当前线程的缓冲
+        state = self.__dict__.copy()
+        if isinstance(self.pool, np.memmap):
+            state["pool"] = self.pool.filename
+        del state["_local"], state["_lock"]
+        state["buffer"] = list(self._buffer)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state["pool"], str):
+            state["pool"] = load_card_pool(state["pool"])
+        buffer = state.pop("buffer", [])
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffer = buffer
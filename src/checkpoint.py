@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成检查点
+Generation Checkpoint
+
+长时间运行的 generate_file 每隔一定记录数在批次边界写入检查点(<输出文件>.ckpt)，保存：
+随机数状态（全局 random、随机令牌服务、卡号池抽样器、故障注入器）、流水号计数器、唯一文档号已发放数、
+已写入记录数、对账汇总的中间结果以及数据文件的字节偏移。
+任务中断后以 resume 方式重新运行时，将数据文件截断到检查点偏移（丢弃不完整的记录）并从该处继续，
+在时钟固定不推进(指定 --seed/--date)时输出与未中断的运行逐字节相同。
+
+多合作方一次生成多个文件时，整个运行一个检查点(<第一个合作方文件>.ckpt)，另外保存每个文件的偏移、
+剩余记录数和对账汇总。批量任务/补数等由多个文件组成的运行另有运行清单(<名称>.run.json)，
+记录每个任务的输出文件及是否已完成：恢复时跳过已完成的文件，未完成的文件从各自的检查点继续。
+
+检查点和运行清单均为JSON文件，先写临时文件再替换，中断在任何时刻都不会留下损坏的文件。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional, Sequence
+
+from txn_errors import ConfigError
+
+CHECKPOINT_FILE_SUFFIX = ".ckpt"
+CHECKPOINT_VERSION = 2
+RUN_MANIFEST_SUFFIX = ".run.json"
+RUN_MANIFEST_VERSION = 1
+# 运行清单中任务的状态
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+
+def params_digest(file_type: str, count: int, transaction_types: Optional[List[str]],
+                  faults: Any, write_index: bool) -> str:
+    """决定输出内容的生成参数摘要，恢复时必须与检查点一致"""
+    digest = hashlib.sha256()
+    digest.update(f"{file_type}:{count}:{write_index}:".encode("ascii"))
+    digest.update("".join(transaction_types or ()).encode("ascii"))
+    if faults is not None:
+        digest.update(f":{faults.spec}:{faults.seed}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def capture_state(merger, totals=None, faults=None) -> Dict[str, Any]:
+    """保存合并器及本次生成的可变状态（多合作方生成时各文件的对账汇总另行保存，totals 为空）"""
+    common = merger.common
+    state = {
+        "random": random.getstate(),
+        "tokens": merger.tokens.getstate(),
+        "transaction_counter": common.transaction_counter,
+        "card_samplers": {
+            partner: {"rng": sampler.rng.bit_generator.state, "buffer": sampler._buffer}
+            for partner, sampler in common.card_samplers.items()
+        },
+        "doc_numbers": None,
+        "totals": dict(vars(totals)) if totals is not None else None,
+        "faults": None,
+    }
+    if merger.doc_numbers is not None:
+        state["doc_numbers"] = {space: sequence.issued
+                                for space, sequence in merger.doc_numbers._sequences.items()}
+    if faults is not None:
+        state["faults"] = {
+            "rng": faults.rng.getstate(),
+            "planned": {str(ordinal): [rule.name for rule in rules] for ordinal, rules in faults.planned.items()},
+        }
+    return state
+
+
+def restore_state(merger, state: Dict[str, Any], totals=None, faults=None):
+    """恢复 capture_state 保存的状态"""
+    version, internal, gauss = state["random"]
+    random.setstate((version, tuple(internal), gauss))
+    merger.tokens.setstate(state["tokens"])
+    common = merger.common
+    common.transaction_counter = state["transaction_counter"]
+    for partner, sampler_state in state["card_samplers"].items():
+        sampler = common.card_samplers.get(partner)
+        if sampler is None:
+            raise ConfigError(f"检查点中的卡号池 {partner} 未配置，不能恢复")
+        sampler.rng.bit_generator.state = sampler_state["rng"]
+        sampler._buffer = [tuple(card) for card in sampler_state["buffer"]]
+    if state["doc_numbers"] is not None:
+        if merger.doc_numbers is None:
+            raise ConfigError("检查点使用了文档号唯一模式，恢复时也必须启用")
+        for space, issued in state["doc_numbers"].items():
+            merger.doc_numbers._sequence(space).issued = issued
+    if totals is not None:
+        vars(totals).update(state["totals"])
+    if faults is not None and state["faults"] is not None:
+        version, internal, gauss = state["faults"]["rng"]
+        faults.rng.setstate((version, tuple(internal), gauss))
+        rules = {rule.name: rule for rule, _ in faults.rules}
+        faults.planned = {int(ordinal): [rules[name] for name in names]
+                          for ordinal, names in state["faults"]["planned"].items()}
+
+
+def _write_json_atomic(path: str, content: Dict[str, Any]):
+    """先写临时文件并 fsync，再原子替换"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(content, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]):
+    """原子写入检查点"""
+    _write_json_atomic(checkpoint_path, {"version": CHECKPOINT_VERSION, **checkpoint})
+
+
+def load_checkpoint(checkpoint_path: str) -> Optional[Dict[str, Any]]:
+    """读取检查点，不存在时返回 None"""
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ConfigError(f"检查点版本不支持: {checkpoint_path}")
+    return checkpoint
+
+
+def find_partner_checkpoint(output_dir: str) -> Optional[str]:
+    """查找输出目录中最近的多合作方生成检查点，返回检查点路径"""
+    candidates = []
+    for checkpoint_path in glob.glob(os.path.join(output_dir, "*" + CHECKPOINT_FILE_SUFFIX)):
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint is not None and checkpoint.get("kind") == "partners":
+            candidates.append((os.path.getmtime(checkpoint_path), checkpoint_path))
+    return max(candidates)[1] if candidates else None
+
+
+def run_params_digest(jobs: List[Dict[str, Any]], keys: Sequence[str]) -> str:
+    """决定各任务输出内容的参数摘要，恢复运行时必须与运行清单一致"""
+    content = [{key: job.get(key) for key in keys} for job in jobs]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def start_run_manifest(manifest_path: str, params: str, resume: bool, **extra: Any) -> Dict[str, Any]:
+    """开始(或恢复)一次多文件运行
+    resume 为真且运行清单存在时校验参数并返回原运行清单，否则以 extra 中的运行参数新建运行清单
+    Returns:
+        Dict: {"params": 参数摘要, "jobs": {任务序号(字符串): {"output": 输出文件路径, "status": running / done}},
+               以及创建时的 extra}
+    """
+    if resume:
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = None
+        if manifest is not None:
+            if manifest.get("version") != RUN_MANIFEST_VERSION:
+                raise ConfigError(f"运行清单版本不支持: {manifest_path}")
+            if manifest["params"] != params:
+                raise ConfigError(f"任务参数与运行清单不一致，不能恢复: {manifest_path}")
+            return manifest
+    manifest = {"version": RUN_MANIFEST_VERSION, "params": params, **extra, "jobs": {}}
+    _write_json_atomic(manifest_path, manifest)
+    return manifest
+
+
+def update_run_manifest(manifest_path: str, index: int, output: str, status: str, lock=None):
+    """记录一个任务的输出文件和状态（多个进程同时更新时传入共享的锁）"""
+    if lock is not None:
+        lock.acquire()
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["jobs"][str(index)] = {"output": output, "status": status}
+        _write_json_atomic(manifest_path, manifest)
+    finally:
+        if lock is not None:
+            lock.release()
+
+
+def find_checkpoint(output_dir: str, file_type: str) -> Optional[str]:
+    """查找输出目录中指定文件类型最近的检查点，返回对应的数据文件路径"""
+    candidates = []
+    for checkpoint_path in glob.glob(os.path.join(output_dir, "*" + CHECKPOINT_FILE_SUFFIX)):
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint is not None and checkpoint.get("file_type") == file_type:
+            candidates.append((os.path.getmtime(checkpoint_path), checkpoint_path))
+    if not candidates:
+        return None
+    return max(candidates)[1][:-len(CHECKPOINT_FILE_SUFFIX)]
@@ -6,34 +6,131 @@
 1. 文件头部 (74位)
 2. 交易记录的公共字段 (1-5, 7-48, 50字段)
 3. 文件尾部 (7位)
+
+每条记录的交易类型、金额、流水号等在生成开始时确定为不可变的 RecordContext，
+各字段的生成函数只读取上下文，不通过生成器上的可变属性传递本条记录的取值；
+流水号计数器加锁递增，同一个生成器可以被多个线程同时使用（已加载的字典只读共享）。
 """
 
 import os
 import yaml
-import random
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import threading
+from datetime import timedelta
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+
+from txn_errors import CardNumberError, ConfigError, FileTypeError, FormatError
+from galaxy_layout import MAX_RECORDS_PER_FILE
+from utils.clock import SystemClock
+from utils.line_dictionary import load_line_dictionary, load_word_list
+from utils.random_tokens import RandomTokens
+
+# 文件类型 -> 默认合作方代码（card_numbers.yaml 中 card_partners 的键）
+DEFAULT_PARTNERS = {"B": "B", "M": "MA"}
+
+# 合作方配置中不是卡组织的键
+_PARTNER_SETTINGS = ("partner_id", "file_type", "count")
+
+# M类型文件可以包含的交易类型
+M_TRANSACTION_TYPES = ["A", "C", "H", "F", "O", "S", "T"]
+
+# 流水号中计数部分的最大位数：GALAXYSERIAL(12位) + 时间戳(14位) + 计数(最多6位) = 32位
+SERIAL_COUNTER_DIGITS = 6
+
+
+def amount_breakdown(amount: float) -> Tuple[int, int, int]:
+    """金额(元)拆分为 (TRANSACTION_AMOUNT, NET_AMOUNT_VATABLE_1, VAT_1_AMOUNT)，单位: 分"""
+    # 先四舍五入到分（19.99 * 100 = 1998.9999...），应税金额和税额用整数运算截断
+    amount_cents = int(round(amount * 100))
+    vatable_amount = amount_cents * 9 // 10
+    vat_amount = vatable_amount * 16 // 100
+    return amount_cents, vatable_amount, vat_amount
+
+
+class SerialCounter:
+    """流水号计数器：多个线程共用时加锁递增
+    fork 出的生成器共用同一个计数器（shared 为真），此时计数只前进不后退，
+    重置种子或从检查点恢复都不会让并发生成的其他文件重复发放流水号
+    """
+
+    def __init__(self, value: int = 1):
+        self._value = value
+        self.shared = False
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # 锁不能跨进程传递，在新进程中重新创建
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
 
-from txn_errors import FileTypeError
+    @value.setter
+    def value(self, value: int):
+        with self._lock:
+            self._value = max(self._value, value) if self.shared else value
+
+    def next(self) -> int:
+        """取出当前计数并加1"""
+        with self._lock:
+            value = self._value
+            self._value += 1
+        return value
+
+
+class RecordContext(NamedTuple):
+    """一条交易记录的生成上下文（不可变），由 CommonTransaction.new_record_context 创建"""
+    file_type: str
+    transaction_type: str
+    amount: float                          # 交易金额(元)
+    amount_breakdown: Tuple[int, int, int]  # 金额拆分(分)，见 amount_breakdown
+    serial_number: str                     # 交易流水号 (32位)
+    partner: Optional[Dict[str, Any]] = None
 
 
 class CommonTransaction:
     """公共交易数据生成器类"""
     
-    def __init__(self, config_dir: str = "config"):
-        """初始化生成器"""
+    def __init__(self, config_dir: str = "config", clock=None, tokens=None):
+        """初始化生成器
+        Args:
+            config_dir: 配置目录
+            clock: 时钟，为空时使用系统时间（文件头、文件名及记录中的日期均由其派生）
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
         self.config_dir = config_dir
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
         self.load_configs()
-        self.transaction_counter = 1
-        self.last_generated_amount = 0.0
+        # 流水号计数器，多个线程共用同一个生成器时加锁递增（fork 出的副本共用）
+        self.serial_counter = SerialCounter()
+        # 生成画像(GenerationProfile)，设置时交易类型、金额和购买日期偏移按画像中的分布抽样
+        self.profile = None
     
     def load_configs(self):
-        """加载配置文件"""
+        """加载配置文件
+        旅客姓名和卡号均支持内存映射行字典(.dict)，存在时优先于YAML使用：
+        - traveller_names.dict: 旅客姓名
+        - card_pans_B.dict / card_pans_MA.dict: B/MA类型的卡号池（有效期沿用YAML配置）
+        card_numbers.yaml 中配置 card_pools 时，卡号和有效期从卡号池(.npy)中按配置的分布抽样
+        """
         dict_dir = os.path.join(self.config_dir, "dictionaries")
         
         # 加载卡号信息
         with open(os.path.join(dict_dir, "card_numbers.yaml"), 'r', encoding='utf-8') as f:
             card_data = yaml.safe_load(f)
+            # 合作方配置（合作方代码 -> PARTNER_ID、文件类型、卡号列表、默认记录数）
+            self.partners = {
+                code: self._load_partner(code, partner_config)
+                for code, partner_config in card_data['card_partners'].items()
+            }
+            
             # 文件类型为BSP的卡片信息
             b_card = card_data['card_partners']['B']['UATP']['card1']
             self.b_type_cards = [b_card['PAN']]
@@ -44,20 +141,92 @@ class CommonTransaction:
             self.m_type_cards = [m_card['PAN']]
             self.m_type_expiry = m_card['Expiry']
         
+        # 卡号池抽样器(合作方代码 -> CardSampler)，未配置时为空
+        self.card_samplers = {}
+        card_pools = card_data.get('card_pools') or {}
+        if card_pools:
+            from card_pool import CardSampler  # 依赖numpy，仅在配置了卡号池时加载
+            for partner, pool_config in card_pools.items():
+                if pool_config:
+                    self.card_samplers[partner] = CardSampler.from_config(dict_dir, pool_config)
+        
+        # 大卡号池：存在行字典时替换单一卡号
+        for partner, attr in (("B", "b_type_cards"), ("MA", "m_type_cards")):
+            pan_path = os.path.join(dict_dir, f"card_pans_{partner}.dict")
+            if os.path.exists(pan_path):
+                setattr(self, attr, load_line_dictionary(pan_path))
+        
         # 加载旅客姓名
-        with open(os.path.join(dict_dir, "traveller_names.yaml"), 'r', encoding='utf-8') as f:
-            self.traveller_names = yaml.safe_load(f)['traveller_names']
+        self.traveller_names = load_word_list(dict_dir, "traveller_names.yaml", "traveller_names")
+    
+    @property
+    def transaction_counter(self) -> int:
+        """下一个流水号的计数"""
+        return self.serial_counter.value
+
+    @transaction_counter.setter
+    def transaction_counter(self, value: int):
+        self.serial_counter.value = value
     
-    def generate_header(self, file_type: str) -> str:
-        """生成公共文件头信息 (74位)"""
+    def fork(self) -> "CommonTransaction":
+        """创建共享已加载字典、卡号池和流水号计数器的副本
+        各副本在同一秒内生成时流水号也不会重复（每个文件内的流水号不再连续）
+        """
+        self.serial_counter.shared = True
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        return clone
+    
+    @staticmethod
+    def _load_partner(code: str, partner_config: Dict[str, Any]) -> Dict[str, Any]:
+        """解析 card_partners 中的一个合作方
+        除 partner_id / file_type / count 外的键均为卡组织，其下每张卡配置 PAN 和 Expiry；
+        未配置 file_type 时 B 合作方为B文件，其余为M文件
+        """
+        partner_id = str(partner_config.get('partner_id', ''))
+        if not partner_id.isdigit() or len(partner_id) != 12:
+            raise ConfigError(f"合作方 {code} 的 partner_id 必须为12位数字: {partner_id}")
+        file_type = partner_config.get('file_type') or ("B" if code == "B" else "M")
+        if file_type not in DEFAULT_PARTNERS:
+            raise ConfigError(f"合作方 {code} 的文件类型不支持: {file_type}，只支持 B 或 M")
+        cards = []
+        for key, brand in partner_config.items():
+            if key in _PARTNER_SETTINGS or not isinstance(brand, dict):
+                continue
+            for card in brand.values():
+                if isinstance(card, dict) and card.get('PAN'):
+                    pan, expiry = str(card['PAN']), str(card['Expiry'])
+                    if not pan.isdigit() or len(pan) > 19:
+                        raise CardNumberError(f"合作方 {code} 的卡号必须为不超过19位的数字: {pan}")
+                    if not expiry.isdigit() or len(expiry) != 4:
+                        raise CardNumberError(f"合作方 {code} 的有效期必须为4位数字(YYMM): {expiry}")
+                    cards.append((pan, expiry))
+        if not cards:
+            raise ConfigError(f"合作方 {code} 未配置卡号")
+        return {
+            "code": code,
+            "partner_id": partner_id,
+            "file_type": file_type,
+            "cards": cards,
+            "count": partner_config.get('count'),
+        }
+    
+    def generate_header(self, file_type: str, partner_id: str = None) -> str:
+        """生成公共文件头信息 (74位)
+        Args:
+            file_type: 文件类型 B 或 M
+            partner_id: 合作方ID，为空时使用该文件类型默认合作方(B / MA)的 partner_id
+        """
         fields = []
         fields.append("H")  # RECORD_TYPE (1位)
         fields.append(file_type)  # FILE_TYPE (1位)
         
         # PARTNER_ID (12位)
-        partner_id = "999993243243" if file_type == "B" else "918171615141"
+        if partner_id is None:
+            partner_id = self.partners[DEFAULT_PARTNERS[file_type]]["partner_id"]
         fields.append(partner_id)
-        fields.append(datetime.now().strftime("%Y%m%d"))  # PROCESSING_DATE (8位)
+        now = self.clock.now()
+        fields.append(now.strftime("%Y%m%d"))  # PROCESSING_DATE (8位)
         fields.append("V01.01")  # VERSION (6位)
         fields.append("    ")  # RELEASE (4位)
         fields.append("AU ")  # COUNTRY_CODE (3位)
@@ -67,7 +236,6 @@ class CommonTransaction:
         fields.append("     ")  # BOS_ID (5位)
         
         # FILE_ID (25位)--当前时间戳取14位
-        now = datetime.now()
         date_part = now.strftime("%Y%m%d")
         time_part = now.strftime("%H%M%S")
         fixed_part = "           "  # 11位空格
@@ -76,26 +244,60 @@ class CommonTransaction:
         
         return "".join(fields)
     
-    def generate_common_fields(self, file_type: str) -> list:
-        """生成交易记录的公共字段(1-5, 7-48, 50字段)"""
+    def new_record_context(self, file_type: str, transaction_type: str = None,
+                           partner: Dict[str, Any] = None, amount: float = None) -> RecordContext:
+        """确定一条交易记录的交易类型、金额和流水号
+        Args:
+            file_type: 文件类型 B 或 M
+            transaction_type: 指定交易类型代码，为空时按文件类型随机选择
+            partner: 合作方配置(见 partners)，指定时从该合作方的卡号池/卡号列表中取卡
+            amount: 指定交易金额(元)，为空时随机生成（设置画像时按该交易类型的金额分布）
+        """
+        sampled_amount = amount is None
+        if sampled_amount:
+            amount = round(self.tokens.uniform(100.0, 2000.0), 2)
+        if not transaction_type:
+            if file_type == "B":
+                transaction_type = "F"  # B类型文件只能是F类型交易
+            elif self.profile is not None:  # 按画像中的交易类型比例
+                transaction_type = self.profile.sample_type(self.tokens) or self.tokens.pick(M_TRANSACTION_TYPES)
+            else:  # M类型文件可以有多种交易类型
+                transaction_type = self.tokens.pick(M_TRANSACTION_TYPES)
+        if sampled_amount and self.profile is not None:
+            # 按画像中该交易类型的金额分布替换随机金额
+            profile_amount = self.profile.sample_amount(transaction_type, self.tokens)
+            if profile_amount is not None:
+                amount = profile_amount
+        return RecordContext(file_type, transaction_type, amount, amount_breakdown(amount),
+                             self.generate_serial_number(), partner)
+    
+    def generate_common_fields(self, context: RecordContext) -> list:
+        """生成交易记录的公共字段(1-5, 7-48, 50字段)
+        Args:
+            context: 本条记录的生成上下文（见 new_record_context）
+        """
+        file_type, transaction_type, partner = context.file_type, context.transaction_type, context.partner
         fields = []
         
         # 1. RECORD_TYPE (1位)
         fields.append("D")
         
         # 2. TRANSACTION_TYPE (1位)
-        if file_type == "B":
-            transaction_type = "F"  # B类型文件只能是F类型交易
-        else:  # M类型文件可以有多种交易类型
-            transaction_type = random.choice(["A", "C", "H", "F", "O", "S", "T"])
         fields.append(transaction_type)
         
         # 3. CARD_NUMBER (19位)
-        if file_type == "B":
-            card_number = "0000" + random.choice(self.b_type_cards)  # B类型卡号前缀4个0
+        sampler = self.card_samplers.get(partner["code"] if partner else DEFAULT_PARTNERS.get(file_type))
+        if sampler is not None:
+            pan, expiry = sampler.next()
+            card_number = pan.zfill(19)  # 卡号左侧补0到19位
+        elif partner is not None:
+            pan, expiry = self.tokens.pick(partner["cards"])
+            card_number = pan.zfill(19)
+        elif file_type == "B":
+            card_number = "0000" + self.tokens.pick(self.b_type_cards)  # B类型卡号前缀4个0
             expiry = self.b_type_expiry
         else:
-            card_number = "000" + random.choice(self.m_type_cards)   # M类型卡号前缀3个0
+            card_number = "000" + self.tokens.pick(self.m_type_cards)   # M类型卡号前缀3个0
             expiry = self.m_type_expiry
         fields.append(card_number)
         
@@ -108,32 +310,32 @@ class CommonTransaction:
         fields.append(doc_format)
         
         # 7-48字段
-        fields.extend(self._generate_fields_7_to_48())
+        fields.extend(self._generate_fields_7_to_48(context))
         
         # 50. USAGE_CODE (1位)
         fields.append("0")
         
         return fields
     
-    def _generate_fields_7_to_48(self) -> list:
+    def _generate_fields_7_to_48(self, context: RecordContext) -> list:
         """生成7-48字段"""
         fields = []
         
-        # 7. PURCHASE_DATE (8位)
-        purchase_date = (datetime.now() - timedelta(days=random.randint(1, 7))).strftime("%Y%m%d")
+        # 7. PURCHASE_DATE (8位)，距处理日期1-7天（设置画像时按该交易类型的偏移分布）
+        days = self.profile.sample_date_offset(context.transaction_type, self.tokens) if self.profile is not None else None
+        if days is None:
+            days = self.tokens.number(1, 7)
+        purchase_date = (self.clock.now() - timedelta(days=days)).strftime("%Y%m%d")
         fields.append(purchase_date)
         
         # 8. TRAVELLER_NAME (30位)
-        fields.append(random.choice(self.traveller_names).ljust(30))
+        fields.append(self.tokens.pick(self.traveller_names).ljust(30))
         
         # 9. TRANSACTION_SERIAL_NUMBER (32位)
-        current_datetime = datetime.now().strftime("%Y%m%d%H%M%S")
-        serial_number = f"GALAXYSERIAL{current_datetime}{str(self.transaction_counter).zfill(3)}"
-        fields.append(serial_number.ljust(32))
-        self.transaction_counter += 1
+        fields.append(context.serial_number)
         
         # 10-17. 金额相关字段
-        fields.extend(self._generate_amount_fields())
+        fields.extend(self._generate_amount_fields(context))
         
         # 18-26. 固定69个0
         fields.append("0" * 69)
@@ -143,7 +345,17 @@ class CommonTransaction:
         
         return fields
     
-    def _generate_amount_fields(self) -> list:
+    def generate_serial_number(self) -> str:
+        """生成交易流水号 (32位)：时间戳 + 自增计数
+        计数只取末6位（超过后循环），流水号长度不会超过32位；同一秒内生成不超过10^6条时不会重复
+        """
+        counter = self.serial_counter.next()
+        current_datetime = self.clock.now().strftime("%Y%m%d%H%M%S")
+        counter_str = str(counter % 10 ** SERIAL_COUNTER_DIGITS).zfill(3)
+        serial_number = f"GALAXYSERIAL{current_datetime}{counter_str}"
+        return serial_number.ljust(32)
+    
+    def _generate_amount_fields(self, context: RecordContext) -> list:
         """生成金额相关字段(10-17字段)"""
         fields = []
         
@@ -154,18 +366,17 @@ class CommonTransaction:
         fields.append("+")
         
         # 12. TRANSACTION_AMOUNT (15位)，金额精确到分
-        amount_str = f"{int(self.last_generated_amount * 100):015d}"
+        amount_cents, vatable_amount, vat_amount = context.amount_breakdown
+        amount_str = f"{amount_cents:015d}"
         fields.append(amount_str)
         
         # 13. NET_AMOUNT_NON_VATABLE (15位)
         fields.append(amount_str)
         
         # 14. NET_AMOUNT_VATABLE_1 (15位)
-        vatable_amount = int(self.last_generated_amount * 100 * 0.9)
         fields.append(f"{vatable_amount:015d}")
         
         # 15. VAT_1_AMOUNT (9位)
-        vat_amount = int(vatable_amount * 0.16)
         fields.append(f"{vat_amount:09d}")
         
         # 16. VAT_1_PERCENTAGE (5位)
@@ -203,7 +414,7 @@ class CommonTransaction:
             fields.append(" " * 17)
         
         # 36. AGENCY_DOSSIER_NUMBER (20位)
-        dossier_num = f"DOSSIER888{random.randint(10000, 99999)}     "
+        dossier_num = f"DOSSIER888{self.tokens.number(10000, 99999)}     "
         fields.append(dossier_num[:20])
         
         # 37. AGENCY_DELIVERY_NOTE_NUMBER (20位)
@@ -214,10 +425,10 @@ class CommonTransaction:
         for prefix in dbi_prefixes:
             if prefix == "BD":
                 # 10位：当前时间的年月日(8位) + 两位空格
-                dbi_field = datetime.now().strftime("%Y%m%d") + "  "
+                dbi_field = self.clock.now().strftime("%Y%m%d") + "  "
                 fields.append(dbi_field)
             else:
-                dbi_field = f"{prefix}888{random.randint(10000, 99999)}       "
+                dbi_field = f"{prefix}888{self.tokens.number(10000, 99999)}       "
                 fields.append(dbi_field[:17])
         
         # 48. FILLER (9位)
@@ -226,14 +437,19 @@ class CommonTransaction:
         return fields
     
     def generate_trailer(self, file_type: str, record_count: int) -> str:
-        """生成公共文件尾信息 (7位)"""
+        """生成公共文件尾信息 (7位)
+        Args:
+            record_count: 文件总行数（含文件头和文件尾），不能超过 MAX_RECORDS_PER_FILE + 2
+        """
+        if not 2 <= record_count <= MAX_RECORDS_PER_FILE + 2:
+            raise FormatError(f"文件尾记录数超出范围(5位，最多{MAX_RECORDS_PER_FILE}条交易记录): {record_count}")
         record_type = "T"  # RECORD_TYPE (1位)
         count_str = f"{record_count:05d}"  # RECORD_COUNT (5位)
         return record_type + file_type + count_str
     
     def generate_standard_filename(self, file_type: str) -> str:
         """生成标准格式的文件名"""
-        now = datetime.now()
+        now = self.clock.now()
         year_2digit = now.strftime("%y")
         timestamp_12 = now.strftime(f"{year_2digit}%m%d%H%M%S")
         
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨文件重复键扫描
+Duplicate Key Scanner
+
+检查任意多个交易数据文件之间 TRANSACTION_SERIAL_NUMBER / DOCUMENT_NUMBER 等键是否重复，
+内存占用固定，可以扫描数亿条记录。全部记录按序号范围平均分给多个进程，每遍每条记录只读取一次：
+1. 第一遍: 每个进程以内存映射方式读取自己范围内的记录，按块取出键列(numpy)，计算哈希后查询并写入
+   本范围的Bloom过滤器（各范围的过滤器大小相同），已存在的键记为本范围的疑似重复
+2. 合并: 相同大小的Bloom过滤器按位或即可合并，父进程为每个范围合并出"其他范围"的过滤器
+3. 第二遍: 每个进程再次读取自己的范围，收集命中"其他范围"过滤器或本范围疑似集合的键的位置
+   (文件, 记录序号)，按键分组后出现两次及以上的才是真正重复的键（Bloom过滤器的误判在此被排除）
+疑似集合和命中位置的数量约为 误判率 × 记录数 + 实际重复数，与文件规模相比很小；
+超过内存预算的一半时停止扫描并提示增大预算，内存占用不会随记录数无限增长。
+"""
+
+import math
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple
+
+from txn_errors import ConfigError
+from galaxy_file import GalaxyFile
+from galaxy_layout import HEADER_LINE_LENGTH, RECORD_FIELDS, RECORD_LINE_LENGTH
+
+# 扫描键名称 -> 记录字段名
+SCAN_KEYS = {
+    "serial": "TRANSACTION_SERIAL_NUMBER",
+    "document": "DOCUMENT_NUMBER",
+    "card": "CARD_NUMBER",
+}
+DEFAULT_SCAN_KEYS = ("serial", "document")
+DEFAULT_MEMORY = 512 * 1024 * 1024
+# 每块处理的记录数
+BLOCK_RECORDS = 65536
+# 每个键的目标误判率（内存预算足够时按此确定过滤器大小）
+TARGET_FALSE_POSITIVE_RATE = 0.001
+
+_FNV_OFFSET = 0xCBF29CE484222325
+_FNV_PRIME = 0x100000001B3
+_MIX_CONSTANTS = (0xBF58476D1CE4E5B9, 0x94D049BB133111EB)
+
+
+def bloom_parameters(item_count: int, memory_bits: int) -> Tuple[int, int, float]:
+    """按预期元素数和内存上限确定过滤器位数和哈希函数个数
+    Returns:
+        Tuple[int, int, float]: (位数, 哈希函数个数, 预计误判率)
+    """
+    item_count = max(item_count, 1)
+    optimal_bits = math.ceil(-item_count * math.log(TARGET_FALSE_POSITIVE_RATE) / math.log(2) ** 2)
+    bits = max(64, min(optimal_bits, memory_bits))
+    hashes = min(16, max(1, round(bits / item_count * math.log(2))))
+    false_positive_rate = (1.0 - math.exp(-hashes * item_count / bits)) ** hashes
+    return bits, hashes, false_positive_rate
+
+
+def _hash_keys(np, keys) -> Tuple[Any, Any]:
+    """对 (n, 键宽度) 的 uint8 键列做向量化 FNV-1a 哈希，再经 splitmix64 混合得到两个独立的64位哈希"""
+    h = np.full(keys.shape[0], _FNV_OFFSET, dtype=np.uint64)
+    prime = np.uint64(_FNV_PRIME)
+    for column in range(keys.shape[1]):
+        h ^= keys[:, column].astype(np.uint64)
+        h *= prime
+    results = []
+    for salt in (np.uint64(0), np.uint64(0x9E3779B97F4A7C15)):
+        z = h ^ salt
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX_CONSTANTS[0])
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX_CONSTANTS[1])
+        results.append(z ^ (z >> np.uint64(31)))
+    return results[0], results[1] | np.uint64(1)
+
+
+def _iter_key_blocks(np, paths: Sequence[str], fields: Sequence[Tuple[int, int]], chunks=None):
+    """以内存映射方式按块读取键列
+    Yields:
+        (文件序号, 块起始记录序号, [每个键一个 (n, 键宽度) uint8 数组])
+    """
+    for file_index, path in enumerate(paths):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            record_count = (size - HEADER_LINE_LENGTH) // RECORD_LINE_LENGTH
+            if record_count <= 0:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                ranges = chunks[file_index] if chunks is not None else [(0, record_count)]
+                for first, count in ranges:
+                    for start in range(first, first + count, BLOCK_RECORDS):
+                        n = min(BLOCK_RECORDS, first + count - start)
+                        lines = np.frombuffer(mm, dtype=np.uint8, count=n * RECORD_LINE_LENGTH,
+                                              offset=HEADER_LINE_LENGTH + start * RECORD_LINE_LENGTH
+                                              ).reshape(n, RECORD_LINE_LENGTH)
+                        try:
+                            yield file_index, start, [np.ascontiguousarray(lines[:, offset:offset + length])
+                                                      for offset, length in fields]
+                        finally:
+                            del lines  # 释放对内存映射的引用，以便关闭（包括提前结束时）
+
+
+def _bloom_positions(np, keys, bits: int, hashes: int) -> Tuple[Any, Any]:
+    """键在过滤器中的位置: (字节下标 (n, 哈希个数), 位掩码 (n, 哈希个数))"""
+    h1, h2 = _hash_keys(np, keys)
+    # 双重哈希: 第i个位置 = (h1 + i*h2) mod 位数
+    offsets = np.arange(hashes, dtype=np.uint64)
+    positions = (h1[:, None] + offsets[None, :] * h2[:, None]) % np.uint64(bits)
+    byte_index = (positions >> np.uint64(3)).astype(np.intp)
+    masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+    return byte_index, masks
+
+
+def _check_limit(size: int, limit: int, what: str):
+    """疑似键/命中位置超过内存上限时停止扫描"""
+    if size > limit:
+        raise ConfigError(f"{what}超过内存上限({limit / 1024 / 1024:.1f} MiB)，"
+                          f"请增大扫描内存预算（重复或误判过多）")
+
+
+def _bloom_pass(paths: Sequence[str], fields: Sequence[Tuple[int, int]], chunks,
+                bits: int, hashes: int, limit: int) -> Tuple[List[bytes], List[bytes]]:
+    """第一遍（在工作进程中执行）：为本范围的记录构建过滤器
+    Returns:
+        (每个键的过滤器字节, 每个键在本范围内的疑似重复值（排序去重后拼接的定长字节）)
+    """
+    import numpy as np  # 仅扫描时需要
+
+    filters = [np.zeros((bits + 7) // 8, dtype=np.uint8) for _ in fields]
+    suspects: List[List[Any]] = [[] for _ in fields]
+    suspect_bytes = 0
+    for _, _, key_blocks in _iter_key_blocks(np, paths, fields, chunks):
+        for key_index, keys in enumerate(key_blocks):
+            byte_index, masks = _bloom_positions(np, keys, bits, hashes)
+            bloom = filters[key_index]
+            present = np.all(bloom[byte_index] & masks, axis=1)
+            # 同一块内重复的键在写入前查询不到：按键值排序找出后出现者
+            values = keys.view(f"S{keys.shape[1]}").ravel()
+            order = np.argsort(values, kind="stable")
+            sorted_values = values[order]
+            present[order[1:][sorted_values[1:] == sorted_values[:-1]]] = True
+            if present.any():
+                found = values[present]
+                suspects[key_index].append(found)
+                suspect_bytes += found.nbytes
+                if suspect_bytes > limit:
+                    # 先去重压缩，仍超过上限时停止
+                    suspects = [[np.unique(np.concatenate(items))] if items else [] for items in suspects]
+                    suspect_bytes = sum(items[0].nbytes for items in suspects if items)
+                    _check_limit(suspect_bytes, limit, "疑似重复键")
+            np.bitwise_or.at(bloom, byte_index.ravel(), masks.ravel())
+    return ([bloom.tobytes() for bloom in filters],
+            [np.unique(np.concatenate(found)).tobytes() if found else b"" for found in suspects])
+
+
+def _confirm_pass(paths: Sequence[str], fields: Sequence[Tuple[int, int]], chunks, others: Sequence[bytes],
+                  suspects: Sequence[bytes], bits: int, hashes: int, limit: int) -> List[Tuple[bytes, bytes]]:
+    """第二遍（在工作进程中执行）：收集本范围内命中其他范围过滤器或本范围疑似集合的键的位置
+    Returns:
+        每个键一个 (命中的键值(拼接的定长字节), 位置数组(int64: 文件序号, 记录序号)的字节)
+    """
+    import numpy as np
+
+    other_filters = [np.frombuffer(data, dtype=np.uint8) if data else None for data in others]
+    candidates = [np.frombuffer(data, dtype=f"S{length}") for data, (_, length) in zip(suspects, fields)]
+    hit_values: List[List[Any]] = [[] for _ in fields]
+    hit_positions: List[List[Any]] = [[] for _ in fields]
+    hit_bytes = 0
+    for file_index, start, key_blocks in _iter_key_blocks(np, paths, fields, chunks):
+        for key_index, keys in enumerate(key_blocks):
+            values = keys.view(f"S{keys.shape[1]}").ravel()
+            hit = np.zeros(len(values), dtype=bool)
+            bloom = other_filters[key_index]
+            if bloom is not None:
+                byte_index, masks = _bloom_positions(np, keys, bits, hashes)
+                hit |= np.all(bloom[byte_index] & masks, axis=1)
+            candidate = candidates[key_index]
+            if len(candidate):
+                positions = np.searchsorted(candidate, values).clip(0, len(candidate) - 1)
+                hit |= candidate[positions] == values
+            rows = np.flatnonzero(hit)
+            if len(rows):
+                hit_values[key_index].append(values[rows])
+                hit_positions[key_index].append(
+                    np.column_stack((np.full(len(rows), file_index, dtype=np.int64), start + rows)))
+                hit_bytes += len(rows) * (values.itemsize + 16)
+                _check_limit(hit_bytes, limit, "疑似重复键的位置")
+    return [(np.concatenate(values).tobytes(), np.concatenate(positions).astype(np.int64).tobytes())
+            if values else (b"", b"") for values, positions in zip(hit_values, hit_positions)]
+
+
+class DuplicateScanner:
+    """重复键扫描器类"""
+
+    def __init__(self, keys: Sequence[str] = DEFAULT_SCAN_KEYS, memory: int = DEFAULT_MEMORY, workers: int = None):
+        """初始化扫描器
+        Args:
+            keys: 扫描的键（serial / document / card）
+            memory: 所有Bloom过滤器的总内存预算(字节)
+            workers: 并行读取的进程数，默认为CPU核数
+        """
+        for key in keys:
+            if key not in SCAN_KEYS:
+                raise ConfigError(f"不支持的扫描键: {key}，支持: {', '.join(SCAN_KEYS)}")
+        if not keys:
+            raise ConfigError("至少需要指定一个扫描键")
+        self.keys = list(keys)
+        self.fields = [RECORD_FIELDS[SCAN_KEYS[key]] for key in self.keys]
+        self.memory = memory
+        self.workers = workers or os.cpu_count() or 1
+
+    def scan(self, paths: Sequence[str]) -> Dict[str, Any]:
+        """扫描文件
+        Returns:
+            Dict: {"records": 记录总数, "bloom": 过滤器参数, "suspects": 每个键的疑似数,
+                   "duplicates": {键: [{"value": 值, "occurrences": [{"file": 路径, "record": 序号}, ...]}]}}
+        """
+        if not paths:
+            raise ConfigError("至少需要一个输入文件")
+        record_counts = []
+        for path in paths:
+            with GalaxyFile(path) as galaxy:
+                record_counts.append(galaxy.record_count)
+        total = sum(record_counts)
+
+        workers = max(1, min(self.workers, total // BLOCK_RECORDS + 1))
+        # 父进程合并时同时持有各范围的过滤器和合并出的"其他范围"过滤器，各占预算的一半
+        filter_bits = self.memory * 8 // (2 * workers) // len(self.keys)
+        bits, hashes, false_positive_rate = bloom_parameters(total, filter_bits)
+        # 疑似键和命中位置最多占用预算的一半，按进程平均分配
+        limit = max(1, self.memory // 2 // workers)
+        chunks = self._split_ranges(record_counts, workers)
+
+        # 第一遍: 按记录范围并行构建过滤器
+        partial = self._map(_bloom_pass, [(paths, self.fields, part, bits, hashes, limit) for part in chunks])
+        others = self._other_filters([result[0] for result in partial], len(self.fields))
+
+        # 第二遍: 按记录范围并行收集命中其他范围过滤器或本范围疑似集合的键的位置
+        jobs = [(paths, self.fields, part, others[index], partial[index][1], bits, hashes, limit)
+                for index, part in enumerate(chunks)]
+        del partial, others
+        results = self._map(_confirm_pass, jobs)
+        del jobs
+
+        duplicates = {}
+        suspect_counts = {}
+        for key_index, (key, (_, length)) in enumerate(zip(self.keys, self.fields)):
+            values = b"".join(result[key_index][0] for result in results)
+            positions = b"".join(result[key_index][1] for result in results)
+            suspect_counts[key] = len(self._sorted_values(values, length)) // length
+            duplicates[key] = self._group_duplicates(paths, values, positions, length)
+        return {
+            "files": len(paths),
+            "records": total,
+            "bloom": {"ranges": workers, "bits_per_filter": bits, "hashes": hashes,
+                      "false_positive_rate": false_positive_rate},
+            "suspects": suspect_counts,
+            "duplicates": duplicates,
+        }
+
+    @staticmethod
+    def _other_filters(filters: Sequence[Sequence[bytes]], key_count: int) -> List[List[bytes]]:
+        """为每个范围按位或合并其他范围的过滤器（前缀或 + 后缀或），只有一个范围时为空"""
+        if len(filters) == 1:
+            return [[b""] * key_count]
+        import numpy as np
+
+        others: List[List[bytes]] = [[] for _ in filters]
+        for key_index in range(key_count):
+            blooms = [np.frombuffer(item[key_index], dtype=np.uint8) for item in filters]
+            prefixes = [None]
+            for bloom in blooms[:-1]:
+                prefixes.append(bloom.copy() if prefixes[-1] is None else prefixes[-1] | bloom)
+            suffix = None
+            for index in range(len(blooms) - 1, -1, -1):
+                prefix = prefixes[index]
+                merged = suffix if prefix is None else (prefix if suffix is None else prefix | suffix)
+                others[index].append(merged.tobytes())
+                prefixes[index] = None
+                suffix = blooms[index].copy() if suffix is None else suffix | blooms[index]
+        return others
+
+    @staticmethod
+    def _group_duplicates(paths: Sequence[str], values: bytes, positions: bytes, length: int) -> List[Dict[str, Any]]:
+        """按键值分组命中位置，只保留出现两次及以上的键（各进程结果按记录顺序拼接，稳定排序后位置有序）
+        只出现一次的命中是Bloom过滤器的误判
+        """
+        if not values:
+            return []
+        import numpy as np
+
+        values = np.frombuffer(values, dtype=f"S{length}")
+        positions = np.frombuffer(positions, dtype=np.int64).reshape(-1, 2)
+        order = np.argsort(values, kind="stable")
+        values, positions = values[order], positions[order]
+        unique, starts, counts = np.unique(values, return_index=True, return_counts=True)
+        duplicates = []
+        for value, start, count in zip(unique[counts > 1], starts[counts > 1], counts[counts > 1]):
+            duplicates.append({
+                "value": value.decode("ascii").strip(),
+                "occurrences": [{"file": paths[file_index], "record": int(ordinal)}
+                                for file_index, ordinal in positions[start:start + count].tolist()],
+            })
+        return duplicates
+
+    @staticmethod
+    def _sorted_values(data: bytes, length: int) -> bytes:
+        """命中的键值排序去重"""
+        if not data:
+            return b""
+        import numpy as np
+        return np.unique(np.frombuffer(data, dtype=f"S{length}")).tobytes()
+
+    @staticmethod
+    def _split_ranges(record_counts: Sequence[int], parts: int) -> List[List[List[Tuple[int, int]]]]:
+        """将全部记录按序号范围平均分给各进程: 每个进程一个 [每个文件的 (起始序号, 记录数) 列表]"""
+        total = sum(record_counts)
+        per_part = max(1, math.ceil(total / parts))
+        assignments = [[[] for _ in record_counts] for _ in range(parts)]
+        part, room = 0, per_part
+        for file_index, count in enumerate(record_counts):
+            first = 0
+            while first < count:
+                take = min(room, count - first)
+                assignments[part][file_index].append((first, take))
+                first += take
+                room -= take
+                if room == 0 and part < parts - 1:
+                    part, room = part + 1, per_part
+        return assignments
+
+    def _map(self, function, jobs: List[tuple]) -> List[Any]:
+        if len(jobs) == 1:
+            return [function(*jobs[0])]
+        with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(function, *job) for job in jobs]
+            return [future.result() for future in futures]
+
+
+def format_report(result: Dict[str, Any], limit: int = 20) -> List[str]:
+    """扫描结果的文本报告行（每个键最多列出 limit 个重复值）"""
+    bloom = result["bloom"]
+    lines = [f"🔍 扫描 {result['files']} 个文件, {result['records']} 条记录 "
+             f"(Bloom过滤器: {bloom['ranges']} 个范围 x {bloom['bits_per_filter'] // 8 // 1024} KiB, "
+             f"{bloom['hashes']} 个哈希, 预计误判率 {bloom['false_positive_rate']:.2e})"]
+    for key, duplicates in result["duplicates"].items():
+        lines.append(f"    {key}: 疑似 {result['suspects'][key]}, 确认重复 {len(duplicates)}")
+        for duplicate in duplicates[:limit]:
+            places = ", ".join(f"{item['file']}#{item['record']}" for item in duplicate["occurrences"])
+            lines.append(f"        {duplicate['value']}: {places}")
+        if len(duplicates) > limit:
+            lines.append(f"        ... 另有 {len(duplicates) - limit} 个")
+    return lines
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+故障注入
+Fault Injection
+
+按命名的变异规则，将指定比例的记录故意改坏，用于生成异常路径的测试文件：
+1. 直接修改已有文件：以读写方式内存映射，只读取和改写被选中的记录
+2. 生成时注入：在流式写入前改写被选中的记录
+
+规则说明(规格串写法: 规则名[:参数]=比例，多个规则以逗号分隔):
+    bad_expiry=0.01                   EXPIRY_DATE 月份改为 13-99
+    non_numeric_amount=0.01           TRANSACTION_AMOUNT 中混入字母
+    short_service_description:10=0.01 SERVICE_DESCRIPTION 缩短10位（记录变为840位）
+    non_flight_type=0.01              B文件中交易类型改为非F类型
+    wrong_trailer_count[:1]           文件尾记录数加上偏移量（文件级规则，不需要比例）
+
+被选中的记录序号写入 <文件>.faults.json，供测试断言使用。
+"""
+
+import json
+import mmap
+import os
+import random
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+from txn_errors import ConfigError, FormatError
+from galaxy_layout import (
+    HEADER_FIELDS, HEADER_LINE_LENGTH, RECORD_FIELDS, RECORD_LENGTH, RECORD_LINE_LENGTH,
+    TRAILER_FIELDS, TRAILER_LENGTH, TRAILER_LINE_LENGTH, field_slice
+)
+
+FAULTS_FILE_SUFFIX = ".faults.json"
+
+_NEWLINE = ord("\n")
+_EXPIRY_MONTH = slice(RECORD_FIELDS["EXPIRY_DATE"][0] + 2, RECORD_FIELDS["EXPIRY_DATE"][0] + 4)
+_AMOUNT = RECORD_FIELDS["TRANSACTION_AMOUNT"]
+_TRANSACTION_TYPE = RECORD_FIELDS["TRANSACTION_TYPE"][0]
+_USAGE_CODE = RECORD_FIELDS["USAGE_CODE"][0]
+_FILE_TYPE = HEADER_FIELDS["FILE_TYPE"][0]
+_TRAILER_COUNT = field_slice("RECORD_COUNT", TRAILER_FIELDS)
+
+
+class FaultRule:
+    """故障规则基类
+    记录级规则在可写的850位缓冲区上原地修改；shrink 为规则使记录缩短的位数。
+    """
+
+    name = ""
+    file_level = False
+
+    def __init__(self, param: Optional[int] = None):
+        self.param = param
+        self.shrink = 0
+
+    def check(self, file_type: str):
+        """检查规则是否适用于该文件类型"""
+
+    def apply(self, record: bytearray, rng: random.Random):
+        raise NotImplementedError
+
+
+class BadExpiryRule(FaultRule):
+    """有效期月份非法"""
+
+    name = "bad_expiry"
+
+    def apply(self, record: bytearray, rng: random.Random):
+        record[_EXPIRY_MONTH] = b"%02d" % rng.randint(13, 99)
+
+
+class NonNumericAmountRule(FaultRule):
+    """交易金额中混入字母"""
+
+    name = "non_numeric_amount"
+
+    def __init__(self, param: Optional[int] = None):
+        super().__init__(param)
+        if not 0 < (param or 3) <= _AMOUNT[1]:
+            raise ConfigError(f"金额混入字母的位数错误: {param}")
+
+    def apply(self, record: bytearray, rng: random.Random):
+        offset, length = _AMOUNT
+        for position in rng.sample(range(length), self.param or 3):
+            record[offset + position] = ord(rng.choice(string.ascii_uppercase))
+
+
+class ShortServiceDescriptionRule(FaultRule):
+    """服务描述缩短（USAGE_CODE 随之前移，记录长度变短）"""
+
+    name = "short_service_description"
+
+    def __init__(self, param: Optional[int] = None):
+        super().__init__(param)
+        self.shrink = param or 10
+        if not 0 < self.shrink < RECORD_FIELDS["SERVICE_DESCRIPTION"][1]:
+            raise ConfigError(f"服务描述缩短位数错误: {self.shrink}")
+
+    def apply(self, record: bytearray, rng: random.Random):
+        record[_USAGE_CODE - self.shrink] = record[_USAGE_CODE]
+
+
+class NonFlightTypeRule(FaultRule):
+    """B文件中出现非F交易类型"""
+
+    name = "non_flight_type"
+
+    def check(self, file_type: str):
+        if file_type != "B":
+            raise ConfigError(f"规则 {self.name} 只适用于B类型文件，当前文件类型: {file_type}")
+
+    def apply(self, record: bytearray, rng: random.Random):
+        record[_TRANSACTION_TYPE] = ord(rng.choice("HTCSAO"))
+
+
+class WrongTrailerCountRule(FaultRule):
+    """文件尾记录数错误"""
+
+    name = "wrong_trailer_count"
+    file_level = True
+
+    def apply_trailer(self, trailer: bytearray):
+        count = int(trailer[_TRAILER_COUNT]) + (self.param or 1)
+        trailer[_TRAILER_COUNT] = b"%05d" % (count % 100000)
+
+
+# 规则注册表: 规则名 -> 规则类
+FAULT_RULES = {
+    rule.name: rule for rule in (
+        BadExpiryRule, NonNumericAmountRule, ShortServiceDescriptionRule,
+        NonFlightTypeRule, WrongTrailerCountRule,
+    )
+}
+
+
+def parse_fault_spec(spec: str) -> List[Tuple[FaultRule, float]]:
+    """解析故障规格串，如 "bad_expiry=0.01,short_service_description:20=0.001,wrong_trailer_count"
+    Returns:
+        List[Tuple[FaultRule, float]]: [(规则, 比例), ...]，文件级规则的比例为1.0
+    """
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, fraction = item.partition("=")
+        name, _, param = name.partition(":")
+        rule_class = FAULT_RULES.get(name)
+        if rule_class is None:
+            raise ConfigError(f"不支持的故障规则: {name}，支持: {', '.join(FAULT_RULES)}")
+        try:
+            rule = rule_class(int(param) if param else None)
+            fraction = float(fraction) if fraction else 1.0
+        except ValueError:
+            raise ConfigError(f"故障规则格式错误: {item}")
+        if not rule.file_level and not fraction:
+            raise ConfigError(f"故障规则缺少比例: {item}")
+        if not 0.0 <= fraction <= 1.0:
+            raise ConfigError(f"故障比例必须在0-1之间: {item}")
+        rules.append((rule, fraction))
+    if not rules:
+        raise ConfigError(f"故障规格为空: {spec!r}")
+    return rules
+
+
+class FaultInjector:
+    """故障注入器类：按规则和比例选择记录，并对选中的记录执行变异"""
+
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        """初始化注入器
+        Args:
+            spec: 故障规格串，见 parse_fault_spec
+            seed: 随机种子（选择记录和变异内容均由该种子决定，与生成数据的随机流互不影响）
+        """
+        self.spec = spec
+        self.seed = seed
+        self.rules = parse_fault_spec(spec)
+        self.rng = random.Random(seed)
+        self.planned: Dict[int, List[FaultRule]] = {}
+        self.record_count = 0
+
+    @property
+    def changes_length(self) -> bool:
+        """是否包含改变记录长度的规则"""
+        return any(rule.shrink for rule, _ in self.rules)
+
+    def plan(self, record_count: int, file_type: str) -> Dict[int, List[FaultRule]]:
+        """为指定记录数的文件选择要变异的记录（每个规则精确选中 round(比例*记录数) 条）"""
+        self.record_count = record_count
+        self.planned = {}
+        for rule, fraction in self.rules:
+            rule.check(file_type)
+            if rule.file_level:
+                continue
+            selected = self.rng.sample(range(record_count), round(fraction * record_count))
+            for ordinal in selected:
+                self.planned.setdefault(ordinal, []).append(rule)
+        return self.planned
+
+    def apply_record(self, ordinal: int, record: bytearray) -> int:
+        """对选中的记录执行变异
+        Returns:
+            int: 变异后的记录长度
+        """
+        length = RECORD_LENGTH
+        for rule in self.planned.get(ordinal, ()):
+            rule.apply(record, self.rng)
+            length -= rule.shrink
+        return length
+
+    def apply_line(self, ordinal: int, record: str) -> str:
+        """生成时注入：对选中的记录字符串执行变异"""
+        if ordinal not in self.planned:
+            return record
+        buffer = bytearray(record.encode("ascii"))
+        length = self.apply_record(ordinal, buffer)
+        return buffer[:length].decode("ascii")
+
+    def apply_trailer(self, trailer: bytearray):
+        for rule, _ in self.rules:
+            if rule.file_level:
+                rule.apply_trailer(trailer)
+
+    def summary(self) -> Dict[str, Any]:
+        """注入结果: 规则名 -> 选中的记录序号列表"""
+        by_rule: Dict[str, List[int]] = {rule.name: [] for rule, _ in self.rules if not rule.file_level}
+        for ordinal in sorted(self.planned):
+            for rule in self.planned[ordinal]:
+                by_rule[rule.name].append(ordinal)
+        return {
+            "spec": self.spec,
+            "seed": self.seed,
+            "record_count": self.record_count,
+            "file_rules": [rule.name for rule, _ in self.rules if rule.file_level],
+            "records": by_rule,
+        }
+
+    def write_manifest(self, data_filepath: str) -> str:
+        """在数据文件旁写入 <文件>.faults.json"""
+        manifest_path = data_filepath + FAULTS_FILE_SUFFIX
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return manifest_path
+
+
+def inject_faults(path: str, injector: FaultInjector) -> Dict[str, Any]:
+    """直接修改已有文件（内存映射，只改写选中的记录）
+    缩短记录的规则需要整体前移后续数据：按选中记录分段，每段用一次 mmap.move 完成，最后截断文件。
+    Returns:
+        Dict: 注入结果，见 FaultInjector.summary
+    """
+    size = os.path.getsize(path)
+    body = size - HEADER_LINE_LENGTH - TRAILER_LINE_LENGTH
+    if body < 0 or body % RECORD_LINE_LENGTH:
+        raise FormatError(f"文件长度不符合定长格式(可能已注入过缩短记录的故障): {path}")
+    record_count = body // RECORD_LINE_LENGTH
+
+    with open(path, "r+b") as f:
+        mm = mmap.mmap(f.fileno(), 0)
+        try:
+            injector.plan(record_count, chr(mm[_FILE_TYPE]))
+            read_pos = write_pos = HEADER_LINE_LENGTH
+            for ordinal in sorted(injector.planned):
+                start = HEADER_LINE_LENGTH + ordinal * RECORD_LINE_LENGTH
+                if write_pos != read_pos:
+                    mm.move(write_pos, read_pos, start - read_pos)
+                write_pos += start - read_pos
+                record = bytearray(mm[start:start + RECORD_LENGTH])
+                length = injector.apply_record(ordinal, record)
+                mm[write_pos:write_pos + length] = record[:length]
+                mm[write_pos + length] = _NEWLINE
+                write_pos += length + 1
+                read_pos = start + RECORD_LINE_LENGTH
+            if write_pos != read_pos:
+                mm.move(write_pos, read_pos, size - read_pos)
+            new_size = size - (read_pos - write_pos)
+
+            trailer_start = new_size - TRAILER_LINE_LENGTH
+            trailer = bytearray(mm[trailer_start:trailer_start + TRAILER_LENGTH])
+            injector.apply_trailer(trailer)
+            mm[trailer_start:trailer_start + TRAILER_LENGTH] = trailer
+            mm.flush()
+        finally:
+            mm.close()
+        if new_size != size:
+            f.truncate(new_size)
+    return injector.summary()
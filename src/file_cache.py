@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成结果缓存
+Generated File Cache
+
+按生成参数对已生成的文件做内容寻址缓存，CI中反复以相同参数生成同一数据集时直接复用：
+- 缓存键: 生成参数(文件类型、数量、业务组合、种子、处理日期等) + 字典快照指纹 + 生成器代码指纹
+- 命中: 将缓存的数据文件及附属文件(控制文件/索引/故障清单)复制或硬链接到输出路径，
+  也可以直接返回缓存中的路径
+- 未命中: 正常生成后存入缓存
+- 缓存总大小超过上限时按最近使用时间淘汰
+
+只有结果可复现的生成(指定了随机种子且时钟固定)才应使用缓存。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from txn_errors import ConfigError
+from fault_injection import FAULTS_FILE_SUFFIX
+from reconciliation import CONTROL_FILE_SUFFIX
+from record_index import INDEX_FILE_SUFFIX
+
+CACHE_DIR_ENV = "GALAXY_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "gen_galaxy_file")
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+# 命中时的输出方式
+CACHE_MODES = ("copy", "link", "return")
+
+# 随数据文件一起缓存的附属文件
+SIDECAR_SUFFIXES = (CONTROL_FILE_SUFFIX, INDEX_FILE_SUFFIX, FAULTS_FILE_SUFFIX)
+
+_DATA_NAME = "data"
+_META_NAME = "meta.json"
+# 超过该大小的字典文件(如 .dict / .npy)只取大小和修改时间作为指纹，避免每次运行读取全部内容
+_CONTENT_HASH_LIMIT = 4 * 1024 * 1024
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_size(value: str) -> int:
+    """解析缓存大小，如 "500M"、"10G"、"1048576" """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = str(value).strip().upper().rstrip("B")
+    multiplier = units.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in units else text
+    try:
+        size = int(float(number) * multiplier)
+    except ValueError:
+        raise ConfigError(f"缓存大小格式错误: {value}")
+    if size <= 0:
+        raise ConfigError(f"缓存大小必须大于0: {value}")
+    return size
+
+
+def _tree_fingerprint(root: str, digest: "hashlib._Hash", suffixes: Optional[tuple] = None):
+    """将目录下所有文件的相对路径和内容(大文件为大小+修改时间)计入摘要"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name != "__pycache__")
+        for name in sorted(filenames):
+            if suffixes and not name.endswith(suffixes):
+                continue
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            digest.update(os.path.relpath(path, root).encode("utf-8") + b"\0")
+            if stat.st_size <= _CONTENT_HASH_LIMIT:
+                with open(path, "rb") as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+            else:
+                digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("ascii"))
+
+
+def snapshot_fingerprint(config_dir: str) -> str:
+    """字典/配置快照指纹与生成器代码指纹"""
+    digest = hashlib.sha256()
+    _tree_fingerprint(config_dir, digest)
+    digest.update(b"\0src\0")
+    _tree_fingerprint(_SOURCE_DIR, digest, (".py",))
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """生成结果缓存类"""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "copy"):
+        """初始化缓存
+        Args:
+            cache_dir: 缓存目录，默认取环境变量 GALAXY_CACHE_DIR 或 ~/.cache/gen_galaxy_file
+            max_bytes: 缓存总大小上限(字节)
+            mode: 命中时的输出方式: copy 复制 / link 硬链接(跨文件系统时退化为复制) / return 直接返回缓存路径
+                  注意硬链接的文件被原地修改(如 inject-faults)时会同时改坏缓存
+        """
+        if mode not in CACHE_MODES:
+            raise ConfigError(f"不支持的缓存方式: {mode}，支持: {', '.join(CACHE_MODES)}")
+        self.cache_dir = os.path.expanduser(cache_dir or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, params: Dict[str, Any], config_dir: str) -> str:
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(snapshot_fingerprint(config_dir).encode("ascii"))
+        return digest.hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """查找缓存，命中时更新最近使用时间并返回缓存中的数据文件路径"""
+        entry_dir = self._entry_dir(key)
+        data_path = os.path.join(entry_dir, _DATA_NAME)
+        if not os.path.exists(os.path.join(entry_dir, _META_NAME)) or not os.path.exists(data_path):
+            return None
+        now = time.time()
+        os.utime(os.path.join(entry_dir, _META_NAME), (now, now))
+        return data_path
+
+    def materialize(self, key: str, dest_path: str) -> str:
+        """将命中的缓存输出到目标路径（return 方式直接返回缓存路径）"""
+        data_path = self.lookup(key)
+        if data_path is None:
+            raise ConfigError(f"缓存不存在: {key}")
+        if self.mode == "return":
+            return data_path
+        for suffix in ("",) + SIDECAR_SUFFIXES:
+            if os.path.exists(data_path + suffix):
+                self._place(data_path + suffix, dest_path + suffix)
+        return dest_path
+
+    def _place(self, src: str, dest: str):
+        tmp_path = dest + ".tmp"
+        if self.mode == "link":
+            try:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                os.link(src, tmp_path)
+                os.replace(tmp_path, dest)
+                return
+            except OSError:
+                pass  # 跨文件系统等情况退化为复制
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+
+    def store(self, key: str, data_path: str, params: Dict[str, Any]) -> str:
+        """将生成的文件及附属文件存入缓存，然后按需淘汰
+        Returns:
+            str: 缓存中的数据文件路径
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        size = 0
+        for suffix in ("",) + SIDECAR_SUFFIXES:
+            if os.path.exists(data_path + suffix):
+                shutil.copyfile(data_path + suffix, os.path.join(tmp_dir, _DATA_NAME + suffix))
+                size += os.path.getsize(data_path + suffix)
+        with open(os.path.join(tmp_dir, _META_NAME), "w", encoding="utf-8") as f:
+            json.dump({"key": key, "params": params, "size": size,
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.evict()
+        return os.path.join(entry_dir, _DATA_NAME)
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                meta_path = os.path.join(prefix_dir, name, _META_NAME)
+                if not os.path.exists(meta_path):
+                    continue
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    size = json.load(f).get("size", 0)
+                entries.append({"dir": os.path.join(prefix_dir, name), "size": size,
+                                "last_used": os.path.getmtime(meta_path)})
+        return entries
+
+    def evict(self) -> int:
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除条目
+        Returns:
+            int: 删除的条目数
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry["last_used"])
+        total = sum(entry["size"] for entry in entries)
+        removed = 0
+        # 至少保留最近使用的一个条目（即使单个文件超过上限）
+        for entry in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry["dir"], ignore_errors=True)
+            total -= entry["size"]
+            removed += 1
+        return removed
+
+    def get_or_generate(self, params: Dict[str, Any], config_dir: str, dest_path: str,
+                        generate: Callable[[], str]) -> Dict[str, Any]:
+        """命中时输出缓存，未命中时调用 generate() 生成并存入缓存
+        Args:
+            params: 决定生成结果的全部参数
+            config_dir: 配置目录（参与缓存键计算）
+            dest_path: 期望的输出文件路径
+            generate: 生成函数，返回生成的文件路径
+        Returns:
+            Dict: {"hit": 是否命中, "path": 输出文件路径, "key": 缓存键}
+        """
+        key = self.make_key(params, config_dir)
+        if self.lookup(key) is not None:
+            return {"hit": True, "path": self.materialize(key, dest_path), "key": key}
+        data_path = generate()
+        cached_path = self.store(key, data_path, params)
+        return {"hit": False, "path": cached_path if self.mode == "return" else data_path, "key": key}
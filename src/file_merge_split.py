@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件合并与拆分
+File Merge / Split
+
+不重新生成记录，直接对已生成的交易数据文件做合并或拆分：
+- 合并: 将多个相同文件类型的文件中的记录按顺序流式写入一个输出文件
+- 拆分: 将一个文件按记录数、字节大小或交易类型拆分为多个文件
+输出文件均写入新生成的文件头（沿用输入文件的 PARTNER_ID）和按实际记录数重新计算的文件尾，
+记录以大块字节复制，不解析字段（按交易类型拆分时只读取每条记录的交易类型字节）。
+B和M类型的文件不能混合合并。
+"""
+
+import os
+from typing import Dict, List, Sequence
+
+from txn_errors import ConfigError, FormatError
+from common_transaction import CommonTransaction
+from galaxy_file import GalaxyFile
+from galaxy_layout import (
+    HEADER_LINE_LENGTH, MAX_RECORDS_PER_FILE, RECORD_FIELDS, RECORD_LINE_LENGTH, TRAILER_LINE_LENGTH
+)
+
+# 每次复制的记录数（约3.5MB）
+BLOCK_RECORDS = 4096
+
+SPLIT_MODES = ("records", "bytes", "type")
+
+_TRANSACTION_TYPE = RECORD_FIELDS["TRANSACTION_TYPE"][0]
+
+
+class _PartWriter:
+    """输出文件写入类：写入新文件头，结束时按实际记录数写入文件尾"""
+
+    def __init__(self, path: str, file_type: str, partner_id: str, common: CommonTransaction):
+        self.path = path
+        self.file_type = file_type
+        self.common = common
+        self.count = 0
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(common.generate_header(file_type, partner_id).encode("ascii") + b"\n")
+
+    def write(self, data, count: int):
+        """写入整条记录的字节块"""
+        if self.count + count > MAX_RECORDS_PER_FILE:
+            raise FormatError(f"输出文件记录数超过文件尾上限({MAX_RECORDS_PER_FILE}条): {self.path}")
+        self._file.write(data)
+        self.count += count
+
+    def close(self) -> Dict[str, object]:
+        trailer = self.common.generate_trailer(self.file_type, self.count + 2)
+        self._file.write(trailer.encode("ascii") + b"\n")
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return {"path": self.path, "count": self.count}
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+def _iter_blocks(path: str, record_count: int, block_records: int = BLOCK_RECORDS):
+    """按块读取文件中的记录行，返回 (字节块, 记录数)"""
+    with open(path, "rb") as f:
+        f.seek(HEADER_LINE_LENGTH)
+        remaining = record_count
+        while remaining:
+            count = min(block_records, remaining)
+            data = f.read(count * RECORD_LINE_LENGTH)
+            if len(data) != count * RECORD_LINE_LENGTH:
+                raise FormatError(f"读取记录失败: {path}")
+            yield data, count
+            remaining -= count
+
+
+def _open_input(path: str):
+    """读取输入文件的文件类型、PARTNER_ID 和记录数（校验定长结构）"""
+    with GalaxyFile(path) as galaxy:
+        return galaxy.file_type, galaxy.header_field("PARTNER_ID"), galaxy.record_count
+
+
+class FileMergeSplit:
+    """文件合并/拆分类"""
+
+    def __init__(self, common: CommonTransaction = None, config_dir: str = "config"):
+        """初始化
+        Args:
+            common: 用于生成文件头/文件尾的公共交易生成器，为空时按 config_dir 创建
+            config_dir: 配置目录
+        """
+        self.common = common or CommonTransaction(config_dir)
+
+    def merge(self, input_paths: Sequence[str], output_path: str) -> Dict[str, object]:
+        """将多个文件的记录按顺序合并为一个文件
+        Returns:
+            Dict: {"path": 输出文件路径, "count": 记录数}
+        """
+        if not input_paths:
+            raise ConfigError("至少需要一个输入文件")
+        inputs = [(path, *_open_input(path)) for path in input_paths]
+        file_types = {file_type for _, file_type, _, _ in inputs}
+        if len(file_types) > 1:
+            raise FormatError(f"不能合并不同文件类型的文件: {', '.join(sorted(file_types))}")
+        total = sum(count for _, _, _, count in inputs)
+        if total > MAX_RECORDS_PER_FILE:
+            raise FormatError(f"合并后记录数 {total} 超过文件尾上限({MAX_RECORDS_PER_FILE}条)，请先拆分")
+
+        _, file_type, partner_id, _ = inputs[0]
+        writer = _PartWriter(output_path, file_type, partner_id, self.common)
+        try:
+            for path, _, _, count in inputs:
+                for data, block_count in _iter_blocks(path, count):
+                    writer.write(data, block_count)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def split(self, input_path: str, output_prefix: str = None, mode: str = "records",
+              size: int = None) -> List[Dict[str, object]]:
+        """拆分一个文件
+        Args:
+            input_path: 输入文件路径
+            output_prefix: 输出文件名前缀，默认为输入文件路径；
+                           按记录数/字节拆分时输出 <前缀>_001、<前缀>_002 ...，按交易类型拆分时输出 <前缀>_H ...
+            mode: records 按记录数 / bytes 按文件字节大小(含文件头和文件尾) / type 按交易类型
+            size: 每个文件的记录数或字节数（按交易类型拆分时不需要）
+        Returns:
+            List[Dict]: 每个输出文件的 {"path", "count"}
+        """
+        if mode not in SPLIT_MODES:
+            raise ConfigError(f"不支持的拆分方式: {mode}，支持: {', '.join(SPLIT_MODES)}")
+        file_type, partner_id, record_count = _open_input(input_path)
+        output_prefix = output_prefix or input_path
+        if mode == "type":
+            return self._split_by_type(input_path, output_prefix, file_type, partner_id, record_count)
+
+        if not size or size < 1:
+            raise ConfigError(f"拆分大小必须大于0: {size}")
+        if mode == "bytes":
+            records_per_part = (size - HEADER_LINE_LENGTH - TRAILER_LINE_LENGTH) // RECORD_LINE_LENGTH
+            if records_per_part < 1:
+                raise ConfigError(f"拆分字节数过小，至少需要容纳文件头、文件尾和一条记录: {size}")
+        else:
+            records_per_part = size
+        records_per_part = min(records_per_part, MAX_RECORDS_PER_FILE)
+
+        parts = []
+        writer = None
+        try:
+            for data, block_count in _iter_blocks(input_path, record_count):
+                position = 0
+                while position < block_count:
+                    if writer is None:
+                        writer = _PartWriter(f"{output_prefix}_{len(parts) + 1:03d}",
+                                             file_type, partner_id, self.common)
+                    take = min(records_per_part - writer.count, block_count - position)
+                    writer.write(data[position * RECORD_LINE_LENGTH:(position + take) * RECORD_LINE_LENGTH], take)
+                    position += take
+                    if writer.count == records_per_part:
+                        parts.append(writer.close())
+                        writer = None
+            if writer is not None:
+                parts.append(writer.close())
+                writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+        return parts
+
+    def _split_by_type(self, input_path: str, output_prefix: str, file_type: str, partner_id: str,
+                       record_count: int) -> List[Dict[str, object]]:
+        """按交易类型拆分：块内连续的同类型记录作为一段写入"""
+        writers: Dict[str, _PartWriter] = {}
+        try:
+            for data, block_count in _iter_blocks(input_path, record_count):
+                run_start = 0
+                run_type = data[_TRANSACTION_TYPE:_TRANSACTION_TYPE + 1]
+                for i in range(1, block_count + 1):
+                    offset = i * RECORD_LINE_LENGTH + _TRANSACTION_TYPE
+                    transaction_type = data[offset:offset + 1] if i < block_count else None
+                    if transaction_type == run_type:
+                        continue
+                    code = run_type.decode("ascii")
+                    writer = writers.get(code)
+                    if writer is None:
+                        writer = writers[code] = _PartWriter(f"{output_prefix}_{code}", file_type,
+                                                             partner_id, self.common)
+                    writer.write(data[run_start * RECORD_LINE_LENGTH:i * RECORD_LINE_LENGTH], i - run_start)
+                    run_start, run_type = i, transaction_type
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
+        return [writers[code].close() for code in sorted(writers)]
@@ -7,12 +7,28 @@ Transaction Data Merger
 将公共交易数据和业务特定数据合并成完整的交易数据文件。
 """
 
+import copy
 import os
 import random
-from typing import Dict, List, Any
+import sys
+from contextlib import ExitStack, nullcontext
+from typing import Callable, Dict, List, Any, Optional, TextIO, Tuple
 
-from txn_errors import FileTypeError
-from common_transaction import CommonTransaction
+from txn_errors import ConfigError, FileTypeError, BusinessTypeError
+from common_transaction import CommonTransaction, RecordContext
+from checkpoint import (
+    CHECKPOINT_FILE_SUFFIX, capture_state, find_checkpoint, find_partner_checkpoint, load_checkpoint,
+    params_digest, restore_state, write_checkpoint
+)
+from fault_injection import FaultInjector
+from generation_profile import GenerationProfile
+from linked_scenarios import LinkedScenario, LINK_REFUND, LINK_REVERSAL
+from progress import (
+    ProgressEvent, ProgressTracker, PHASE_RECORDS, PHASE_TRAILER, PHASE_SIDECARS, PHASE_DONE
+)
+from galaxy_layout import MAX_RECORDS_PER_FILE, NEWLINE, HEADER_FIELDS, field_slice
+from reconciliation import ReconciliationTotals
+from record_index import RecordIndexBuilder, INDEX_FILE_SUFFIX
 from serviceDesc_hotel import ServiceDescHotel
 from serviceDesc_train import ServiceDescTrain
 from serviceDesc_car import ServiceDescCar
@@ -20,13 +36,43 @@ from serviceDesc_ship import ServiceDescShip
 from serviceDesc_A import ServiceDescA
 from serviceDesc_other import ServiceDescOther
 from serviceDesc_flight import ServiceDescFlight
+from utils.clock import SystemClock
+from utils.random_tokens import RandomTokens
+from utils.unique_numbers import UniqueDocumentNumbers
+
+
+# 业务类型名称与交易类型代码(第2字段)的对应关系
+BUSINESS_TYPE_CODES = {
+    "hotel": "H",
+    "train": "T",
+    "car": "C",
+    "ship": "S",
+    "fee": "A",
+    "other": "O",
+    "flight": "F",
+}
+
+# 每批写入的记录数
+WRITE_BATCH_SIZE = 1000
+
+_PURCHASE_DATE = field_slice("PURCHASE_DATE")
+_PROCESSING_DATE = field_slice("PROCESSING_DATE", HEADER_FIELDS)
 
 
 class FullTransactionMerger:
     """交易数据合并器类"""
     
-    def __init__(self, config_dir: str = "config"):
-        """初始化合并器"""
+    def __init__(self, config_dir: str = "config", unique_doc_numbers: bool = False,
+                 run_key: str = None, shard: int = 0, shard_count: int = 1, clock=None):
+        """初始化合并器
+        Args:
+            config_dir: 配置目录
+            unique_doc_numbers: 是否启用文档号唯一模式（基于带密钥置换，保证不重复）
+            run_key: 唯一模式的运行密钥，同一次多文件运行使用相同的值
+            shard: 唯一模式的分片编号（并行运行时每个进程一个）
+            shard_count: 唯一模式的分片总数
+            clock: 时钟，为空时使用系统时间；补数时使用固定在处理日期的 FixedClock
+        """
         self.config_dir = config_dir
         
         # 确保输出目录存在
@@ -34,97 +80,536 @@ class FullTransactionMerger:
         self.output_dir = os.path.normpath(os.path.join(current_dir, "..", "output"))
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # 初始化生成器
-        self.common = CommonTransaction(config_dir)
-        self.hotel = ServiceDescHotel(config_dir)
-        self.train = ServiceDescTrain()
-        self.car = ServiceDescCar()
-        self.ship = ServiceDescShip(config_dir)
-        self.fee = ServiceDescA()
-        self.other = ServiceDescOther()
-        self.flight = ServiceDescFlight(config_dir)
+        # 初始化生成器（共享同一个随机令牌服务，reseed 时统一重置）
+        self.tokens = RandomTokens()
+        self.common = CommonTransaction(config_dir, tokens=self.tokens)
+        self.hotel = ServiceDescHotel(config_dir, tokens=self.tokens)
+        self.train = ServiceDescTrain(config_dir, tokens=self.tokens)
+        self.car = ServiceDescCar(config_dir, tokens=self.tokens)
+        self.ship = ServiceDescShip(config_dir, tokens=self.tokens)
+        self.fee = ServiceDescA(tokens=self.tokens)
+        self.other = ServiceDescOther(tokens=self.tokens)
+        self.flight = ServiceDescFlight(config_dir, tokens=self.tokens)
+        self.use_clock(clock or SystemClock())
+        
+        # 关联交易场景（退款/冲正），为空时每条记录相互独立
+        self.linked = None
+        
+        # 文档号唯一模式：所有业务类型共享同一个分配器，保证跨文件不重复
+        self.doc_numbers = None
+        if unique_doc_numbers:
+            self.use_doc_numbers(UniqueDocumentNumbers(run_key, shard, shard_count))
+        
+        # 生成画像，为空时各字段按生成器原有的规则随机生成
+        self.profile = None
+    
+    def use_doc_numbers(self, doc_numbers: UniqueDocumentNumbers = None):
+        """设置(或清除)所有业务生成器共享的唯一文档号分配器"""
+        self.doc_numbers = doc_numbers
+        for generator in (self.hotel, self.train, self.car, self.ship,
+                          self.fee, self.other, self.flight):
+            generator.doc_numbers = doc_numbers
+    
+    def fork(self) -> "FullTransactionMerger":
+        """创建共享已加载字典的合并器副本，供另一个线程独立生成
+        业务生成器、随机令牌服务、卡号池、流水号计数器、唯一文档号分配器、画像和关联交易场景与原合并器共享
+        （均可多线程使用），各副本的流水号互不重复；
+        副本上不应再调用 use_clock / use_doc_numbers（会改变共享的业务生成器）
+        """
+        clone = copy.copy(self)
+        clone.common = self.common.fork()
+        return clone
+    
+    def use_clock(self, clock):
+        """设置公共字段和所有业务生成器共享的时钟"""
+        self.clock = clock
+        for generator in (self.common, self.hotel, self.train, self.car, self.ship,
+                          self.fee, self.other, self.flight):
+            generator.clock = clock
+    
+    def reseed(self, seed: int):
+        """重置所有随机状态，使相同参数和种子(配合固定时钟)生成完全相同的文件"""
+        self.reseed_random(seed)
+        self.common.transaction_counter = 1
+
+    def reseed_random(self, seed: Optional[int]):
+        """只重置随机源（random、随机令牌服务、卡号抽样器），不重置流水号计数；seed 为空时使用系统熵"""
+        random.seed(seed)
+        self.tokens.reseed(seed)
+        for sampler in self.common.card_samplers.values():
+            sampler.reseed(seed)
+    
+    def use_profile(self, profile: GenerationProfile = None):
+        """设置(或清除)生成画像：公共字段按画像抽样，服务描述字段在记录生成后按画像覆盖"""
+        self.profile = profile
+        self.common.profile = profile
+    
+    def use_linked_scenario(self, scenario: LinkedScenario = None):
+        """设置(或清除)关联交易场景，蓄水池在多次生成文件之间保留"""
+        self.linked = scenario
     
-    def generate_file(self, file_type: str, count: int = 1, output_filename: str = None) -> str:
-        """生成完整的交易数据文件"""
+    def expand_business_types(self, file_type: str, business_types: List[Dict[str, Any]]) -> List[str]:
+        """将业务类型配置列表展开为逐条记录的交易类型代码
+        Args:
+            file_type: 文件类型 B 或 M
+            business_types: [{"business_type": "hotel", "count": 3}, ...]
+        Returns:
+            List[str]: 每条交易记录的交易类型代码
+        """
+        transaction_types = []
+        for item in business_types:
+            business_type = item.get("business_type")
+            code = BUSINESS_TYPE_CODES.get(business_type)
+            if code is None:
+                raise BusinessTypeError(
+                    f"不支持的业务类型: {business_type}，支持: {', '.join(BUSINESS_TYPE_CODES)}")
+            if file_type == "B" and code != "F":
+                raise BusinessTypeError(f"B类型文件只能包含flight业务，当前值: {business_type}")
+            transaction_types.extend([code] * int(item.get("count", 1)))
+        return transaction_types
+    
+    def output_path(self, file_type: str, output_filename: str = None, filename_suffix: str = "") -> str:
+        """输出文件路径：自定义文件名补全 .txt 后缀，否则按当前时钟生成标准文件名"""
+        if output_filename:
+            filename = output_filename
+            if not filename.endswith('.txt'):
+                filename += '.txt'
+        else:
+            filename = self.common.generate_standard_filename(file_type) + filename_suffix
+        return os.path.join(self.output_dir, filename)
+    
+    def generate_file(self, file_type: str, count: int = 1, output_filename: str = None,
+                      business_types: List[Dict[str, Any]] = None, filename_suffix: str = "",
+                      write_control: bool = True, write_index: bool = False,
+                      faults: FaultInjector = None, output_stream: TextIO = None,
+                      progress: Callable[[ProgressEvent], None] = None, seed: int = None,
+                      checkpoint_every: int = None, resume: bool = False, filepath: str = None) -> str:
+        """生成完整的交易数据文件
+        记录按批流式写入文件，同时增量累计对账汇总，结束后写入 <文件名>.control.json
+        设置了关联交易场景时，按比例生成指向之前销售记录的退款/冲正记录
+        指定 output_stream 时数据写入该流(如标准输出/管道)而不落盘，状态信息输出到标准错误，
+        控制文件等附属文件仍按文件名写入输出目录
+        指定 checkpoint_every 时每隔约该记录数(按批取整)写入检查点 <文件名>.ckpt，
+        resume 为真且存在检查点时截断数据文件中不完整的记录并从检查点继续生成
+        Args:
+            file_type: 文件类型 B 或 M
+            count: 交易记录数量（指定business_types时以其数量之和为准），范围1-MAX_RECORDS_PER_FILE，
+                   更大的运行需分为多个文件
+            output_filename: 自定义输出文件名，为空时使用标准文件名
+            business_types: 业务类型配置列表，为空时M文件随机选择交易类型
+            filename_suffix: 标准文件名的后缀，用于同一秒内生成多个文件时区分
+            write_control: 是否写入对账控制文件
+            write_index: 是否写入记录索引文件 <文件名>.idx（流水号/文档号/卡号 -> 记录序号）
+            faults: 故障注入器，写入前改坏按比例选中的记录，并写入 <文件名>.faults.json
+            output_stream: 输出流，为空时写入输出目录下的文件
+            progress: 进度回调，每批记录写入后按时间间隔节流调用（见 progress 模块）
+            seed: 随机种子，指定时生成前重置随机状态（需配合不推进的固定时钟才能完全复现）
+            checkpoint_every: 检查点间隔(记录数)，为空时不写检查点
+            resume: 是否从检查点继续；未指定输出文件名时使用输出目录中该文件类型最近的检查点
+            filepath: 完整的输出文件路径，指定时忽略 output_filename / filename_suffix
+                      （批量任务按运行清单中记录的路径继续未完成的文件）
+        Returns:
+            str: 输出文件路径（流式输出时为附属文件对应的文件路径）
+        """
         if file_type not in ["B", "M"]:
             raise FileTypeError(f"不支持的文件类型: {file_type}，只支持 B 或 M")
+        if seed is not None:
+            self.reseed(seed)
+        
+        transaction_types = None
+        if business_types:
+            transaction_types = self.expand_business_types(file_type, business_types)
+            count = len(transaction_types)
+        if not 1 <= count <= MAX_RECORDS_PER_FILE:
+            raise ConfigError(f"交易记录数量必须在1-{MAX_RECORDS_PER_FILE}之间(文件尾记录数为5位)，"
+                              f"更多记录请分为多个文件: {count}")
         
-        lines = []
+        if output_stream is not None and write_index:
+            raise ConfigError("流式输出时不能生成索引文件（索引需要按偏移读取数据文件）")
+        if checkpoint_every is not None or resume:
+            if output_stream is not None:
+                raise ConfigError("流式输出时不能使用检查点（无法截断已输出的数据）")
+            if self.linked is not None:
+                raise ConfigError("关联交易场景不支持检查点（蓄水池状态过大）")
+            if checkpoint_every is not None and checkpoint_every < 1:
+                raise ConfigError(f"检查点间隔必须大于0: {checkpoint_every}")
+        if faults is not None:
+            if write_index and faults.changes_length:
+                raise ConfigError("缩短记录的故障规则会改变记录偏移，不能同时生成索引文件")
+            faults.plan(count, file_type)
         
-        # 1. 生成文件头
-        header = self.common.generate_header(file_type)
-        lines.append(header)
+        if filepath is None:
+            if resume and not output_filename:
+                filepath = find_checkpoint(self.output_dir, file_type)
+            filepath = filepath or self.output_path(file_type, output_filename, filename_suffix)
+        filename = os.path.basename(filepath)
+        checkpoint_path = filepath + CHECKPOINT_FILE_SUFFIX
+        digest = params_digest(file_type, count, transaction_types, faults, write_index)
         
-        # 2. 生成交易记录
-        for _ in range(count):
-            # 生成随机金额
-            self.common.last_generated_amount = round(random.uniform(100.0, 2000.0), 2)
+        totals = ReconciliationTotals(file_type)
+        index = RecordIndexBuilder() if write_index else None
+        linked = self.linked
+        if linked is not None:
+            linked.reset_counts()
+        tracker = ProgressTracker(count, progress) if progress is not None else None
+        bytes_written = 0
+        start = 0
+        status = sys.stdout if output_stream is None else sys.stderr
+        
+        checkpoint = load_checkpoint(checkpoint_path) if resume else None
+        if checkpoint is not None:
+            if checkpoint["params"] != digest:
+                raise ConfigError(f"生成参数与检查点不一致，不能恢复: {checkpoint_path}")
+            restore_state(self, checkpoint["state"], totals, faults)
+            start = checkpoint["records_done"]
+            bytes_written = checkpoint["offset"]
+            processing_date = checkpoint["processing_date"]
+            # 丢弃检查点之后写入的(可能不完整的)记录
+            os.truncate(filepath, bytes_written)
+            if index is not None:
+                index.add_from_file(filepath, start)
+            print(f"🔁 从检查点继续: {filepath} (已完成 {start}/{count} 条)", file=status)
+        elif resume:
+            print(f"🔁 未找到检查点，重新生成: {filepath}", file=status)
+        
+        if output_stream is not None:
+            output = nullcontext(output_stream)
+        else:
+            output = open(filepath, 'a' if checkpoint is not None else 'w', encoding='utf-8')
+        with output as f:
+            # 1. 生成文件头（从检查点继续时文件头已在文件中）
+            if checkpoint is None:
+                header = self.common.generate_header(file_type)
+                f.write(header + NEWLINE)
+                bytes_written += len(header) + 1
+                processing_date = header[_PROCESSING_DATE]
             
-            # 生成完整的交易记录
-            transaction = self.merge_transaction(file_type)
-            lines.append(transaction)
+            # 2. 生成交易记录，按批写入
+            if tracker is not None:
+                tracker.set_phase(PHASE_RECORDS)
+            batch = []
+            last_checkpoint = start
+            for i in range(start, count):
+                transaction_type = transaction_types[i] if transaction_types else None
+                original = linked.pick_original(transaction_type, file_type) if linked is not None else None
+                if original is not None:
+                    # 关联记录：引用蓄水池中之前的销售记录
+                    transaction, amount_breakdown = linked.build_linked_record(
+                        original, self.common.generate_serial_number(), processing_date)
+                else:
+                    # 生成完整的交易记录（随机金额）
+                    transaction, context = self.build_record(file_type, transaction_type)
+                    amount_breakdown = context.amount_breakdown
+                    if linked is not None:
+                        linked.offer(transaction)
+                totals.add(transaction[1], *amount_breakdown, transaction[_PURCHASE_DATE])
+                if index is not None:
+                    index.add(transaction)
+                if faults is not None:
+                    transaction = faults.apply_line(i, transaction)
+                batch.append(transaction)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    chunk = NEWLINE.join(batch) + NEWLINE
+                    f.write(chunk)
+                    bytes_written += len(chunk)
+                    batch.clear()
+                    if tracker is not None:
+                        tracker.update(i + 1, bytes_written)
+                    if checkpoint_every is not None and i + 1 - last_checkpoint >= checkpoint_every:
+                        # 批次边界：已写入的记录与保存的随机状态一一对应
+                        f.flush()
+                        os.fsync(f.fileno())
+                        write_checkpoint(checkpoint_path, {
+                            "file_type": file_type, "params": digest, "records_done": i + 1,
+                            "offset": bytes_written, "processing_date": processing_date,
+                            "state": capture_state(self, totals, faults),
+                        })
+                        last_checkpoint = i + 1
+            if batch:
+                chunk = NEWLINE.join(batch) + NEWLINE
+                f.write(chunk)
+                bytes_written += len(chunk)
+            
+            # 3. 生成文件尾（记录数包含头和尾）
+            if tracker is not None:
+                tracker.update(count, bytes_written)
+                tracker.set_phase(PHASE_TRAILER)
+            total_records = count + 2
+            trailer = self.common.generate_trailer(file_type, total_records)
+            if faults is not None:
+                trailer_buffer = bytearray(trailer.encode("ascii"))
+                faults.apply_trailer(trailer_buffer)
+                trailer = trailer_buffer.decode("ascii")
+            f.write(trailer + NEWLINE)
+            f.flush()
+            bytes_written += len(trailer) + 1
         
-        # 3. 生成文件尾
-        total_records = len(lines) + 1
-        trailer = self.common.generate_trailer(file_type, total_records)
-        lines.append(trailer)
+        if tracker is not None:
+            tracker.bytes_written = bytes_written
+            tracker.set_phase(PHASE_SIDECARS)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
         
-        # 4. 写入文件
-        if output_filename:
-            filename = output_filename
-            if not filename.endswith('.txt'):
-                filename += '.txt'
+        if output_stream is None:
+            print(f"\n✅ 文件生成成功: {filepath}", file=status)
         else:
-            filename = self.common.generate_standard_filename(file_type)
+            print(f"\n✅ 文件已流式输出: {filename}", file=status)
+        print(f"    📊 总交易记录数: {count}", file=status)
+        print(f"    📁 总文件行数: {total_records} (头: 1, 交易: {count}, 尾: 1)", file=status)
+        
+        if linked is not None:
+            linked.save_state()
+            print(f"    🔗 关联记录: 退款 {linked.counts[LINK_REFUND]}, 冲正 {linked.counts[LINK_REVERSAL]}", file=status)
         
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            for line in lines:
-                f.write(line + '\n')
+        if write_control:
+            extra = {"linked": dict(linked.counts)} if linked is not None else {}
+            control_path = totals.write_control_file(
+                filepath, processing_date=processing_date, record_count=total_records, **extra)
+            print(f"    🧾 对账控制文件: {control_path}", file=status)
         
-        print(f"\n✅ 文件生成成功: {filepath}")
-        print(f"    📊 总交易记录数: {count}")
-        print(f"    📁 总文件行数: {len(lines)} (头: 1, 交易: {count}, 尾: 1)")
+        if index is not None:
+            index.write(filepath + INDEX_FILE_SUFFIX)
+            print(f"    🔎 记录索引文件: {filepath + INDEX_FILE_SUFFIX}", file=status)
         
+        if faults is not None:
+            manifest_path = faults.write_manifest(filepath)
+            print(f"    💥 故障注入: {len(faults.planned)} 条记录, 清单: {manifest_path}", file=status)
+        
+        if tracker is not None:
+            tracker.set_phase(PHASE_DONE)
         return filepath
     
-    def merge_transaction(self, file_type: str) -> str:
-        """合并生成完整的交易记录 (850位)"""
-        # 1. 生成公共字段（1-5, 7-48, 50字段）
-        common_fields = self.common.generate_common_fields(file_type)
+    def resolve_partner_counts(self, partner_counts: Dict[str, int] = None) -> Dict[str, int]:
+        """确定多合作方生成的合作方及记录数，未指定时使用 card_numbers.yaml 中配置了 count 的合作方"""
+        if not partner_counts:
+            partner_counts = {code: partner["count"] for code, partner in self.common.partners.items()
+                              if partner["count"]}
+            if not partner_counts:
+                raise ConfigError("未指定合作方记录数，card_numbers.yaml 中也没有配置 count 的合作方")
+        for code, count in partner_counts.items():
+            if code not in self.common.partners:
+                raise ConfigError(f"未配置的合作方: {code}，已配置: {', '.join(self.common.partners)}")
+            if not 1 <= int(count) <= MAX_RECORDS_PER_FILE:
+                raise ConfigError(f"合作方 {code} 的记录数必须在1-{MAX_RECORDS_PER_FILE}之间: {count}")
+        return {code: int(count) for code, count in partner_counts.items()}
+    
+    def generate_partner_files(self, partner_counts: Dict[str, int] = None, write_control: bool = True,
+                               output_streams: Dict[str, TextIO] = None,
+                               progress: Callable[[ProgressEvent], None] = None,
+                               seed: int = None, checkpoint_every: int = None,
+                               resume: bool = False) -> Dict[str, str]:
+        """一次生成多个合作方的交易数据文件
+        所有合作方共用同一组已加载字典的生成器，在一遍循环中按剩余记录数随机决定每条记录所属的合作方，
+        将记录分发到各合作方各自的输出（各自的文件头/文件尾/对账控制文件），
+        文件头使用合作方的 PARTNER_ID，记录使用合作方自己的卡号
+        Args:
+            partner_counts: 合作方代码 -> 记录数，为空时使用 card_numbers.yaml 中各合作方的 count
+            write_control: 是否为每个文件写入对账控制文件
+            output_streams: 合作方代码 -> 输出流，其中的合作方流式写入该流，其余写入输出目录
+            progress: 进度回调，按全部合作方的记录总数报告
+            seed: 随机种子，指定时生成前重置随机状态
+            checkpoint_every: 检查点间隔(记录数)，每隔约该记录数写出各文件未写入的记录并写入整个运行的检查点
+            resume: 是否从输出目录中最近的多合作方检查点继续（各文件截断到检查点偏移）
+        Returns:
+            Dict[str, str]: 合作方代码 -> 输出文件路径
+        """
+        if self.linked is not None:
+            raise ConfigError("多合作方生成不支持关联交易场景（蓄水池会跨合作方引用卡号）")
+        partner_counts = self.resolve_partner_counts(partner_counts)
+        if seed is not None:
+            self.reseed(seed)
+        output_streams = output_streams or {}
+        if checkpoint_every is not None or resume:
+            if output_streams:
+                raise ConfigError("流式输出时不能使用检查点（无法截断已输出的数据）")
+            if checkpoint_every is not None and checkpoint_every < 1:
+                raise ConfigError(f"检查点间隔必须大于0: {checkpoint_every}")
+        
+        total_count = sum(partner_counts.values())
+        digest = params_digest("partners", total_count,
+                               [f"{code}={count}" for code, count in partner_counts.items()], None, False)
+        checkpoint_path = find_partner_checkpoint(self.output_dir) if resume else None
+        checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+        if checkpoint is not None and checkpoint["params"] != digest:
+            raise ConfigError(f"生成参数与检查点不一致，不能恢复: {checkpoint_path}")
+        tracker = ProgressTracker(total_count, progress) if progress is not None else None
+        bytes_written = 0
+        status = sys.stdout if not output_streams else sys.stderr
+        outputs = []
+        start = 0
+        with ExitStack() as stack:
+            # 1. 打开各合作方的输出并写入各自的文件头（从检查点继续时截断到检查点偏移）
+            if checkpoint is not None:
+                restore_state(self, checkpoint["state"])
+                start = checkpoint["records_done"]
+                print(f"🔁 从检查点继续: {checkpoint_path} (已完成 {start}/{total_count} 条)", file=status)
+            elif resume:
+                print("🔁 未找到多合作方检查点，重新生成", file=status)
+            for code, count in partner_counts.items():
+                partner = self.common.partners[code]
+                file_type = partner["file_type"]
+                totals = ReconciliationTotals(file_type)
+                if checkpoint is not None:
+                    saved = checkpoint["files"][code]
+                    filepath = saved["filepath"]
+                    os.truncate(filepath, saved["offset"])
+                    f = stack.enter_context(open(filepath, 'a', encoding='utf-8'))
+                    vars(totals).update(saved["totals"])
+                    remaining, processing_date, offset = saved["remaining"], saved["processing_date"], saved["offset"]
+                else:
+                    filepath = self.output_path(file_type, filename_suffix=f"_{code}")
+                    if code in output_streams:
+                        f = output_streams[code]
+                    else:
+                        f = stack.enter_context(open(filepath, 'w', encoding='utf-8'))
+                    header = self.common.generate_header(file_type, partner["partner_id"])
+                    f.write(header + NEWLINE)
+                    remaining, processing_date, offset = count, header[_PROCESSING_DATE], len(header) + 1
+                bytes_written += offset
+                outputs.append({
+                    "partner": partner, "file": f, "filepath": filepath, "count": count,
+                    "remaining": remaining, "batch": [], "processing_date": processing_date,
+                    "totals": totals, "offset": offset,
+                })
+            if checkpoint_path is None and checkpoint_every is not None:
+                checkpoint_path = outputs[0]["filepath"] + CHECKPOINT_FILE_SUFFIX
+            
+            # 2. 按剩余记录数加权随机分发记录（等价于对全部记录做一次洗牌），各输出按批写入
+            if tracker is not None:
+                tracker.set_phase(PHASE_RECORDS)
+            remaining_total = total_count - start
+            last_checkpoint = start
+            for i in range(start, total_count):
+                slot = random.randrange(remaining_total)
+                for output in outputs:
+                    if slot < output["remaining"]:
+                        break
+                    slot -= output["remaining"]
+                output["remaining"] -= 1
+                remaining_total -= 1
+                
+                partner = output["partner"]
+                transaction, context = self.build_record(partner["file_type"], partner=partner)
+                output["totals"].add(transaction[1], *context.amount_breakdown, transaction[_PURCHASE_DATE])
+                batch = output["batch"]
+                batch.append(transaction)
+                if len(batch) >= WRITE_BATCH_SIZE or output["remaining"] == 0:
+                    bytes_written += self._flush_partner_batch(output)
+                    if tracker is not None:
+                        tracker.update(i + 1, bytes_written)
+                if checkpoint_every is not None and i + 1 - last_checkpoint >= checkpoint_every:
+                    # 写出所有文件未写入的记录，各文件的内容与保存的随机状态一一对应
+                    files = {}
+                    for item in outputs:
+                        bytes_written += self._flush_partner_batch(item)
+                        item["file"].flush()
+                        os.fsync(item["file"].fileno())
+                        files[item["partner"]["code"]] = {
+                            "filepath": item["filepath"], "offset": item["offset"],
+                            "remaining": item["remaining"], "processing_date": item["processing_date"],
+                            "totals": dict(vars(item["totals"])),
+                        }
+                    write_checkpoint(checkpoint_path, {
+                        "kind": "partners", "params": digest, "records_done": i + 1,
+                        "files": files, "state": capture_state(self),
+                    })
+                    last_checkpoint = i + 1
+            
+            # 3. 写入各自的文件尾
+            if tracker is not None:
+                tracker.set_phase(PHASE_TRAILER)
+            for output in outputs:
+                trailer = self.common.generate_trailer(output["partner"]["file_type"], output["count"] + 2)
+                output["file"].write(trailer + NEWLINE)
+                output["file"].flush()
+                bytes_written += len(trailer) + 1
+        
+        if tracker is not None:
+            tracker.bytes_written = bytes_written
+            tracker.set_phase(PHASE_SIDECARS)
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        
+        print(f"\n✅ 多合作方文件生成成功: {len(outputs)} 个文件, 共 {total_count} 条交易记录", file=status)
+        for output in outputs:
+            partner = output["partner"]
+            print(f"    🏢 {partner['code']} ({partner['partner_id']}, {partner['file_type']}文件): "
+                  f"{output['count']} 条 -> {output['filepath']}", file=status)
+            if write_control:
+                output["totals"].write_control_file(
+                    output["filepath"], processing_date=output["processing_date"],
+                    record_count=output["count"] + 2, partner=partner["code"],
+                    partner_id=partner["partner_id"])
         
-        # 获取交易类型（第2个字段，索引1）
-        transaction_type = common_fields[1]
+        if tracker is not None:
+            tracker.set_phase(PHASE_DONE)
+        return {output["partner"]["code"]: output["filepath"] for output in outputs}
+    
+    @staticmethod
+    def _flush_partner_batch(output: Dict[str, Any]) -> int:
+        """写出一个合作方输出中未写入的记录，返回写入的字节数"""
+        batch = output["batch"]
+        if not batch:
+            return 0
+        chunk = NEWLINE.join(batch) + NEWLINE
+        output["file"].write(chunk)
+        output["offset"] += len(chunk)
+        batch.clear()
+        return len(chunk)
+    
+    def merge_transaction(self, file_type: str, transaction_type: str = None,
+                          partner: Dict[str, Any] = None, amount: float = None) -> str:
+        """合并生成完整的交易记录 (850位)
+        Args:
+            file_type: 文件类型 B 或 M
+            transaction_type: 指定交易类型代码，为空时随机选择
+            partner: 合作方配置，指定时使用该合作方的卡号
+            amount: 交易金额(元)，为空时随机生成
+        """
+        return self.build_record(file_type, transaction_type, partner, amount)[0]
+    
+    def build_record(self, file_type: str, transaction_type: str = None, partner: Dict[str, Any] = None,
+                     amount: float = None) -> Tuple[str, RecordContext]:
+        """生成完整的交易记录，同时返回其生成上下文（交易类型、金额拆分、流水号）
+        本条记录的取值只通过上下文传递，多个线程可以同时使用同一个合并器
+        Returns:
+            Tuple[str, RecordContext]: (交易记录, 生成上下文)
+        """
+        context = self.common.new_record_context(file_type, transaction_type, partner, amount)
+        transaction_type = context.transaction_type
+        
+        # 1. 生成公共字段（1-5, 7-48, 50字段）
+        common_fields = self.common.generate_common_fields(context)
         
         # 2. 生成文档号（第6字段）和服务描述（第49字段）
         if transaction_type == "H":
             # H类型使用酒店服务描述
             doc_number = self.hotel.generate_document_number()
-            service_desc = self.hotel.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.hotel.generate_service_description(context.amount)
         elif transaction_type == "T":
             # T类型使用火车票服务描述
             doc_number = self.train.generate_document_number()
-            service_desc = self.train.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.train.generate_service_description(context.amount)
         elif transaction_type == "C":
             # C类型使用租车服务描述
             doc_number = self.car.generate_document_number()
-            service_desc = self.car.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.car.generate_service_description(context.amount)
         elif transaction_type == "S":
             # S类型使用邮轮服务描述
             doc_number = self.ship.generate_document_number()
-            service_desc = self.ship.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.ship.generate_service_description(context.amount)
         elif transaction_type == "A":
             # A类型使用服务费业务描述
             doc_number = self.fee.generate_document_number()
-            service_desc = self.fee.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.fee.generate_service_description(context.amount)
         elif transaction_type == "O":
             # O类型使用其他业务描述
             doc_number = self.other.generate_document_number()
-            service_desc = self.other.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.other.generate_service_description(context.amount)
         elif transaction_type == "F":
             # F类型使用机票业务描述
             doc_number = self.flight.generate_document_number(file_type)
-            service_desc = self.flight.generate_service_description(self.common.last_generated_amount)
+            service_desc = self.flight.generate_service_description(context.amount)
         else:
             # 其他类型暂时使用空白填充
             doc_number = " " * 30  # 第6字段，30位
@@ -136,4 +621,7 @@ class FullTransactionMerger:
         # 插入服务描述到倒数第二个位置（50字段前）
         common_fields.insert(-1, service_desc)
         
-        return "".join(common_fields)
+        record = "".join(common_fields)
+        if self.profile is not None:
+            record = self.profile.apply(record, self.tokens)
+        return record, context
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交易数据文件只读视图
+Galaxy File View
+
+以只读方式内存映射已生成的交易数据文件，记录以 RecordView 形式按需提供：
+每个视图只持有一段 memoryview 切片，字段在访问时才解码，
+遍历或切片千万级记录时不会为每个字段创建字符串。
+
+    with GalaxyFile("output/xxx.txt") as galaxy:
+        for record in galaxy:
+            if record.raw("TRANSACTION_TYPE") == b"H":
+                assert record.service_field("ROOM_NIGHTS").isdigit()
+"""
+
+import mmap
+import os
+from decimal import Decimal
+from typing import Dict, Iterator, Union
+
+from txn_errors import FormatError
+from galaxy_layout import (
+    HEADER_FIELDS, HEADER_LENGTH, HEADER_LINE_LENGTH, RECORD_FIELDS, RECORD_LENGTH,
+    RECORD_LINE_LENGTH, SERVICE_FIELDS, TRAILER_FIELDS, TRAILER_LENGTH, TRAILER_LINE_LENGTH
+)
+
+_TRANSACTION_TYPE = RECORD_FIELDS["TRANSACTION_TYPE"][0]
+_TRANSACTION_SIGN = RECORD_FIELDS["TRANSACTION_SIGN"][0]
+_SERVICE_DESCRIPTION = RECORD_FIELDS["SERVICE_DESCRIPTION"][0]
+
+
+def _field_bytes(buffer, fields: Dict, name: str, base: int = 0):
+    offset, length = fields[name]
+    return buffer[base + offset:base + offset + length]
+
+
+class RecordView:
+    """交易记录视图类：基于 memoryview 的850位记录，字段按需解码"""
+
+    __slots__ = ("ordinal", "_mv")
+
+    def __init__(self, mv: memoryview, ordinal: int):
+        self._mv = mv
+        self.ordinal = ordinal
+
+    def raw(self, name: str) -> memoryview:
+        """字段原始字节（不解码，可直接与 bytes 比较）"""
+        return _field_bytes(self._mv, RECORD_FIELDS, name)
+
+    def field(self, name: str) -> str:
+        """字段解码后的字符串（保留定长填充）"""
+        return str(self.raw(name), "ascii")
+
+    @property
+    def transaction_type(self) -> str:
+        return chr(self._mv[_TRANSACTION_TYPE])
+
+    @property
+    def card_number(self) -> str:
+        """卡号（去掉左补的0）"""
+        return self.field("CARD_NUMBER").lstrip("0")
+
+    @property
+    def expiry_date(self) -> str:
+        return self.field("EXPIRY_DATE")
+
+    @property
+    def document_number(self) -> str:
+        return self.field("DOCUMENT_NUMBER").rstrip()
+
+    @property
+    def serial_number(self) -> str:
+        return self.field("TRANSACTION_SERIAL_NUMBER").rstrip()
+
+    @property
+    def purchase_date(self) -> str:
+        return self.field("PURCHASE_DATE")
+
+    @property
+    def amount_cents(self) -> int:
+        """交易金额（分，按 TRANSACTION_SIGN 带符号）"""
+        amount = int(self.raw("TRANSACTION_AMOUNT"))
+        return -amount if self._mv[_TRANSACTION_SIGN] == ord("-") else amount
+
+    @property
+    def amount(self) -> Decimal:
+        """交易金额（元，带符号）"""
+        return Decimal(self.amount_cents).scaleb(-2)
+
+    def service_raw(self, name: str) -> memoryview:
+        """服务描述子字段原始字节（按本记录的交易类型取布局）"""
+        layout = SERVICE_FIELDS.get(self.transaction_type)
+        if layout is None:
+            raise FormatError(f"交易类型 {self.transaction_type} 没有服务描述布局")
+        if name not in layout:
+            raise KeyError(f"交易类型 {self.transaction_type} 的服务描述中没有字段: {name}")
+        return _field_bytes(self._mv, layout, name, _SERVICE_DESCRIPTION)
+
+    def service_field(self, name: str) -> str:
+        """服务描述子字段解码后的字符串（保留定长填充）"""
+        return str(self.service_raw(name), "ascii")
+
+    def service_fields(self) -> Dict[str, str]:
+        """解码本记录全部服务描述子字段"""
+        return {name: self.service_field(name) for name in SERVICE_FIELDS.get(self.transaction_type, {})}
+
+    def to_dict(self) -> Dict[str, str]:
+        """解码全部记录字段"""
+        return {name: self.field(name) for name in RECORD_FIELDS}
+
+    def tobytes(self) -> bytes:
+        return self._mv.tobytes()
+
+    def __str__(self) -> str:
+        return str(self._mv, "ascii")
+
+    def __repr__(self) -> str:
+        return f"RecordView(ordinal={self.ordinal}, type={self.transaction_type!r})"
+
+
+class RecordRange:
+    """记录区间视图类：切片结果，同样按需创建 RecordView"""
+
+    def __init__(self, galaxy: "GalaxyFile", ordinals: range):
+        self._galaxy = galaxy
+        self._ordinals = ordinals
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return RecordRange(self._galaxy, self._ordinals[index])
+        return self._galaxy[self._ordinals[index]]
+
+    def __iter__(self) -> Iterator[RecordView]:
+        for ordinal in self._ordinals:
+            yield self._galaxy[ordinal]
+
+
+class GalaxyFile:
+    """交易数据文件只读视图类"""
+
+    def __init__(self, path: str):
+        """打开并映射交易数据文件
+        Args:
+            path: 交易数据文件路径
+        Raises:
+            FormatError: 文件长度不符合 文件头 + N条记录 + 文件尾 的定长结构
+        """
+        self.path = path
+        size = os.path.getsize(path)
+        body = size - HEADER_LINE_LENGTH - TRAILER_LINE_LENGTH
+        if body < 0 or body % RECORD_LINE_LENGTH:
+            raise FormatError(f"文件长度不符合定长格式: {path} ({size}字节)")
+        self.record_count = body // RECORD_LINE_LENGTH
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mv = memoryview(self._mm)
+        self._trailer_start = size - TRAILER_LINE_LENGTH
+
+    def header_field(self, name: str) -> str:
+        return str(_field_bytes(self._mv, HEADER_FIELDS, name), "ascii")
+
+    def trailer_field(self, name: str) -> str:
+        return str(_field_bytes(self._mv, TRAILER_FIELDS, name, self._trailer_start), "ascii")
+
+    @property
+    def header(self) -> str:
+        return str(self._mv[:HEADER_LENGTH], "ascii")
+
+    @property
+    def trailer(self) -> str:
+        return str(self._mv[self._trailer_start:self._trailer_start + TRAILER_LENGTH], "ascii")
+
+    @property
+    def file_type(self) -> str:
+        return self.header_field("FILE_TYPE")
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return RecordRange(self, range(self.record_count)[index])
+        if index < 0:
+            index += self.record_count
+        if not 0 <= index < self.record_count:
+            raise IndexError(index)
+        start = HEADER_LINE_LENGTH + index * RECORD_LINE_LENGTH
+        return RecordView(self._mv[start:start + RECORD_LENGTH], index)
+
+    def __iter__(self) -> Iterator[RecordView]:
+        for ordinal in range(self.record_count):
+            yield self[ordinal]
+
+    def close(self):
+        """关闭内存映射（仍被外部引用的 RecordView 会使映射延迟到其释放后关闭）"""
+        self._mv.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交易数据文件布局
+Galaxy File Layout
+
+文件由定长的三部分组成，每行以换行符结尾：
+1. 文件头 (74位)
+2. 交易记录 (850位)，字段偏移见 RECORD_FIELDS
+3. 文件尾 (7位)
+"""
+
+from typing import Dict, List, Tuple
+
+HEADER_LENGTH = 74
+RECORD_LENGTH = 850
+TRAILER_LENGTH = 7
+NEWLINE = "\n"
+
+# 含换行符的行长度
+HEADER_LINE_LENGTH = HEADER_LENGTH + 1
+RECORD_LINE_LENGTH = RECORD_LENGTH + 1
+TRAILER_LINE_LENGTH = TRAILER_LENGTH + 1
+
+# 文件头字段: 名称 -> (偏移, 长度)
+HEADER_FIELDS: Dict[str, Tuple[int, int]] = {
+    "RECORD_TYPE": (0, 1),
+    "FILE_TYPE": (1, 1),
+    "PARTNER_ID": (2, 12),
+    "PROCESSING_DATE": (14, 8),
+    "VERSION": (22, 6),
+    "RELEASE": (28, 4),
+    "COUNTRY_CODE": (32, 3),
+    "ACQUIRER_PREFIX": (35, 4),
+    "ACQUIRER_PROCESSING_PAGE": (39, 3),
+    "CREDIT_CARD_IND": (42, 2),
+    "BOS_ID": (44, 5),
+    "FILE_ID": (49, 25),
+}
+
+# 交易记录字段: 名称 -> (偏移, 长度)
+RECORD_FIELDS: Dict[str, Tuple[int, int]] = {
+    "RECORD_TYPE": (0, 1),
+    "TRANSACTION_TYPE": (1, 1),
+    "CARD_NUMBER": (2, 19),
+    "EXPIRY_DATE": (21, 4),
+    "DOCUMENT_NUMBER_FORMAT": (25, 1),
+    "DOCUMENT_NUMBER": (26, 30),
+    "PURCHASE_DATE": (56, 8),
+    "TRAVELLER_NAME": (64, 30),
+    "TRANSACTION_SERIAL_NUMBER": (94, 32),
+    "TRANSACTION_CURRENCY_CODE": (126, 3),
+    "TRANSACTION_SIGN": (129, 1),
+    "TRANSACTION_AMOUNT": (130, 15),
+    "NET_AMOUNT_NON_VATABLE": (145, 15),
+    "NET_AMOUNT_VATABLE_1": (160, 15),
+    "VAT_1_AMOUNT": (175, 9),
+    "VAT_1_PERCENTAGE": (184, 5),
+    "VAT_1_IND": (189, 1),
+    "VAT_FIELDS_18_26": (190, 69),
+    "APPROVAL_CODE": (259, 6),
+    "MERCHANT_NAME": (265, 22),
+    "MERCHANT_CITY": (287, 13),
+    "MERCHANT_ZIP_CODE": (300, 5),
+    "MERCHANT_STATE_CODE": (305, 3),
+    "MERCHANT_IATA_NUMBER": (308, 8),
+    "MERCHANT_FIELD_33": (316, 17),
+    "MERCHANT_FIELD_34": (333, 17),
+    "MERCHANT_FIELD_35": (350, 17),
+    "AGENCY_DOSSIER_NUMBER": (367, 20),
+    "AGENCY_DELIVERY_NOTE_NUMBER": (387, 20),
+    "DBI_PK": (407, 17),
+    "DBI_DS": (424, 17),
+    "DBI_KS": (441, 17),
+    "DBI_AE": (458, 17),
+    "DBI_IK": (475, 17),
+    "DBI_BD": (492, 10),
+    "DBI_PR": (502, 17),
+    "DBI_AU": (519, 17),
+    "DBI_AK": (536, 17),
+    "DBI_RZ": (553, 17),
+    "FILLER": (570, 9),
+    "SERVICE_DESCRIPTION": (579, 270),
+    "USAGE_CODE": (849, 1),
+}
+
+# 文件尾字段: 名称 -> (偏移, 长度)
+TRAILER_FIELDS: Dict[str, Tuple[int, int]] = {
+    "RECORD_TYPE": (0, 1),
+    "FILE_TYPE": (1, 1),
+    "RECORD_COUNT": (2, 5),
+}
+
+# 单个文件的最大交易记录数：文件尾记录数为5位且包含文件头和文件尾，
+# 更大的运行必须分为多个文件（批量任务 / 补数 / split 拆分）
+MAX_RECORDS_PER_FILE = 10 ** TRAILER_FIELDS["RECORD_COUNT"][1] - 1 - 2
+
+
+def _build_layout(fields: List[Tuple[str, int]], total_length: int) -> Dict[str, Tuple[int, int]]:
+    """由 (名称, 长度) 列表按顺序计算字段偏移"""
+    layout = {}
+    offset = 0
+    for name, length in fields:
+        layout[name] = (offset, length)
+        offset += length
+    if offset != total_length:
+        raise ValueError(f"字段布局长度错误: {offset}, 应为{total_length}位")
+    return layout
+
+
+def _repeat(template: List[Tuple[str, int]], times: int) -> List[Tuple[str, int]]:
+    """展开重复的字段组，名称中的 {n} 替换为组序号(从1开始)"""
+    return [(name.format(n=n), length) for n in range(1, times + 1) for name, length in template]
+
+
+SERVICE_DESCRIPTION_LENGTH = 270
+
+# 各交易类型的服务描述(第49字段)子字段: 交易类型 -> {名称: (服务描述内偏移, 长度)}
+SERVICE_FIELDS: Dict[str, Dict[str, Tuple[int, int]]] = {
+    # 酒店
+    "H": _build_layout([
+        ("COMPANY_CODE", 2), ("CONTRACT_NUMBER", 30), ("HOTEL_NAME", 30),
+        ("CHECK_IN_REASON", 1), ("CHECK_IN_DATE", 8), ("CHECK_IN_TIME", 4),
+        ("LOCATION_CODE", 3), ("LOCATION_CITY", 20), ("CHECK_OUT_DATE", 8),
+        ("CHECK_OUT_TIME", 4), ("NO_SHOW_IND", 1), ("ROOM_GUEST_COUNT", 3),
+        ("ROOM_NIGHTS", 3), ("ROOM_RATE_IND", 1), ("INCLUDED_SERVICE_IND", 1),
+        ("NET_ROOM_AMOUNT", 15), ("NET_ROOM_VAT_IND", 1),
+        *_repeat([("SERVICE_{n}_CODE", 3), ("SERVICE_{n}_AMOUNT", 15), ("SERVICE_{n}_VAT_IND", 1)], 5),
+        ("PREPAID_AMOUNT", 15), ("HOTEL_DESCRIPTION", 25),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 火车
+    "T": _build_layout([
+        ("COMPANY_NAME", 15), ("DEPARTURE_DATE", 8), ("ORIGIN_LOCATION_CODE", 3),
+        ("ORIGIN_CITY", 20), ("PASSENGER_COUNT", 2), ("TICKET_TYPE", 1),
+        *_repeat([("SEG_{n}_DEST_CODE", 3), ("SEG_{n}_DEST_CITY", 20),
+                  ("SEG_{n}_TRAIN_NUMBER", 8), ("SEG_{n}_CLASS", 1)], 5),
+        ("SEG_OVERFLOW", 1), ("FINAL_DEST_CODE", 3), ("FINAL_DEST_CITY", 20),
+        ("DESCRIPTION", 30), ("FILLER", 7),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 租车
+    "C": _build_layout([
+        ("RENTAL_COMPANY_CODE", 2), ("CONTRACT_NUMBER", 15), ("VEHICLE_CLASS_CODE", 1),
+        ("VEHICLE_TYPE", 30), ("PICK_UP_DATE", 8), ("PICK_UP_TIME", 4),
+        ("PICK_UP_LOCATION_CODE", 3), ("PICK_UP_LOCATION_CITY", 20), ("RETURN_DATE", 8),
+        ("RETURN_TIME", 4), ("RETURN_LOCATION_CODE", 3), ("RETURN_LOCATION_CITY", 20),
+        ("RENTAL_DAYS", 3), ("MILEAGE_IND", 1), ("DRIVEN_DISTANCE", 5), ("NO_SHOW_IND", 1),
+        ("NET_RENTAL_AMOUNT", 15), ("NET_RENTAL_VAT_IND", 1),
+        ("DISTRIBUTION_AMOUNT", 15), ("DISTRIBUTION_VAT_IND", 1),
+        ("LIABILITY_INS_AMOUNT", 15), ("LIABILITY_INS_VAT_IND", 1),
+        ("FULL_RISK_INS_AMOUNT", 15), ("FULL_RISK_INS_VAT_IND", 1),
+        ("PASSENGER_INS_AMOUNT", 15), ("PASSENGER_INS_VAT_IND", 1),
+        ("ADDITIONAL_INS_AMOUNT", 15), ("ADDITIONAL_INS_VAT_IND", 1),
+        ("DISCOUNT_AMOUNT", 15), ("DISCOUNT_VAT_IND", 1),
+        ("OTHERS_AMOUNT", 15), ("OTHERS_VAT_IND", 1),
+        ("EXTRA_GAS_IND", 1), ("LATE_RETURN_IND", 1), ("EXTRA_MILEAGE_IND", 1),
+        ("ONE_WAY_IND", 1), ("PARKING_VIOLATION_IND", 1), ("DAMAGE_REPAIR_IND", 1),
+        ("FILLER", 8),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 邮轮
+    "S": _build_layout([
+        ("COMPANY_NAME", 30), ("DEPARTURE_DATE", 8), ("ORIGIN_LOCATION_CODE", 3),
+        ("ORIGIN_CITY", 20), ("PASSENGER_COUNT", 2), ("ARRIVAL_DATE", 8),
+        ("ARRIVAL_LOCATION_CODE", 3), ("ARRIVAL_CITY", 20),
+        ("SHIP_1", 45), ("SHIP_2", 45), ("SHIP_3", 45), ("FILLER", 41),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 服务费
+    "A": _build_layout([
+        ("ORIGINATOR", 1), ("SERVICE_QUALIFIER", 3), ("DOC_NUMBER_FORMAT", 1),
+        ("REL_DOC_NUMBER", 30), ("CRS", 4), ("TITLE", 45),
+        ("MATCHING_CRITERIA", 50), ("FILLER", 136),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 其他
+    "O": _build_layout([
+        ("LEADING_FILLER", 3), ("OTHER_1", 45), ("OTHER_2", 45), ("OTHER_3", 45),
+        ("MATCHING_CRITERIA", 50), ("FILLER", 82),
+    ], SERVICE_DESCRIPTION_LENGTH),
+    # 机票（第2航段及以后的字段生成时留空）
+    "F": _build_layout([
+        ("DEPARTURE_DATE", 8), ("ORIGIN_LOCATION", 3), ("CRS", 4), ("PASSENGER_COUNT", 2),
+        *_repeat([("TAX_{n}_AMOUNT", 13), ("TAX_{n}_TYPE", 2)], 5),
+        ("SEG_1_DESTINATION", 3), ("SEG_1_AIRLINE", 3), ("SEG_1_FLIGHT", 4), ("SEG_1_CLASS", 1),
+        ("SEG_2_TO_5", 147), ("SEG_OVERFLOW", 1), ("TICKET_IND", 1),
+        ("TOUR_CODE", 15), ("FILLER", 3),
+    ], SERVICE_DESCRIPTION_LENGTH),
+}
+
+
+def field_slice(name: str, fields: Dict[str, Tuple[int, int]] = RECORD_FIELDS) -> slice:
+    """获取字段对应的切片"""
+    offset, length = fields[name]
+    return slice(offset, offset + length)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成画像
+Generation Profile
+
+从已有的(脱敏)样本文件中学习数据分布，使大批量生成的数据与生产数据形态一致：
+1. 画像构建: 以内存映射方式按块读取样本文件，按定长偏移向量化取出字段列(numpy)，一遍扫描累计：
+   - 交易类型比例
+   - 各交易类型的金额直方图（按对数等宽分箱，每倍频 AMOUNT_BINS_PER_OCTAVE 个箱）
+   - 各交易类型的购买日期偏移（处理日期 - 购买日期，天）频数表
+   - 各交易类型的乘客数、城市/IATA代码等服务描述字段的频数表（见 PROFILE_FIELDS）
+   结果为紧凑的JSON文件，频数表只保留出现最多的 MAX_FIELD_VALUES 个取值，其余合计为"其他"
+2. 按画像生成: 加载画像时为每个分布预先构建别名表(Walker alias)，每次抽样为常数时间：
+   交易类型、金额、购买日期在生成公共字段时抽样，服务描述字段在记录生成后按偏移覆盖；
+   抽到"其他"或画像中没有该交易类型时沿用生成器原有的随机取值
+
+抽样使用调用方传入的随机令牌服务(RandomTokens，即合并器的 tokens)，指定种子时结果仍可复现；
+画像本身只读，可以被多个合并器共用。
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from txn_errors import ConfigError
+from galaxy_file import GalaxyFile
+from galaxy_layout import (
+    HEADER_LINE_LENGTH, RECORD_FIELDS, RECORD_LINE_LENGTH, SERVICE_FIELDS
+)
+from utils.random_tokens import RandomTokens
+
+PROFILE_FILE_SUFFIX = ".profile.json"
+PROFILE_VERSION = 1
+
+# 金额直方图每倍频的箱数（箱宽约 9%）
+AMOUNT_BINS_PER_OCTAVE = 8
+# 每个频数表保留的取值数
+MAX_FIELD_VALUES = 512
+# 每块处理的记录数
+BLOCK_RECORDS = 65536
+
+# 各交易类型参与画像的服务描述字段: 画像字段名 -> 组成该字段的服务描述子字段（联合抽样，保持代码与城市名一致）
+PROFILE_FIELDS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "F": {
+        "PASSENGER_COUNT": ("PASSENGER_COUNT",),
+        "ROUTE": ("ORIGIN_LOCATION", "SEG_1_DESTINATION"),
+        "AIRLINE": ("SEG_1_AIRLINE",),
+    },
+    "T": {
+        "PASSENGER_COUNT": ("PASSENGER_COUNT",),
+        "ORIGIN": ("ORIGIN_LOCATION_CODE", "ORIGIN_CITY"),
+    },
+    "S": {
+        "PASSENGER_COUNT": ("PASSENGER_COUNT",),
+        "ROUTE": ("ORIGIN_LOCATION_CODE", "ORIGIN_CITY", "ARRIVAL_LOCATION_CODE", "ARRIVAL_CITY"),
+    },
+    "H": {
+        "ROOM_GUEST_COUNT": ("ROOM_GUEST_COUNT",),
+        "LOCATION": ("LOCATION_CODE", "LOCATION_CITY"),
+    },
+    "C": {
+        "PICK_UP": ("PICK_UP_LOCATION_CODE", "PICK_UP_LOCATION_CITY"),
+        "RETURN": ("RETURN_LOCATION_CODE", "RETURN_LOCATION_CITY"),
+    },
+}
+
+_SERVICE_OFFSET = RECORD_FIELDS["SERVICE_DESCRIPTION"][0]
+_TRANSACTION_TYPE = RECORD_FIELDS["TRANSACTION_TYPE"][0]
+_AMOUNT = RECORD_FIELDS["TRANSACTION_AMOUNT"]
+_PURCHASE_DATE = RECORD_FIELDS["PURCHASE_DATE"]
+
+
+def profile_field_spans(transaction_type: str, name: str) -> List[Tuple[int, int]]:
+    """画像字段在记录中的 (偏移, 长度) 列表"""
+    subfields = SERVICE_FIELDS[transaction_type]
+    return [(_SERVICE_OFFSET + subfields[sub][0], subfields[sub][1])
+            for sub in PROFILE_FIELDS[transaction_type][name]]
+
+
+def _parse_date(value: str):
+    try:
+        return datetime.strptime(value, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+class _TypeStats:
+    """一种交易类型的累计数据"""
+
+    def __init__(self):
+        self.count = 0
+        self.amount_bins: Counter = Counter()
+        self.amount_min: Optional[int] = None
+        self.amount_max: Optional[int] = None
+        self.date_offsets: Counter = Counter()
+        self.fields: Dict[str, Counter] = {}
+
+
+class ProfileBuilder:
+    """画像构建器类：累计一个或多个样本文件"""
+
+    def __init__(self, max_values: int = MAX_FIELD_VALUES):
+        if max_values < 1:
+            raise ConfigError(f"频数表保留的取值数必须大于0: {max_values}")
+        self.max_values = max_values
+        self.sources: List[str] = []
+        self.file_types: set = set()
+        self.records = 0
+        self._types: Dict[str, _TypeStats] = {}
+
+    def add_file(self, path: str) -> int:
+        """一遍扫描累计一个样本文件
+        Returns:
+            int: 文件中的记录数
+        """
+        import numpy as np  # 仅构建画像时需要
+
+        with GalaxyFile(path) as galaxy:
+            file_type = galaxy.file_type
+            processing_date = _parse_date(galaxy.header_field("PROCESSING_DATE"))
+            record_count = galaxy.record_count
+        if processing_date is None:
+            raise ConfigError(f"样本文件的处理日期无效: {path}")
+
+        powers = 10 ** np.arange(_AMOUNT[1] - 1, -1, -1, dtype=np.int64)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, record_count, BLOCK_RECORDS):
+                n = min(BLOCK_RECORDS, record_count - start)
+                lines = np.frombuffer(mm, dtype=np.uint8, count=n * RECORD_LINE_LENGTH,
+                                      offset=HEADER_LINE_LENGTH + start * RECORD_LINE_LENGTH
+                                      ).reshape(n, RECORD_LINE_LENGTH)
+                self._add_block(np, lines, processing_date, powers)
+                del lines  # 释放对内存映射的引用，以便关闭
+        self.sources.append(os.path.basename(path))
+        self.file_types.add(file_type)
+        self.records += record_count
+        return record_count
+
+    def _add_block(self, np, lines, processing_date, powers):
+        """累计一块记录（按交易类型分组，每组各字段一次向量化统计）"""
+        type_codes, type_counts = np.unique(lines[:, _TRANSACTION_TYPE], return_counts=True)
+        for code, type_count in zip(type_codes.tolist(), type_counts.tolist()):
+            transaction_type = chr(code)
+            stats = self._types.get(transaction_type)
+            if stats is None:
+                stats = self._types[transaction_type] = _TypeStats()
+            stats.count += type_count
+            rows = lines[lines[:, _TRANSACTION_TYPE] == code]
+
+            # 金额：跳过含非数字字符的记录（如故障注入的记录）
+            digits = rows[:, _AMOUNT[0]:_AMOUNT[0] + _AMOUNT[1]].astype(np.int64) - ord("0")
+            valid = np.all((digits >= 0) & (digits <= 9), axis=1)
+            cents = digits[valid] @ powers
+            if len(cents):
+                positive = cents[cents > 0]
+                bins = np.floor(np.log2(positive) * AMOUNT_BINS_PER_OCTAVE).astype(np.int64)
+                values, counts = np.unique(bins, return_counts=True)
+                stats.amount_bins.update(dict(zip(values.tolist(), counts.tolist())))
+                if len(positive) < len(cents):
+                    stats.amount_bins[-1] += len(cents) - len(positive)
+                low, high = int(cents.min()), int(cents.max())
+                stats.amount_min = low if stats.amount_min is None else min(stats.amount_min, low)
+                stats.amount_max = high if stats.amount_max is None else max(stats.amount_max, high)
+
+            # 购买日期偏移：先对日期去重，只解析不同的取值
+            dates = np.ascontiguousarray(rows[:, _PURCHASE_DATE[0]:_PURCHASE_DATE[0] + _PURCHASE_DATE[1]])
+            values, counts = np.unique(dates.view(f"S{_PURCHASE_DATE[1]}").ravel(), return_counts=True)
+            for value, count in zip(values.tolist(), counts.tolist()):
+                purchase_date = _parse_date(value.decode("ascii", "replace"))
+                if purchase_date is not None:
+                    stats.date_offsets[(processing_date - purchase_date).days] += count
+
+            # 服务描述字段频数
+            for name in PROFILE_FIELDS.get(transaction_type, ()):
+                spans = profile_field_spans(transaction_type, name)
+                columns = np.ascontiguousarray(
+                    np.concatenate([rows[:, offset:offset + length] for offset, length in spans], axis=1))
+                width = columns.shape[1]
+                values, counts = np.unique(columns.view(f"S{width}").ravel(), return_counts=True)
+                counter = stats.fields.setdefault(name, Counter())
+                for value, count in zip(values.tolist(), counts.tolist()):
+                    # S类型会去掉末尾的空字节，补回定长；非ASCII字节替换为 ?，保证覆盖后记录仍为定长
+                    value = value.ljust(width, b"\0").decode("ascii", "replace").replace("\ufffd", "?")
+                    counter[value] += count
+
+    def build(self) -> Dict[str, Any]:
+        """生成画像(可序列化为JSON的字典)"""
+        if not self.records:
+            raise ConfigError("样本文件中没有交易记录，无法构建画像")
+        types = {}
+        for transaction_type in sorted(self._types):
+            stats = self._types[transaction_type]
+            fields = {}
+            for name, counter in stats.fields.items():
+                top = counter.most_common(self.max_values)
+                fields[name] = {
+                    "values": {value: count for value, count in top},
+                    "other": sum(counter.values()) - sum(count for _, count in top),
+                }
+            types[transaction_type] = {
+                "count": stats.count,
+                "amount": {
+                    "bins": {str(index): count for index, count in sorted(stats.amount_bins.items())},
+                    "min": stats.amount_min,
+                    "max": stats.amount_max,
+                },
+                "date_offsets": {str(days): count for days, count in sorted(stats.date_offsets.items())},
+                "fields": fields,
+            }
+        return {
+            "version": PROFILE_VERSION,
+            "sources": self.sources,
+            "file_types": sorted(self.file_types),
+            "records": self.records,
+            "amount_bins_per_octave": AMOUNT_BINS_PER_OCTAVE,
+            "types": types,
+        }
+
+    def write(self, path: str) -> Dict[str, Any]:
+        """构建画像并写入JSON文件"""
+        profile = self.build()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=1)
+        return profile
+
+
+def build_profile(paths: Sequence[str], output_path: str, max_values: int = MAX_FIELD_VALUES) -> Dict[str, Any]:
+    """扫描样本文件构建画像并写入 output_path"""
+    if not paths:
+        raise ConfigError("至少需要一个样本文件")
+    builder = ProfileBuilder(max_values)
+    for path in paths:
+        builder.add_file(path)
+    return builder.write(output_path)
+
+
+class AliasTable:
+    """别名表：按权重从离散取值中常数时间抽样 (Walker / Vose)"""
+
+    def __init__(self, values: Sequence[Any], weights: Sequence[float]):
+        total = float(sum(weights))
+        if not values or total <= 0:
+            raise ConfigError("别名表的取值和权重不能为空")
+        n = len(values)
+        self.values = list(values)
+        self.probability = [0.0] * n
+        self.alias = [0] * n
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probability[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.probability[i] = 1.0
+
+    def sample(self, tokens: RandomTokens) -> Any:
+        i = tokens.index(len(self.values))
+        return self.values[i] if tokens.random() < self.probability[i] else self.values[self.alias[i]]
+
+
+class _TypeProfile:
+    """一种交易类型的抽样表"""
+
+    def __init__(self, transaction_type: str, data: Dict[str, Any], bins_per_octave: int):
+        amount = data.get("amount") or {}
+        bins = amount.get("bins") or {}
+        self.amount_bins = AliasTable([int(index) for index in bins], list(bins.values())) if bins else None
+        self.amount_min = amount.get("min")
+        self.amount_max = amount.get("max")
+        self.bins_per_octave = bins_per_octave
+        offsets = data.get("date_offsets") or {}
+        self.date_offsets = AliasTable([int(days) for days in offsets], list(offsets.values())) if offsets else None
+
+        # 服务描述字段：(覆盖位置列表, 抽样表)，"其他"以 None 表示
+        self.fields: List[Tuple[List[Tuple[int, int]], AliasTable]] = []
+        for name, table in (data.get("fields") or {}).items():
+            if name not in PROFILE_FIELDS.get(transaction_type, ()):
+                raise ConfigError(f"画像中的字段不支持: {transaction_type}.{name}")
+            spans = profile_field_spans(transaction_type, name)
+            width = sum(length for _, length in spans)
+            values = list(table["values"])
+            if any(len(value) != width for value in values):
+                raise ConfigError(f"画像字段 {transaction_type}.{name} 的取值长度必须为{width}位")
+            weights = list(table["values"].values())
+            if table.get("other"):
+                values.append(None)
+                weights.append(table["other"])
+            if values:
+                self.fields.append((spans, AliasTable(values, weights)))
+
+    def sample_amount(self, tokens: RandomTokens) -> Optional[float]:
+        if self.amount_bins is None:
+            return None
+        index = self.amount_bins.sample(tokens)
+        if index < 0:
+            return 0.0
+        # 箱内按对数均匀分布，再限制在样本的金额范围内
+        cents = round(2 ** ((index + tokens.random()) / self.bins_per_octave))
+        if self.amount_min is not None:
+            cents = min(max(cents, self.amount_min), self.amount_max)
+        return cents / 100
+
+    def apply(self, record: str, tokens: RandomTokens) -> str:
+        """按字段频数覆盖记录中的服务描述字段"""
+        parts = []
+        for spans, table in self.fields:
+            value = table.sample(tokens)
+            if value is None:
+                continue
+            for offset, length in spans:
+                parts.append((offset, value[:length]))
+                value = value[length:]
+        if not parts:
+            return record
+        parts.sort()
+        pieces = []
+        position = 0
+        for offset, value in parts:
+            pieces.append(record[position:offset])
+            pieces.append(value)
+            position = offset + len(value)
+        pieces.append(record[position:])
+        return "".join(pieces)
+
+
+class GenerationProfile:
+    """生成画像类：加载画像文件并预先构建抽样表"""
+
+    def __init__(self, data: Dict[str, Any], path: str = None):
+        if data.get("version") != PROFILE_VERSION:
+            raise ConfigError(f"画像版本不支持: {path or data.get('version')}")
+        self.path = path
+        self.data = data
+        bins_per_octave = data.get("amount_bins_per_octave", AMOUNT_BINS_PER_OCTAVE)
+        self.types = {transaction_type: _TypeProfile(transaction_type, type_data, bins_per_octave)
+                      for transaction_type, type_data in data["types"].items()}
+        # M文件的交易类型比例
+        counts = {transaction_type: type_data["count"] for transaction_type, type_data in data["types"].items()
+                  if type_data.get("count")}
+        self.type_table = AliasTable(list(counts), list(counts.values())) if counts else None
+        # 画像内容摘要，用于生成结果缓存键
+        self.digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, path: str) -> "GenerationProfile":
+        """加载画像文件"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise ConfigError(f"画像文件不存在: {path}")
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"画像文件格式错误: {path}: {e}")
+        return cls(data, path)
+
+    def sample_type(self, tokens: RandomTokens) -> Optional[str]:
+        """按画像中的交易类型比例抽取交易类型"""
+        return self.type_table.sample(tokens) if self.type_table is not None else None
+
+    def sample_amount(self, transaction_type: str, tokens: RandomTokens) -> Optional[float]:
+        """按该交易类型的金额直方图抽取金额(元)，画像中没有该类型时返回 None"""
+        profile = self.types.get(transaction_type)
+        return profile.sample_amount(tokens) if profile is not None else None
+
+    def sample_date_offset(self, transaction_type: str, tokens: RandomTokens) -> Optional[int]:
+        """按该交易类型的购买日期偏移频数抽取偏移天数，画像中没有该类型时返回 None"""
+        profile = self.types.get(transaction_type)
+        if profile is None or profile.date_offsets is None:
+            return None
+        return profile.date_offsets.sample(tokens)
+
+    def apply(self, record: str, tokens: RandomTokens) -> str:
+        """按画像覆盖记录中的服务描述字段"""
+        profile = self.types.get(record[_TRANSACTION_TYPE])
+        return profile.apply(record, tokens) if profile is not None and profile.fields else record
+
+
+def format_profile(profile: Dict[str, Any]) -> List[str]:
+    """画像摘要（每行一个交易类型）"""
+    records = profile["records"]
+    lines = [f"📐 样本记录数: {records} ({', '.join(profile['sources'])})"]
+    for transaction_type, data in profile["types"].items():
+        amount = data["amount"]
+        offsets = [int(days) for days in data["date_offsets"]]
+        amount_range = (f"{amount['min'] / 100:.2f}-{amount['max'] / 100:.2f}"
+                        if amount["min"] is not None else "-")
+        offset_range = f"{min(offsets)}-{max(offsets)}天" if offsets else "-"
+        fields = ", ".join(f"{name} {len(table['values'])}种" for name, table in data["fields"].items())
+        lines.append(f"    {transaction_type}: {data['count']} 条 ({data['count'] / records:.1%}), "
+                     f"金额 {amount_range}, 购买日期偏移 {offset_range}" + (f", {fields}" if fields else ""))
+    return lines
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关联交易场景
+Linked Transaction Scenarios
+
+按配置的比例生成指向之前销售记录的退款(REFUND)/冲正(REVERSAL)记录：
+1. 销售记录按交易类型放入固定容量的蓄水池（蓄水池抽样），内存占用与运行规模无关
+2. 关联记录复制原销售记录（卡号、文档号、服务描述等），改为负号、新流水号和当天日期，
+   原流水号写入 MERCHANT_FIELD_33-34，关联类型写入 MERCHANT_FIELD_35
+3. 退款金额为原金额的一部分，冲正金额与原金额相同
+4. 同一个场景对象在多次 generate_file 之间保留蓄水池，关联可以跨文件；
+   也可以保存为状态文件，供下一次运行继续引用之前的销售记录
+5. 蓄水池和计数的读写加锁，多个线程可以共用同一个场景对象
+"""
+
+import json
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from txn_errors import ConfigError
+from common_transaction import amount_breakdown
+from galaxy_layout import RECORD_FIELDS, RECORD_LENGTH, field_slice
+
+LINK_REFUND = "REFUND"
+LINK_REVERSAL = "REVERSAL"
+
+_SERIAL = RECORD_FIELDS["TRANSACTION_SERIAL_NUMBER"]
+_PURCHASE_DATE = RECORD_FIELDS["PURCHASE_DATE"][0]
+_SIGN = RECORD_FIELDS["TRANSACTION_SIGN"][0]
+_AMOUNT = RECORD_FIELDS["TRANSACTION_AMOUNT"][0]
+_VAT_1_PERCENTAGE = RECORD_FIELDS["VAT_1_PERCENTAGE"][0]
+_ORIGINAL_SERIAL = RECORD_FIELDS["MERCHANT_FIELD_33"][0]
+_LINK_TYPE = RECORD_FIELDS["MERCHANT_FIELD_35"]
+_DBI_BD = RECORD_FIELDS["DBI_BD"]
+_ORIGINAL_SERIAL_LENGTH = RECORD_FIELDS["MERCHANT_FIELD_33"][1] + RECORD_FIELDS["MERCHANT_FIELD_34"][1]
+_AMOUNT_SLICE = field_slice("TRANSACTION_AMOUNT")
+
+
+class LinkedScenario:
+    """关联交易场景类"""
+
+    def __init__(self, rate: float, reversal_share: float = 0.3, reservoir_size: int = 10000,
+                 refund_min_share: float = 0.1, state_path: Optional[str] = None):
+        """初始化场景
+        Args:
+            rate: 关联记录占全部记录的比例
+            reversal_share: 关联记录中冲正的比例（其余为退款）
+            reservoir_size: 每种交易类型的销售记录蓄水池容量
+            refund_min_share: 退款金额占原金额的最小比例
+            state_path: 蓄水池状态文件(JSON lines)，存在时加载，save_state 时写回
+        """
+        if not 0.0 <= rate < 1.0:
+            raise ConfigError(f"关联记录比例必须在0-1之间: {rate}")
+        if not 0.0 <= reversal_share <= 1.0:
+            raise ConfigError(f"冲正比例必须在0-1之间: {reversal_share}")
+        if not 0.0 < refund_min_share <= 1.0:
+            raise ConfigError(f"退款最小比例必须在0-1之间: {refund_min_share}")
+        if reservoir_size < 1:
+            raise ConfigError(f"蓄水池容量必须大于0: {reservoir_size}")
+        self.rate = rate
+        self.reversal_share = reversal_share
+        self.reservoir_size = reservoir_size
+        self.refund_min_share = refund_min_share
+        self.state_path = state_path
+        # 交易类型 -> 蓄水池中的销售记录 / 已见过的销售记录数
+        self._reservoirs: Dict[str, List[str]] = {}
+        self._seen: Dict[str, int] = {}
+        self.counts = {LINK_REFUND: 0, LINK_REVERSAL: 0}
+        self._lock = threading.Lock()
+        if state_path:
+            self._load_state(state_path)
+
+    def __getstate__(self):
+        # 锁不能跨进程传递，在新进程中重新创建
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset_counts(self):
+        """重置关联记录计数（每个文件开始时调用）"""
+        self.counts = {LINK_REFUND: 0, LINK_REVERSAL: 0}
+
+    def offer(self, record: str):
+        """将一条销售记录放入蓄水池（蓄水池抽样，容量满后按概率替换）"""
+        transaction_type = record[1]
+        with self._lock:
+            seen = self._seen.get(transaction_type, 0) + 1
+            self._seen[transaction_type] = seen
+            reservoir = self._reservoirs.setdefault(transaction_type, [])
+            if len(reservoir) < self.reservoir_size:
+                reservoir.append(record)
+            else:
+                slot = random.randrange(seen)
+                if slot < self.reservoir_size:
+                    reservoir[slot] = record
+
+    def pick_original(self, transaction_type: Optional[str], file_type: str) -> Optional[str]:
+        """按比例决定当前记录是否生成为关联记录，是则返回被关联的销售记录"""
+        if random.random() >= self.rate:
+            return None
+        with self._lock:
+            if transaction_type:
+                reservoir = self._reservoirs.get(transaction_type)
+            else:
+                candidates = [key for key, value in self._reservoirs.items()
+                              if value and (file_type != "B" or key == "F")]
+                reservoir = self._reservoirs[random.choice(candidates)] if candidates else None
+            if not reservoir:
+                return None
+            return random.choice(reservoir)
+
+    def build_linked_record(self, original: str, serial_number: str,
+                            processing_date: str) -> Tuple[str, Tuple[int, int, int]]:
+        """由原销售记录生成关联记录
+        Args:
+            original: 原销售记录 (850位)
+            serial_number: 新流水号 (32位)
+            processing_date: 关联记录的交易日期 (YYYYMMDD)
+        Returns:
+            Tuple[str, Tuple[int, int, int]]: (关联记录, 带符号的金额拆分(分))
+        """
+        original_amount = int(original[_AMOUNT_SLICE])
+        if random.random() < self.reversal_share:
+            link_type = LINK_REVERSAL
+            amount = original_amount
+        else:
+            link_type = LINK_REFUND
+            amount = max(1, int(original_amount * random.uniform(self.refund_min_share, 1.0)))
+        # 金额为分，按 CommonTransaction 的拆分规则（整数运算）计算应税金额和税额
+        amount, vatable_amount, vat_amount = amount_breakdown(amount / 100)
+
+        serial_start, serial_length = _SERIAL
+        record = "".join((
+            original[:_PURCHASE_DATE],
+            processing_date,
+            original[_PURCHASE_DATE + 8:serial_start],
+            serial_number,
+            original[serial_start + serial_length:_SIGN],
+            "-",
+            f"{amount:015d}{amount:015d}{vatable_amount:015d}{vat_amount:09d}",
+            original[_VAT_1_PERCENTAGE:_ORIGINAL_SERIAL],
+            original[serial_start:serial_start + serial_length].rstrip().ljust(_ORIGINAL_SERIAL_LENGTH),
+            link_type.ljust(_LINK_TYPE[1]),
+            original[_LINK_TYPE[0] + _LINK_TYPE[1]:_DBI_BD[0]],
+            processing_date.ljust(_DBI_BD[1]),
+            original[_DBI_BD[0] + _DBI_BD[1]:],
+        ))
+        if len(record) != RECORD_LENGTH:
+            raise ValueError(f"关联记录长度错误: {len(record)}, 应为{RECORD_LENGTH}位")
+        with self._lock:
+            self.counts[link_type] += 1
+        return record, (-amount, -vatable_amount, -vat_amount)
+
+    def save_state(self, state_path: Optional[str] = None):
+        """将蓄水池保存为JSON lines状态文件（每行: 交易类型, 已见记录数, 记录）
+        先写临时文件再替换，中断在任何时刻都不会留下不完整的状态文件
+        """
+        state_path = state_path or self.state_path
+        if not state_path:
+            return
+        with self._lock:
+            snapshot = [(transaction_type, self._seen.get(transaction_type, len(reservoir)), list(reservoir))
+                        for transaction_type, reservoir in sorted(self._reservoirs.items())]
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for transaction_type, seen, reservoir in snapshot:
+                for record in reservoir:
+                    f.write(json.dumps([transaction_type, seen, record]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_path)
+
+    def _load_state(self, state_path: str):
+        try:
+            f = open(state_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                transaction_type, seen, record = json.loads(line)
+                if len(record) != RECORD_LENGTH:
+                    raise ConfigError(f"关联场景状态文件格式错误: {state_path}")
+                reservoir = self._reservoirs.setdefault(transaction_type, [])
+                if len(reservoir) < self.reservoir_size:
+                    reservoir.append(record)
+                self._seen[transaction_type] = max(self._seen.get(transaction_type, 0), seen)
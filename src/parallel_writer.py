@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行定位写入
+Parallel Positional Writer
+
+记录为定长850位加换行，文件头和文件尾也是定长，生成前即可确定文件的总大小和每条记录的偏移：
+1. 预分配临时文件 (<输出文件>.tmp，posix_fallocate / ftruncate)
+2. 记录按范围分给多个工作进程，每个进程生成自己范围内的记录，以 os.pwrite 直接写入最终偏移，
+   不产生分片文件，也不需要拼接
+3. 全部范围完成后写入文件头和文件尾，fsync 后原子重命名为输出文件
+流水号按记录的全局序号编号，与顺序生成一致；各范围使用独立的随机种子（指定 seed 时由其派生，
+相同的种子和范围划分可以复现）。文档号唯一模式下从合并器的分配器中为整个文件预留一块计数器，
+每个范围使用其中与记录序号对应的一段，之后在同一次运行中生成的文件不会与之重复。
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from txn_errors import ConfigError, FileTypeError
+from full_txn_merger import FullTransactionMerger, WRITE_BATCH_SIZE
+from galaxy_layout import (
+    HEADER_FIELDS, HEADER_LINE_LENGTH, MAX_RECORDS_PER_FILE, NEWLINE, RECORD_LINE_LENGTH,
+    TRAILER_LINE_LENGTH, field_slice
+)
+from progress import ProgressEvent, ProgressTracker, PHASE_RECORDS, PHASE_TRAILER, PHASE_SIDECARS, PHASE_DONE
+from reconciliation import ReconciliationTotals
+from record_index import RecordIndexBuilder, INDEX_FILE_SUFFIX
+
+# 每个范围的最大记录数（范围数多于进程数时，先完成的进程继续领取，负载更均衡）
+RANGE_RECORDS = 20000
+
+_PURCHASE_DATE = field_slice("PURCHASE_DATE")
+_PROCESSING_DATE = field_slice("PROCESSING_DATE", HEADER_FIELDS)
+
+# 工作进程内的预热合并器（由进程池初始化函数设置）
+_worker_merger = None
+
+
+def _init_worker(merger: FullTransactionMerger):
+    """进程池初始化函数：接收父进程预加载好的合并器作为字典快照"""
+    global _worker_merger
+    _worker_merger = merger
+
+
+def _range_seed(seed: Optional[int], range_index: int) -> Optional[int]:
+    """由运行种子派生各范围的种子，未指定种子时各范围使用系统熵"""
+    return None if seed is None else seed * 1000003 + range_index
+
+
+def _write_range(task: Dict[str, Any]) -> Tuple[int, int, ReconciliationTotals]:
+    """在工作进程中生成一个范围的记录并写入其最终偏移
+    Returns:
+        Tuple[int, int, ReconciliationTotals]: (范围序号, 记录数, 本范围的对账汇总)
+    """
+    merger = _worker_merger
+    common = merger.common
+    file_type = task["file_type"]
+    first, count = task["first"], task["count"]
+    transaction_types = task["transaction_types"]
+
+    # 子进程继承了父进程的随机状态，每个范围都必须重新设置种子
+    merger.reseed(_range_seed(task["seed"], task["range_index"]))
+    common.transaction_counter = first + 1
+    if task["doc_numbers"] is not None:
+        merger.use_doc_numbers(task["doc_numbers"])
+
+    totals = ReconciliationTotals(file_type)
+    fd = os.open(task["path"], os.O_WRONLY)
+    try:
+        offset = HEADER_LINE_LENGTH + first * RECORD_LINE_LENGTH
+        batch = []
+        for i in range(count):
+            transaction, context = merger.build_record(file_type, transaction_types[i] if transaction_types else None)
+            totals.add(transaction[1], *context.amount_breakdown, transaction[_PURCHASE_DATE])
+            batch.append(transaction)
+            if len(batch) >= WRITE_BATCH_SIZE or i == count - 1:
+                _pwrite_all(fd, (NEWLINE.join(batch) + NEWLINE).encode("ascii"), offset)
+                offset += len(batch) * RECORD_LINE_LENGTH
+                batch.clear()
+    finally:
+        os.close(fd)
+    return task["range_index"], count, totals
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    """在指定偏移写入全部数据（pwrite 可能只写入一部分）"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _preallocate(path: str, size: int):
+    """创建并预分配指定大小的文件（不支持 posix_fallocate 的平台退化为 ftruncate）"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass  # 部分文件系统不支持预分配
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+class ParallelFileWriter:
+    """并行定位写入生成器类"""
+
+    def __init__(self, merger: FullTransactionMerger = None, workers: int = None):
+        """初始化
+        Args:
+            merger: 预加载好字典的合并器（作为所有工作进程的快照），为空时新建
+            workers: 工作进程数，默认为CPU核数
+        """
+        self.merger = merger or FullTransactionMerger()
+        self.workers = workers or os.cpu_count() or 1
+
+    def generate_file(self, file_type: str, count: int = 1, output_filename: str = None,
+                      business_types: List[Dict[str, Any]] = None, write_control: bool = True,
+                      write_index: bool = False, seed: int = None,
+                      progress: Callable[[ProgressEvent], None] = None) -> str:
+        """并行生成一个交易数据文件（参数同 FullTransactionMerger.generate_file）
+        不支持关联交易场景、故障注入和流式输出（均需要按记录顺序生成）
+        Returns:
+            str: 输出文件路径
+        """
+        if file_type not in ["B", "M"]:
+            raise FileTypeError(f"不支持的文件类型: {file_type}，只支持 B 或 M")
+        merger = self.merger
+        if merger.linked is not None:
+            raise ConfigError("并行定位写入不支持关联交易场景（需要按记录顺序生成）")
+        transaction_types = None
+        if business_types:
+            transaction_types = merger.expand_business_types(file_type, business_types)
+            count = len(transaction_types)
+        if not 1 <= count <= MAX_RECORDS_PER_FILE:
+            raise ConfigError(f"交易记录数量必须在1-{MAX_RECORDS_PER_FILE}之间(文件尾记录数为5位): {count}")
+
+        filepath = merger.output_path(file_type, output_filename)
+        tmp_path = filepath + ".tmp"
+        header = merger.common.generate_header(file_type)
+        total_records = count + 2
+        trailer = merger.common.generate_trailer(file_type, total_records)
+        size = HEADER_LINE_LENGTH + count * RECORD_LINE_LENGTH + TRAILER_LINE_LENGTH
+
+        ranges = [(first, min(RANGE_RECORDS, count - first)) for first in range(0, count, RANGE_RECORDS)]
+        if len(ranges) < self.workers:
+            # 记录数较少时按进程数平均划分
+            per_worker = -(-count // self.workers)
+            ranges = [(first, min(per_worker, count - first)) for first in range(0, count, per_worker)]
+        doc_numbers = merger.doc_numbers
+        # 每条记录最多一个文档号：为整个文件预留 count 个计数器，各范围按记录序号分段
+        doc_starts = doc_numbers.reserve_block(count) if doc_numbers is not None else None
+        tasks = [{
+            "path": tmp_path, "file_type": file_type, "first": first, "count": range_count,
+            "transaction_types": transaction_types[first:first + range_count] if transaction_types else None,
+            "seed": seed, "range_index": index,
+            "doc_numbers": doc_numbers.slice(doc_starts, first, range_count) if doc_numbers is not None else None,
+        } for index, (first, range_count) in enumerate(ranges)]
+
+        tracker = ProgressTracker(count, progress) if progress is not None else None
+        start = time.perf_counter()
+        _preallocate(tmp_path, size)
+        totals = ReconciliationTotals(file_type)
+        range_totals: Dict[int, ReconciliationTotals] = {}
+        try:
+            if tracker is not None:
+                tracker.set_phase(PHASE_RECORDS)
+            done = 0
+            workers = min(self.workers, len(tasks))
+            if workers <= 1:
+                _init_worker(merger)
+                results = map(_write_range, tasks)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                               initargs=(merger,))
+                results = (future.result() for future in
+                           as_completed([executor.submit(_write_range, task) for task in tasks]))
+            try:
+                for range_index, range_count, partial in results:
+                    range_totals[range_index] = partial
+                    done += range_count
+                    if tracker is not None:
+                        tracker.update(done, HEADER_LINE_LENGTH + done * RECORD_LINE_LENGTH)
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=True)
+                else:
+                    merger.use_doc_numbers(doc_numbers)  # 进程内执行时恢复原分配器
+            for index in sorted(range_totals):
+                totals.merge(range_totals[index])
+
+            # 文件头和文件尾最后写入，fsync 后原子重命名
+            if tracker is not None:
+                tracker.set_phase(PHASE_TRAILER)
+            fd = os.open(tmp_path, os.O_WRONLY)
+            try:
+                _pwrite_all(fd, (header + NEWLINE).encode("ascii"), 0)
+                _pwrite_all(fd, (trailer + NEWLINE).encode("ascii"), size - TRAILER_LINE_LENGTH)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        elapsed = time.perf_counter() - start
+
+        if tracker is not None:
+            tracker.bytes_written = size
+            tracker.set_phase(PHASE_SIDECARS)
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"\n✅ 文件生成成功: {filepath}")
+        print(f"    📊 总交易记录数: {count} ({len(tasks)} 个范围, {workers} 个进程并行写入, {rate:,.0f} 记录/秒)")
+        print(f"    📁 总文件行数: {total_records} (头: 1, 交易: {count}, 尾: 1)")
+        if write_control:
+            control_path = totals.write_control_file(
+                filepath, processing_date=header[_PROCESSING_DATE], record_count=total_records)
+            print(f"    🧾 对账控制文件: {control_path}")
+        if write_index:
+            index = RecordIndexBuilder()
+            index.add_from_file(filepath, count)
+            index.write(filepath + INDEX_FILE_SUFFIX)
+            print(f"    🔎 记录索引文件: {filepath + INDEX_FILE_SUFFIX}")
+        if tracker is not None:
+            tracker.set_phase(PHASE_DONE)
+        return filepath
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进度报告
+Progress Reporting
+
+generate_file 在每批记录写入后更新进度，按时间间隔节流后回调进度事件：
+已完成记录数、记录/秒、已写入字节数、预计剩余时间和当前阶段。
+回调开销按批摊销，不随记录数线性增长。
+
+内置两种输出：
+- ConsoleProgress: 终端单行刷新的进度条
+- JsonLinesProgress: 每个事件一行JSON，供调度系统跟踪任务
+也可以通过 iter_progress_events 以迭代器方式在另一线程中执行生成并逐个取出事件。
+"""
+
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO
+
+# 生成阶段
+PHASE_HEADER = "header"
+PHASE_RECORDS = "records"
+PHASE_TRAILER = "trailer"
+PHASE_SIDECARS = "sidecars"
+PHASE_DONE = "done"
+
+
+class ProgressEvent:
+    """进度事件类"""
+
+    __slots__ = ("phase", "records_done", "total_records", "bytes_written",
+                 "elapsed", "records_per_second", "eta")
+
+    def __init__(self, phase: str, records_done: int, total_records: int, bytes_written: int,
+                 elapsed: float):
+        self.phase = phase
+        self.records_done = records_done
+        self.total_records = total_records
+        self.bytes_written = bytes_written
+        self.elapsed = elapsed
+        self.records_per_second = records_done / elapsed if elapsed > 0 else 0.0
+        remaining = total_records - records_done
+        self.eta = remaining / self.records_per_second if self.records_per_second > 0 else None
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.records_done / self.total_records if self.total_records else 100.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["elapsed"] = round(self.elapsed, 3)
+        data["records_per_second"] = round(self.records_per_second, 1)
+        data["eta"] = None if self.eta is None else round(self.eta, 1)
+        return data
+
+
+class ProgressTracker:
+    """进度跟踪器类：记录进度并按时间间隔节流回调"""
+
+    def __init__(self, total_records: int, callback: Callable[[ProgressEvent], None],
+                 interval: float = 0.5):
+        """初始化跟踪器
+        Args:
+            total_records: 总记录数
+            callback: 进度回调
+            interval: 同一阶段内两次回调的最小间隔(秒)，阶段切换和结束时总是回调
+        """
+        self.total_records = total_records
+        self.callback = callback
+        self.interval = interval
+        self.phase = PHASE_HEADER
+        self.records_done = 0
+        self.bytes_written = 0
+        self._started = time.perf_counter()
+        self._last_emit = 0.0
+
+    def set_phase(self, phase: str):
+        """切换阶段并立即回调"""
+        self.phase = phase
+        self._emit(time.perf_counter())
+
+    def update(self, records_done: int, bytes_written: int):
+        """更新进度（每批调用一次），距离上次回调超过间隔时才回调"""
+        self.records_done = records_done
+        self.bytes_written = bytes_written
+        now = time.perf_counter()
+        if now - self._last_emit >= self.interval:
+            self._emit(now)
+
+    def _emit(self, now: float):
+        self._last_emit = now
+        self.callback(ProgressEvent(self.phase, self.records_done, self.total_records,
+                                    self.bytes_written, now - self._started))
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class ConsoleProgress:
+    """终端进度输出类
+    inline 为真时以回车符在同一行刷新记录阶段的进度，进入附属文件阶段时换行结束，
+    以免与生成结束后的状态信息混在同一行；多个任务并发时应使用逐行输出。
+    """
+
+    def __init__(self, stream: TextIO = None, inline: bool = True, label: Optional[str] = None):
+        """初始化
+        Args:
+            stream: 输出流，默认为标准错误
+            inline: 是否在同一行刷新
+            label: 行首标签（如批量任务序号）
+        """
+        self.stream = stream or sys.stderr
+        self.inline = inline
+        self.label = label
+
+    def __call__(self, event: ProgressEvent):
+        prefix = f"[{self.label}] " if self.label is not None else ""
+        line = (f"{prefix}⏳ {event.phase:<8} {event.records_done}/{event.total_records} "
+                f"({event.percent:5.1f}%)  {event.records_per_second:,.0f} 记录/秒  "
+                f"{event.bytes_written / 1048576:,.1f} MiB  剩余 {_format_duration(event.eta)}")
+        if self.inline:
+            if event.phase not in (PHASE_RECORDS, PHASE_SIDECARS):
+                return
+            end = "\n" if event.phase == PHASE_SIDECARS else ""
+            self.stream.write("\r" + line.ljust(100) + end)
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+class JsonLinesProgress:
+    """JSON lines 进度输出类：每个事件一行JSON"""
+
+    def __init__(self, stream: TextIO = None, label: Optional[str] = None):
+        """初始化
+        Args:
+            stream: 输出流，默认为标准错误
+            label: 任务标签，非空时作为 "job" 字段写入每个事件
+        """
+        self.stream = stream or sys.stderr
+        self.label = label
+
+    def __call__(self, event: ProgressEvent):
+        data = event.to_dict()
+        if self.label is not None:
+            data = {"job": self.label, **data}
+        self.stream.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+# 进度输出方式: 名称 -> 输出类
+PROGRESS_REPORTERS = {
+    "bar": ConsoleProgress,
+    "json": JsonLinesProgress,
+}
+
+
+def iter_progress_events(generate: Callable[..., Any], *args: Any, **kwargs: Any) -> Iterator[ProgressEvent]:
+    """在后台线程中执行生成函数，以迭代器方式逐个返回进度事件
+    生成函数需接受 progress 关键字参数（如 FullTransactionMerger.generate_file），
+    其返回值或异常在迭代结束时分别作为 StopIteration 的值返回或重新抛出。
+    """
+    events: "queue.SimpleQueue" = queue.SimpleQueue()
+    finished = object()
+    outcome: Dict[str, Any] = {}
+
+    def run():
+        try:
+            outcome["result"] = generate(*args, progress=events.put, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            events.put(finished)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        event = events.get()
+        if event is finished:
+            break
+        yield event
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对账汇总
+Reconciliation Totals
+
+在生成过程中增量累计对账数据（按交易类型的笔数、金额合计、日期范围），
+生成结束后写入输出文件旁的JSON控制文件，对账时无需再次解析数据文件。
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+# 控制文件后缀: <输出文件>.control.json
+CONTROL_FILE_SUFFIX = ".control.json"
+
+# 参与合计的金额字段（单位: 分）
+AMOUNT_FIELDS = ("TRANSACTION_AMOUNT", "NET_AMOUNT_VATABLE_1", "VAT_1_AMOUNT")
+
+
+class ReconciliationTotals:
+    """对账汇总累计器类"""
+
+    def __init__(self, file_type: str):
+        self.file_type = file_type
+        self.transaction_count = 0
+        self.totals = dict.fromkeys(AMOUNT_FIELDS, 0)
+        self.by_transaction_type: Dict[str, Dict[str, int]] = {}
+        self.purchase_date_min: Optional[str] = None
+        self.purchase_date_max: Optional[str] = None
+
+    def add(self, transaction_type: str, amount: int, vatable_amount: int, vat_amount: int,
+            purchase_date: str):
+        """累计一条交易记录
+        Args:
+            transaction_type: 交易类型代码
+            amount: TRANSACTION_AMOUNT (分，带符号)
+            vatable_amount: NET_AMOUNT_VATABLE_1 (分，带符号)
+            vat_amount: VAT_1_AMOUNT (分，带符号)
+            purchase_date: PURCHASE_DATE (YYYYMMDD)
+        """
+        self.transaction_count += 1
+        self.totals["TRANSACTION_AMOUNT"] += amount
+        self.totals["NET_AMOUNT_VATABLE_1"] += vatable_amount
+        self.totals["VAT_1_AMOUNT"] += vat_amount
+
+        per_type = self.by_transaction_type.get(transaction_type)
+        if per_type is None:
+            per_type = {"count": 0, **dict.fromkeys(AMOUNT_FIELDS, 0)}
+            self.by_transaction_type[transaction_type] = per_type
+        per_type["count"] += 1
+        per_type["TRANSACTION_AMOUNT"] += amount
+        per_type["NET_AMOUNT_VATABLE_1"] += vatable_amount
+        per_type["VAT_1_AMOUNT"] += vat_amount
+
+        if self.purchase_date_min is None or purchase_date < self.purchase_date_min:
+            self.purchase_date_min = purchase_date
+        if self.purchase_date_max is None or purchase_date > self.purchase_date_max:
+            self.purchase_date_max = purchase_date
+
+    def merge(self, other: "ReconciliationTotals"):
+        """合并另一个累计器（如并行生成时各进程负责的记录范围）"""
+        self.transaction_count += other.transaction_count
+        for field in AMOUNT_FIELDS:
+            self.totals[field] += other.totals[field]
+        for transaction_type, other_type in other.by_transaction_type.items():
+            per_type = self.by_transaction_type.setdefault(
+                transaction_type, {"count": 0, **dict.fromkeys(AMOUNT_FIELDS, 0)})
+            for key, value in other_type.items():
+                per_type[key] += value
+        for date in (other.purchase_date_min, other.purchase_date_max):
+            if date is None:
+                continue
+            if self.purchase_date_min is None or date < self.purchase_date_min:
+                self.purchase_date_min = date
+            if self.purchase_date_max is None or date > self.purchase_date_max:
+                self.purchase_date_max = date
+
+    def to_dict(self, **extra: Any) -> Dict[str, Any]:
+        """转换为控制文件内容"""
+        data = {
+            "file_type": self.file_type,
+            **extra,
+            "transaction_count": self.transaction_count,
+            "amount_unit": "cent",
+            "totals": dict(self.totals),
+            "by_transaction_type": {key: dict(value) for key, value in sorted(self.by_transaction_type.items())},
+            "purchase_date_range": {"min": self.purchase_date_min, "max": self.purchase_date_max},
+        }
+        return data
+
+    def write_control_file(self, data_filepath: str, **extra: Any) -> str:
+        """在数据文件旁写入JSON控制文件
+        Returns:
+            str: 控制文件路径
+        """
+        control_path = data_filepath + CONTROL_FILE_SUFFIX
+        content = self.to_dict(file=os.path.basename(data_filepath), **extra)
+        with open(control_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False, indent=2)
+        return control_path
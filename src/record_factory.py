@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记录工厂
+Record Factory
+
+供单元测试/集成测试在进程内按需获取单条或少量交易记录，不写文件：
+
+    factory = RecordFactory()
+    record = factory.record("H", amount=123.45, CARD_NUMBER="5577267765251118")
+    data = factory.record_dict("F", file_type="B", PASSENGER_COUNT=2)
+    lines = factory.records(10, "T", output="bytes")
+
+- 预生成池: 每种 (文件类型, 交易类型, 合作方) 一个记录池，取空时由已加载字典的合并器批量补充，
+  单条记录的开销只有出池和覆盖字段（补充的开销按批摊销）
+- 字段覆盖: 按预先计算的字段偏移模板直接替换定长片段，可覆盖记录字段(RECORD_FIELDS)
+  和该交易类型的服务描述子字段(SERVICE_FIELDS)；指定 amount 时按金额拆分规则同时替换全部金额字段
+- 输出: 文本(str)、字节(bytes) 或解码后的字典（记录字段 + "SERVICE_FIELDS" 服务描述子字段）
+池中的记录取出后即不再复用，流水号/文档号与正常生成一样各不相同；多个线程可以共用同一个工厂。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from txn_errors import BusinessTypeError, ConfigError, FileTypeError, FormatError
+from common_transaction import M_TRANSACTION_TYPES, amount_breakdown
+from full_txn_merger import FullTransactionMerger
+from galaxy_layout import NEWLINE, RECORD_FIELDS, RECORD_LENGTH, SERVICE_FIELDS
+
+# 每次补充记录池的记录数
+POOL_SIZE = 64
+
+RECORD_OUTPUTS = ("text", "bytes", "dict")
+
+_SERVICE_OFFSET = RECORD_FIELDS["SERVICE_DESCRIPTION"][0]
+_TRANSACTION_TYPE = RECORD_FIELDS["TRANSACTION_TYPE"][0]
+# 金额字段(12-15)连续存放，指定金额时整段替换
+_AMOUNT_OFFSET = RECORD_FIELDS["TRANSACTION_AMOUNT"][0]
+_AMOUNT_FIELDS = ("TRANSACTION_AMOUNT", "NET_AMOUNT_NON_VATABLE", "NET_AMOUNT_VATABLE_1", "VAT_1_AMOUNT")
+# 不能覆盖的字段：交易类型决定服务描述布局，应通过 transaction_type 参数指定
+_FIXED_FIELDS = ("RECORD_TYPE", "TRANSACTION_TYPE")
+# 字符串取值左补0的字段（与生成规则一致）
+_ZERO_FILLED_FIELDS = ("CARD_NUMBER",)
+
+
+def _build_field_spans() -> Dict[str, Dict[str, Tuple[int, int]]]:
+    """各交易类型可覆盖字段的模板: 字段名 -> (记录内偏移, 长度)"""
+    spans = {}
+    for transaction_type in M_TRANSACTION_TYPES:
+        layout = {name: span for name, span in RECORD_FIELDS.items() if name not in _FIXED_FIELDS}
+        for name, (offset, length) in SERVICE_FIELDS.get(transaction_type, {}).items():
+            layout.setdefault(name, (_SERVICE_OFFSET + offset, length))
+        spans[transaction_type] = layout
+    return spans
+
+
+_FIELD_SPANS = _build_field_spans()
+
+
+def _format_value(name: str, value: Any, length: int) -> str:
+    """按定长格式化覆盖值：整数左补0，字符串右补空格（卡号左补0）"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise FormatError(f"字段 {name} 的覆盖值必须为字符串或整数: {value!r}")
+    if isinstance(value, int):
+        if value < 0:
+            raise FormatError(f"字段 {name} 的覆盖值不能为负数: {value}")
+        text = f"{value:0{length}d}"
+    elif name in _ZERO_FILLED_FIELDS:
+        text = value.zfill(length)
+    else:
+        text = value.ljust(length)
+    if len(text) != length:
+        raise FormatError(f"字段 {name} 的覆盖值超过{length}位: {value!r}")
+    if not text.isascii():
+        raise FormatError(f"字段 {name} 的覆盖值只能包含ASCII字符: {value!r}")
+    return text
+
+
+def _patch(record: str, patches: List[Tuple[int, str]]) -> str:
+    """按偏移替换记录中的定长片段"""
+    patches.sort()
+    pieces = []
+    position = 0
+    for offset, text in patches:
+        if offset < position:
+            raise FormatError("覆盖的字段互相重叠")
+        pieces.append(record[position:offset])
+        pieces.append(text)
+        position = offset + len(text)
+    pieces.append(record[position:])
+    return "".join(pieces)
+
+
+def decode_record(record: Union[str, bytes]) -> Dict[str, Any]:
+    """将850位记录解码为字典：记录字段(保留定长填充) + "SERVICE_FIELDS" 服务描述子字段"""
+    if isinstance(record, bytes):
+        record = record.decode("ascii")
+    record = record.rstrip(NEWLINE)
+    if len(record) != RECORD_LENGTH:
+        raise FormatError(f"记录长度错误: {len(record)}, 应为{RECORD_LENGTH}位")
+    data: Dict[str, Any] = {name: record[offset:offset + length] for name, (offset, length) in RECORD_FIELDS.items()}
+    service = record[_SERVICE_OFFSET:]
+    data["SERVICE_FIELDS"] = {name: service[offset:offset + length] for name, (offset, length)
+                              in SERVICE_FIELDS.get(record[_TRANSACTION_TYPE], {}).items()}
+    return data
+
+
+class RecordFactory:
+    """记录工厂类：保持合并器常驻，从预生成池中按需返回记录"""
+
+    def __init__(self, merger: FullTransactionMerger = None, config_dir: str = "config",
+                 pool_size: int = POOL_SIZE):
+        """初始化
+        Args:
+            merger: 已加载字典的合并器（可与其他线程共用），为空时按 config_dir 新建
+            config_dir: 配置目录
+            pool_size: 每次补充记录池的记录数
+        """
+        if pool_size < 1:
+            raise ConfigError(f"记录池补充数量必须大于0: {pool_size}")
+        self.merger = merger or FullTransactionMerger(config_dir)
+        self.pool_size = pool_size
+        # (文件类型, 交易类型, 合作方代码) -> 预生成的记录
+        self._pools: Dict[Tuple[str, Optional[str], Optional[str]], List[str]] = {}
+
+    def _pool_key(self, transaction_type: Optional[str], file_type: Optional[str],
+                  partner: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
+        """校验参数并返回记录池的键"""
+        if partner is not None:
+            partner_config = self.merger.common.partners.get(partner)
+            if partner_config is None:
+                raise ConfigError(f"未配置的合作方: {partner}，已配置: {', '.join(self.merger.common.partners)}")
+            if file_type is not None and file_type != partner_config["file_type"]:
+                raise FileTypeError(f"合作方 {partner} 的文件类型为 {partner_config['file_type']}: {file_type}")
+            file_type = partner_config["file_type"]
+        file_type = file_type or "M"
+        if file_type not in ["B", "M"]:
+            raise FileTypeError(f"不支持的文件类型: {file_type}，只支持 B 或 M")
+        if transaction_type is not None and transaction_type not in M_TRANSACTION_TYPES:
+            raise BusinessTypeError(f"不支持的交易类型: {transaction_type}，支持: {', '.join(M_TRANSACTION_TYPES)}")
+        if file_type == "B" and transaction_type not in (None, "F"):
+            raise BusinessTypeError(f"B类型文件只能包含F类型交易，当前值: {transaction_type}")
+        return file_type, transaction_type, partner
+
+    def _refill(self, key: Tuple[str, Optional[str], Optional[str]]) -> List[str]:
+        """批量补充一个记录池"""
+        file_type, transaction_type, partner = key
+        partner_config = self.merger.common.partners[partner] if partner is not None else None
+        records = [self.merger.build_record(file_type, transaction_type, partner_config)[0]
+                   for _ in range(self.pool_size)]
+        pool = self._pools.setdefault(key, [])
+        pool.extend(records)
+        return pool
+
+    def warm(self, transaction_types: List[str] = None, file_type: str = "M"):
+        """预先补充指定交易类型的记录池（默认为该文件类型可以包含的全部交易类型）"""
+        if transaction_types is None:
+            transaction_types = ["F"] if file_type == "B" else M_TRANSACTION_TYPES
+        for transaction_type in transaction_types:
+            key = self._pool_key(transaction_type, file_type, None)
+            if not self._pools.get(key):
+                self._refill(key)
+
+    def record(self, transaction_type: str = None, file_type: str = None, amount: float = None,
+               partner: str = None, **overrides: Any) -> str:
+        """返回一条交易记录 (850位，不含换行符)
+        Args:
+            transaction_type: 交易类型代码，为空时按文件类型随机选择
+            file_type: 文件类型 B 或 M，默认为 M（指定合作方时为合作方的文件类型）
+            amount: 交易金额(元)，指定时同时替换金额、不含税金额和税额字段
+            partner: 合作方代码，指定时使用该合作方的卡号
+            overrides: 字段名 -> 覆盖值，字段名为 RECORD_FIELDS 或该交易类型 SERVICE_FIELDS 中的名称
+        """
+        key = self._pool_key(transaction_type, file_type, partner)
+        pool = self._pools.get(key)
+        while True:
+            try:
+                record = pool.pop()
+                break
+            except (AttributeError, IndexError):
+                pool = self._refill(key)
+
+        patches = []
+        if amount is not None:
+            if amount < 0:
+                raise FormatError(f"交易金额不能为负数: {amount}")
+            amount_cents, vatable_amount, vat_amount = amount_breakdown(amount)
+            pieces = []
+            for name, value in zip(_AMOUNT_FIELDS, (amount_cents, amount_cents, vatable_amount, vat_amount)):
+                length = RECORD_FIELDS[name][1]
+                if value >= 10 ** length:
+                    raise FormatError(f"交易金额 {amount} 过大: 字段 {name} 的值 {value} 超过{length}位")
+                pieces.append(f"{value:0{length}d}")
+            patches.append((_AMOUNT_OFFSET, "".join(pieces)))
+        if overrides:
+            layout = _FIELD_SPANS[record[_TRANSACTION_TYPE]]
+            for name, value in overrides.items():
+                if name in _FIXED_FIELDS:
+                    raise ConfigError(f"字段 {name} 不能覆盖，请通过 transaction_type 参数指定交易类型")
+                span = layout.get(name)
+                if span is None:
+                    raise ConfigError(f"交易类型 {record[_TRANSACTION_TYPE]} 的记录中没有字段: {name}")
+                offset, length = span
+                patches.append((offset, _format_value(name, value, length)))
+        return _patch(record, patches) if patches else record
+
+    def record_bytes(self, transaction_type: str = None, **kwargs: Any) -> bytes:
+        """返回一条交易记录的字节（参数同 record）"""
+        return self.record(transaction_type, **kwargs).encode("ascii")
+
+    def record_dict(self, transaction_type: str = None, **kwargs: Any) -> Dict[str, Any]:
+        """返回一条解码为字典的交易记录（参数同 record，格式见 decode_record）"""
+        return decode_record(self.record(transaction_type, **kwargs))
+
+    def records(self, count: int, transaction_type: str = None, output: str = "text",
+                **kwargs: Any) -> List[Any]:
+        """返回多条交易记录
+        Args:
+            count: 记录数
+            transaction_type: 交易类型代码，为空时每条记录随机选择
+            output: text 字符串 / bytes 字节 / dict 解码后的字典
+            kwargs: record 的其他参数（覆盖值应用于每条记录）
+        """
+        if output not in RECORD_OUTPUTS:
+            raise ConfigError(f"不支持的输出格式: {output}，支持: {', '.join(RECORD_OUTPUTS)}")
+        records = [self.record(transaction_type, **kwargs) for _ in range(count)]
+        if output == "bytes":
+            return [record.encode("ascii") for record in records]
+        if output == "dict":
+            return [decode_record(record) for record in records]
+        return records
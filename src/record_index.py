@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记录索引
+Record Index
+
+生成时可选写入紧凑的有序索引文件(<输出文件>.idx)，将
+TRANSACTION_SERIAL_NUMBER / DOCUMENT_NUMBER / CARD_NUMBER 映射到记录序号。
+查询时对内存映射的索引做二分查找，再按偏移直接读取一条850位记录，
+千万级记录的文件中定位一条记录只需微秒级时间。
+
+索引文件格式(小端):
+    [8字节魔数 GXIDX001][4字节分区数]
+    每个分区: [1字节键类型][2字节键宽度][8字节条目数][8字节数据偏移]
+    分区数据: 按(键, 序号)排序的定长条目 [键(键宽度)][4字节序号(大端)]
+"""
+
+import bisect
+import mmap
+import os
+import struct
+from typing import Dict, List, Tuple
+
+from txn_errors import ConfigError, FormatError
+from galaxy_layout import (
+    HEADER_LINE_LENGTH, RECORD_LENGTH, RECORD_LINE_LENGTH, RECORD_FIELDS, field_slice
+)
+
+INDEX_MAGIC = b"GXIDX001"
+INDEX_FILE_SUFFIX = ".idx"
+
+# 键类型: 名称 -> (键类型编号, 记录字段名)
+INDEX_KEYS: Dict[str, Tuple[int, str]] = {
+    "serial": (1, "TRANSACTION_SERIAL_NUMBER"),
+    "document": (2, "DOCUMENT_NUMBER"),
+    "card": (3, "CARD_NUMBER"),
+}
+
+_FILE_HEADER = struct.Struct("<8sI")
+_SECTION = struct.Struct("<BHQQ")
+_ORDINAL = struct.Struct(">I")
+
+
+def normalize_key(kind: str, value: str) -> bytes:
+    """将查询值规范化为索引中的定长键（文档号/流水号右补空格，卡号左补0）"""
+    if kind not in INDEX_KEYS:
+        raise ConfigError(f"不支持的索引键: {kind}，支持: {', '.join(INDEX_KEYS)}")
+    width = RECORD_FIELDS[INDEX_KEYS[kind][1]][1]
+    value = value.strip()
+    padded = value.zfill(width) if kind == "card" else value.ljust(width)
+    if len(padded) != width:
+        raise ConfigError(f"查询值过长: {value}，最多{width}位")
+    return padded.encode("ascii")
+
+
+class RecordIndexBuilder:
+    """索引构建器类：生成过程中逐条累计键，结束时排序写入"""
+
+    def __init__(self):
+        self.count = 0
+        # 每种键一个紧凑的字节缓冲区，避免每条记录创建Python对象
+        self._buffers = {kind: bytearray() for kind in INDEX_KEYS}
+        self._slices = {kind: field_slice(field) for kind, (_, field) in INDEX_KEYS.items()}
+
+    def add(self, record: str):
+        """累计一条记录的键（记录序号按添加顺序从0开始）"""
+        ordinal = _ORDINAL.pack(self.count)
+        for kind, key_slice in self._slices.items():
+            buffer = self._buffers[kind]
+            buffer += record[key_slice].encode("ascii")
+            buffer += ordinal
+        self.count += 1
+
+    def add_from_file(self, data_path: str, count: int):
+        """从已写入的数据文件中读取前 count 条记录累计键（从检查点继续生成时使用）"""
+        with open(data_path, "rb") as f:
+            f.seek(HEADER_LINE_LENGTH)
+            for _ in range(count):
+                line = f.read(RECORD_LINE_LENGTH)
+                if len(line) != RECORD_LINE_LENGTH:
+                    raise FormatError(f"数据文件记录不完整: {data_path}")
+                self.add(line[:RECORD_LENGTH].decode("ascii"))
+
+    def write(self, index_path: str):
+        """排序并写入索引文件"""
+        import numpy as np  # 仅构建索引时需要，用于对定长条目做原地排序
+
+        sections = []
+        for kind, (kind_id, field) in INDEX_KEYS.items():
+            width = RECORD_FIELDS[field][1]
+            entries = np.frombuffer(bytes(self._buffers[kind]),
+                                    dtype=[("key", f"S{width}"), ("ordinal", ">u4")])
+            sections.append((kind_id, width, np.sort(entries, order=["key", "ordinal"]).tobytes()))
+
+        offset = _FILE_HEADER.size + _SECTION.size * len(sections)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(INDEX_MAGIC, len(sections)))
+            for kind_id, width, data in sections:
+                f.write(_SECTION.pack(kind_id, width, len(data) // (width + _ORDINAL.size), offset))
+                offset += len(data)
+            for _, _, data in sections:
+                f.write(data)
+        os.replace(tmp_path, index_path)
+
+
+class _SectionKeys:
+    """索引分区的键视图，供 bisect 二分查找（只在探测位置切片）"""
+
+    def __init__(self, mm: mmap.mmap, offset: int, width: int, count: int):
+        self._mm = mm
+        self._offset = offset
+        self._width = width
+        self._stride = width + _ORDINAL.size
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> bytes:
+        start = self._offset + position * self._stride
+        return self._mm[start:start + self._width]
+
+    def ordinal(self, position: int) -> int:
+        return _ORDINAL.unpack_from(self._mm, self._offset + position * self._stride + self._width)[0]
+
+
+class RecordIndex:
+    """记录索引查询类"""
+
+    def __init__(self, data_path: str, index_path: str = None):
+        """打开数据文件及其索引
+        Args:
+            data_path: 交易数据文件路径
+            index_path: 索引文件路径，默认为 <数据文件>.idx
+        """
+        self.data_path = data_path
+        self.index_path = index_path or data_path + INDEX_FILE_SUFFIX
+        with open(self.index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, section_count = _FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC:
+            raise FormatError(f"索引文件格式错误: {self.index_path}")
+        self._sections: Dict[int, _SectionKeys] = {}
+        for i in range(section_count):
+            kind_id, width, count, offset = _SECTION.unpack_from(
+                self._mm, _FILE_HEADER.size + i * _SECTION.size)
+            self._sections[kind_id] = _SectionKeys(self._mm, offset, width, count)
+        self._data_fd = os.open(data_path, os.O_RDONLY)
+
+    def find(self, kind: str, value: str) -> List[int]:
+        """查找键对应的记录序号（同一键可能对应多条记录）"""
+        key = normalize_key(kind, value)
+        section = self._sections[INDEX_KEYS[kind][0]]
+        position = bisect.bisect_left(section, key)
+        ordinals = []
+        while position < len(section) and section[position] == key:
+            ordinals.append(section.ordinal(position))
+            position += 1
+        return ordinals
+
+    def read_record(self, ordinal: int) -> str:
+        """按序号直接读取一条记录（不含换行符）"""
+        data = os.pread(self._data_fd, RECORD_LENGTH, HEADER_LINE_LENGTH + ordinal * RECORD_LINE_LENGTH)
+        if len(data) != RECORD_LENGTH:
+            raise FormatError(f"记录序号超出文件范围: {ordinal}")
+        return data.decode("ascii")
+
+    def lookup(self, kind: str, value: str) -> List[Tuple[int, str]]:
+        """查找并读取记录
+        Returns:
+            List[Tuple[int, str]]: [(记录序号, 记录内容), ...]
+        """
+        return [(ordinal, self.read_record(ordinal)) for ordinal in self.find(kind, value)]
+
+    def close(self):
+        self._mm.close()
+        os.close(self._data_fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记录外部排序
+External Record Sort
+
+按定长偏移上的一个或多个键(如 PURCHASE_DATE、CARD_NUMBER)对交易数据文件中的850位记录排序，
+文件头和文件尾保持不变。多个滚动生成的文件可以一起排序为一个输出文件。
+
+采用外部归并排序，内存占用有上限，可以排序远大于内存的文件：
+1. 生成有序段: 输入记录按内存预算切块，多个进程并行读取各自的块，
+   以 numpy 按拼接后的键字节做稳定排序，写入临时段文件
+2. 归并: 对段文件做k路归并（段数超过归并路数上限时分多轮），直接比较原始字节键
+整个过程只处理原始字节，不把记录解码为字符串或字段对象。
+排序是稳定的：键相同的记录保持原来的先后顺序（多文件时按文件顺序）。
+"""
+
+import heapq
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Sequence, Tuple
+
+from txn_errors import ConfigError, FormatError
+from galaxy_file import GalaxyFile
+from galaxy_layout import HEADER_LINE_LENGTH, MAX_RECORDS_PER_FILE, RECORD_FIELDS, RECORD_LINE_LENGTH
+
+# 排序键别名 -> 记录字段名，也可以直接使用 RECORD_FIELDS 中的字段名
+SORT_KEYS = {
+    "date": "PURCHASE_DATE",
+    "card": "CARD_NUMBER",
+    "serial": "TRANSACTION_SERIAL_NUMBER",
+    "document": "DOCUMENT_NUMBER",
+    "type": "TRANSACTION_TYPE",
+    "amount": "TRANSACTION_AMOUNT",
+}
+
+SORTED_FILE_SUFFIX = ".sorted"
+DEFAULT_MEMORY = 256 * 1024 * 1024
+# 一轮归并同时打开的段文件数上限
+MAX_FAN_IN = 64
+# 读取段文件的缓冲大小（按整条记录对齐）
+_READ_RECORDS = 1024
+
+
+def parse_sort_keys(spec: str) -> List[Tuple[int, int]]:
+    """解析排序键规格 "date,card" 为 [(偏移, 长度), ...]"""
+    keys = []
+    for name in filter(None, (part.strip() for part in spec.split(","))):
+        field = SORT_KEYS.get(name.lower(), name.upper())
+        if field not in RECORD_FIELDS:
+            raise ConfigError(f"不支持的排序键: {name}，支持: {', '.join(SORT_KEYS)} 或记录字段名")
+        keys.append(RECORD_FIELDS[field])
+    if not keys:
+        raise ConfigError("至少需要指定一个排序键")
+    return keys
+
+
+def _key_function(keys: Sequence[Tuple[int, int]]):
+    """归并时从一行记录(bytes)中取出拼接键"""
+    if len(keys) == 1:
+        offset, length = keys[0]
+        return lambda line: line[offset:offset + length]
+    slices = [slice(offset, offset + length) for offset, length in keys]
+    return lambda line: b"".join([line[key_slice] for key_slice in slices])
+
+
+def _sort_chunk(path: str, first: int, count: int, keys: Sequence[Tuple[int, int]], run_path: str) -> str:
+    """读取文件中 [first, first+count) 的记录，按键稳定排序后写入段文件（在工作进程中执行）"""
+    import numpy as np  # 仅排序时需要
+
+    with open(path, "rb") as f:
+        data = os.pread(f.fileno(), count * RECORD_LINE_LENGTH,
+                        HEADER_LINE_LENGTH + first * RECORD_LINE_LENGTH)
+    if len(data) != count * RECORD_LINE_LENGTH:
+        raise FormatError(f"读取记录失败: {path} 第{first}条起共{count}条")
+    lines = np.frombuffer(data, dtype=np.uint8).reshape(count, RECORD_LINE_LENGTH)
+    key_width = sum(length for _, length in keys)
+    key_columns = np.empty((count, key_width), dtype=np.uint8)
+    position = 0
+    for offset, length in keys:
+        key_columns[:, position:position + length] = lines[:, offset:offset + length]
+        position += length
+    order = np.argsort(key_columns.view(f"S{key_width}").ravel(), kind="stable")
+    with open(run_path, "wb") as f:
+        f.write(lines[order].tobytes())
+    return run_path
+
+
+def _read_run(run_path: str) -> Iterator[bytes]:
+    """逐行读取段文件（按块读取）"""
+    block_size = _READ_RECORDS * RECORD_LINE_LENGTH
+    with open(run_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            for start in range(0, len(block), RECORD_LINE_LENGTH):
+                yield block[start:start + RECORD_LINE_LENGTH]
+
+
+def _merge_runs(run_paths: Sequence[str], keys: Sequence[Tuple[int, int]], out) -> None:
+    """k路归并段文件写入输出（heapq.merge 对相同键保持段的先后顺序，保证稳定）"""
+    out.writelines(heapq.merge(*(_read_run(path) for path in run_paths), key=_key_function(keys)))
+
+
+class ExternalSorter:
+    """外部排序器类"""
+
+    def __init__(self, keys: str, memory: int = DEFAULT_MEMORY, workers: int = None, tmp_dir: str = None):
+        """初始化排序器
+        Args:
+            keys: 排序键规格，如 "date,card"（别名见 SORT_KEYS，也可以使用记录字段名）
+            memory: 生成有序段时所有进程的总内存预算(字节)
+            workers: 并行生成有序段的进程数，默认为CPU核数
+            tmp_dir: 临时段文件目录，默认为输出文件所在目录
+        """
+        self.keys = parse_sort_keys(keys)
+        self.workers = workers or os.cpu_count() or 1
+        self.memory = memory
+        self.tmp_dir = tmp_dir
+        # 每条记录在排序时约占用: 原始数据 + 重排后的副本 + 键列
+        per_record = 2 * RECORD_LINE_LENGTH + sum(length for _, length in self.keys) + 8
+        self.run_records = max(1, memory // self.workers // per_record)
+
+    def _plan_chunks(self, files: Sequence[GalaxyFile]) -> List[Tuple[str, int, int]]:
+        chunks = []
+        for galaxy in files:
+            for first in range(0, galaxy.record_count, self.run_records):
+                chunks.append((galaxy.path, first, min(self.run_records, galaxy.record_count - first)))
+        return chunks
+
+    def sort(self, input_paths: Sequence[str], output_path: str) -> int:
+        """排序一个或多个文件的记录，写入一个输出文件
+        单个文件时文件头和文件尾原样保留；多个文件时使用第一个文件的文件头，
+        文件尾的记录数按合并后的总数重新计算
+        Returns:
+            int: 排序的记录数
+        """
+        if not input_paths:
+            raise ConfigError("至少需要一个输入文件")
+        files = [GalaxyFile(path) for path in input_paths]
+        try:
+            file_types = {galaxy.file_type for galaxy in files}
+            if len(file_types) > 1:
+                raise FormatError(f"输入文件类型不一致: {', '.join(sorted(file_types))}")
+            header = files[0].header
+            if len(files) == 1:
+                trailer = files[0].trailer
+            else:
+                record_count = sum(galaxy.record_count for galaxy in files)
+                if record_count > MAX_RECORDS_PER_FILE:
+                    raise FormatError(f"合并排序后记录数 {record_count} 超过文件尾上限({MAX_RECORDS_PER_FILE}条)，"
+                                      f"请分批排序或先拆分")
+                trailer = f"T{files[0].file_type}{record_count + 2:05d}"
+            chunks = self._plan_chunks(files)
+        finally:
+            for galaxy in files:
+                galaxy.close()
+
+        work_dir = tempfile.mkdtemp(prefix="galaxy_sort_",
+                                    dir=self.tmp_dir or os.path.dirname(os.path.abspath(output_path)))
+        try:
+            runs = self._create_runs(chunks, work_dir)
+            runs = self._reduce_runs(runs, work_dir)
+            tmp_path = output_path + ".tmp"
+            with open(tmp_path, "wb", buffering=1024 * 1024) as out:
+                out.write(header.encode("ascii") + b"\n")
+                _merge_runs(runs, self.keys, out)
+                out.write(trailer.encode("ascii") + b"\n")
+            os.replace(tmp_path, output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return sum(count for _, _, count in chunks)
+
+    def _create_runs(self, chunks: List[Tuple[str, int, int]], work_dir: str) -> List[str]:
+        """并行生成有序段，返回按输入顺序排列的段文件"""
+        run_paths = [os.path.join(work_dir, f"run_{i:06d}") for i in range(len(chunks))]
+        workers = min(self.workers, len(chunks))
+        if workers <= 1:
+            return [_sort_chunk(*chunk, self.keys, run_path) for chunk, run_path in zip(chunks, run_paths)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_sort_chunk, *chunk, self.keys, run_path)
+                       for chunk, run_path in zip(chunks, run_paths)]
+            return [future.result() for future in futures]
+
+    def _reduce_runs(self, runs: List[str], work_dir: str) -> List[str]:
+        """段数超过归并路数上限时，按顺序分组归并为更长的段，直到可以一轮完成最终归并"""
+        level = 0
+        while len(runs) > MAX_FAN_IN:
+            merged = []
+            for group_start in range(0, len(runs), MAX_FAN_IN):
+                group = runs[group_start:group_start + MAX_FAN_IN]
+                merged_path = os.path.join(work_dir, f"merge_{level}_{group_start // MAX_FAN_IN:06d}")
+                with open(merged_path, "wb", buffering=1024 * 1024) as out:
+                    _merge_runs(group, self.keys, out)
+                for path in group:
+                    os.remove(path)
+                merged.append(merged_path)
+            runs = merged
+            level += 1
+        return runs
+
+
+def sort_files(input_paths: Sequence[str], output_path: str, keys: str = "date",
+               memory: int = DEFAULT_MEMORY, workers: int = None, tmp_dir: str = None) -> int:
+    """按键外部排序一个或多个交易数据文件，返回排序的记录数"""
+    return ExternalSorter(keys, memory, workers, tmp_dir).sort(input_paths, output_path)
@@ -4,21 +4,32 @@
 服务费业务描述生成器
 """
 
-import random
-from datetime import datetime
+from utils.clock import SystemClock
+from utils.random_tokens import RandomTokens
 
 class ServiceDescA:
     """服务费业务描述生成器类"""
 
-    def __init__(self):
-        """初始化"""
+    def __init__(self, doc_numbers=None, clock=None, tokens=None):
+        """初始化
+        Args:
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
         self._doc_counter = 0  # 用于生成自增的文档号
 
     def generate_document_number(self) -> str:
         """【第6个参数,30位】生成文档号
         格式:88 + 8位随机数字 + 20位空格
         """
-        random_number = str(random.randint(10000000, 99999999))  # 8位随机数字
+        if self.doc_numbers is not None:
+            random_number = self.doc_numbers.next_token("standard")  # 8位唯一数字
+        else:
+            random_number = str(self.tokens.number(10000000, 99999999))  # 8位随机数字
         doc_number = f"88{random_number}" + " " * 20
         return doc_number[:30]
 
@@ -27,7 +38,7 @@ class ServiceDescA:
         fields = []
 
         # 1. SD_FEE_ORIGINATOR：1位，在C、F、H、O、S、T里面随机取
-        originator = random.choice("CFHOST")
+        originator = self.tokens.pick("CFHOST")
         fields.append(originator)
 
         # 2. SD_FEE_SERVICE_QUALIFIER：3位
@@ -46,8 +57,8 @@ class ServiceDescA:
         if doc_number_format == 0:
             rel_doc_number = " " * 30
         else:
-            date_part = datetime.now().strftime("%y%m%d")  # 6位年月日
-            rand = "".join([str(random.randint(0, 9)) for _ in range(7)])  # 7位随机数
+            date_part = self.clock.now().strftime("%y%m%d")  # 6位年月日
+            rand = self.tokens.digits(7)  # 7位随机数
             rel_doc_number = date_part + rand + " " * 17
             rel_doc_number = rel_doc_number[:30]
         fields.append(rel_doc_number)
@@ -1,12 +1,31 @@
-import random
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from utils.city_utils import CityRegistry
+from utils.clock import SystemClock
+from utils.random_tokens import RandomTokens
 
 class ServiceDescCar:
     """租车服务描述生成器类"""
 
+    def __init__(self, config_dir: str = "config", doc_numbers=None, clock=None, tokens=None):
+        """初始化
+        Args:
+            config_dir: 配置目录
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
+        self.cities = CityRegistry.for_config(config_dir)
+
     def generate_document_number(self) -> str:
         """【第6个参数,30位】生成文档号"""
-        random_number = str(random.randint(10000000, 99999999))  # 8位随机数字
+        if self.doc_numbers is not None:
+            random_number = self.doc_numbers.next_token("standard")  # 8位唯一数字
+        else:
+            random_number = str(self.tokens.number(10000000, 99999999))  # 8位随机数字
         doc_number = f"88{random_number}" + " " * 20
         return doc_number[:30]
 
@@ -14,21 +33,24 @@ class ServiceDescCar:
         """【第49个参数,270位】生成服务描述"""
         fields = []
 
+        # 提车和还车城市（城市名已补齐为20位）
+        (_, pick_up_city), (_, return_city) = self.cities.sample_pairs(2, self.tokens)
+
         # 1. SD_CAR_RENTAL_COMPANY_CODE：2位，固定为EH
         fields.append("EH")
 
         # 2. SD_CAR_CONTRACT_NUMBER：15位，年月日+时间戳 12位 + 3位空格
-        contract_number = datetime.now().strftime("%Y%m%d%H%M%S") + "   "
+        contract_number = self.clock.now().strftime("%Y%m%d%H%M%S") + "   "
         fields.append(contract_number[:15])
 
         # 3. SD_CAR_VEHICLE_CLASS_CODE：1位，在C、E、X、F中随机1个
-        fields.append(random.choice("CEXF"))
+        fields.append(self.tokens.pick("CEXF"))
 
         # 4. SD_CAR_VEHICLE_TYP：30位，VERYGOOD+22个空格
         fields.append("VERYGOOD" + " " * 22)
 
         # 5. SD_CAR_PICK_UP_DATE：8位，YYYYMMDD
-        pick_up_date = datetime.now()
+        pick_up_date = self.clock.now()
         fields.append(pick_up_date.strftime("%Y%m%d"))
 
         # 6. SD_CAR_PICK_UP_TIME：4位，HHMM
@@ -37,8 +59,8 @@ class ServiceDescCar:
         # 7. SD_CAR_PICK_UP_LOCATION_CODE：3位空格
         fields.append(" " * 3)
 
-        # 8. SD_CAR_PICK_UP_LOCATION_CITY：20位，Beijing+13位空格
-        fields.append("Beijing" + " " * 13)
+        # 8. SD_CAR_PICK_UP_LOCATION_CITY：20位，从城市字典随机取值+补空格
+        fields.append(pick_up_city)
 
         # 9. SD_CAR_RETURN_DATE：8位，YYYYMMDD，取提车日期+5天
         return_date = pick_up_date + timedelta(days=5)
@@ -50,8 +72,8 @@ class ServiceDescCar:
         # 11. SD_CAR_RETURN_LOCATION_CODE：3位空格
         fields.append(" " * 3)
 
-        # 12. SD_CAR_RETURN_LOCATION_CITY：20位，Shanghai+12位空格
-        fields.append("Shanghai" + " " * 12)
+        # 12. SD_CAR_RETURN_LOCATION_CITY：20位，从城市字典随机取值+补空格（与提车城市不同）
+        fields.append(return_city)
 
         # 13. SD_CAR_RENTAL_DAYS：3位，固定：005
         fields.append("005")
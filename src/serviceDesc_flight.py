@@ -3,21 +3,50 @@
 """
 机票业务描述生成器
 """
-import random
-import yaml
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Tuple
 
+from utils.clock import SystemClock
+from utils.line_dictionary import DICT_SUFFIX, load_line_dictionary
+from utils.random_tokens import RandomTokens
+
 class ServiceDescFlight:
     """机票业务描述生成器类"""
     
-    def __init__(self, config_dir: str = "config"):
-        """初始化机票业务描述生成器"""
-        # 加载IATA代码
-        iata_codes_path = os.path.join(config_dir, "dictionaries/IATA_code.yaml")
-        with open(iata_codes_path, "r", encoding="utf-8") as f:
-            self.iata_codes = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    def __init__(self, config_dir: str = "config", doc_numbers=None, clock=None, tokens=None):
+        """初始化机票业务描述生成器
+        Args:
+            config_dir: 配置目录
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
+        # 加载IATA代码（存在 IATA_code.dict 行字典时优先使用，行字典在构建时应只包含3位代码）
+        dict_path = os.path.join(config_dir, "dictionaries", "IATA_code" + DICT_SUFFIX)
+        if os.path.exists(dict_path):
+            self.iata_codes = load_line_dictionary(dict_path)
+            self.valid_codes = self.iata_codes
+        else:
+            iata_codes_path = os.path.join(config_dir, "dictionaries/IATA_code.yaml")
+            with open(iata_codes_path, "r", encoding="utf-8") as f:
+                self.iata_codes = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+            # 预先筛选出3位代码，避免每条记录重复筛选
+            self.valid_codes = [code for code in self.iata_codes if len(code) == 3]
+    
+    def _random_iata_code(self, exclude: str = None) -> str:
+        """随机取一个3位IATA代码（可排除指定代码），没有可用代码时随机生成"""
+        valid_codes = self.valid_codes
+        if not valid_codes:
+            return self.tokens.letters(3)
+        for _ in range(32):
+            code = self.tokens.pick(valid_codes)
+            if code != exclude:
+                return code
+        return self.tokens.letters(3)
     
     def generate_document_number(self, file_type: str = "B") -> str:
         """
@@ -26,26 +55,30 @@ class ServiceDescFlight:
         - 否则: DN_LCC_PREFIX(3位) + DN_LCC_FILEKEY(8位) + 19位空格
         """
         if file_type == "M":
-            random_digits = ''.join(random.choices('0123456789', k=10))
+            if self.doc_numbers is not None:
+                random_digits = self.doc_numbers.next_token("flight_m")
+            else:
+                random_digits = self.tokens.digits(10)
             doc_number = "888" + random_digits + " " * 17
             return doc_number[:30]
         else:
             # doc_number: 3位IATA+8位filekey+19位空格，总共30位
             
             # 从已加载的IATA代码中随机取一个3位IATA
-            valid_codes = [code for code in self.iata_codes if len(code.strip()) == 3]
-            if not valid_codes:
-                # 如果没有找到合适的代码，生成一个随机的3位代码
-                prefix = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3))
-            else:
-                prefix = random.choice(valid_codes).strip()
+            prefix = self._random_iata_code()
             if file_type == "B":
                 # 生成8位filekey
-                next7 = ''.join(random.choices('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=7))
+                if self.doc_numbers is not None:
+                    next7 = self.doc_numbers.next_token("flight_b")
+                else:
+                    next7 = self.tokens.alphanumerics(7)
                 filekey = next7 + ' '  # 8位
             else:
                 # 生成8位filekey，仅数字
-                filekey = ''.join(random.choices('0123456789', k=8))
+                if self.doc_numbers is not None:
+                    filekey = self.doc_numbers.next_token("flight_digits")
+                else:
+                    filekey = self.tokens.digits(8)
             filler = ' ' * 19
             doc_number = prefix + filekey + filler
             return doc_number[:30]
@@ -54,7 +87,7 @@ class ServiceDescFlight:
         """生成13位的税费金额
         格式:由10为0 + 3个随机数字组成
         """
-        amount = ''.join(random.choices('0123456789', k=3))
+        amount = self.tokens.digits(3)
         tax_amount = '0' * 10 + amount
         if len(tax_amount) != 13:
             raise ValueError(f"税费金额长度错误: {len(tax_amount)}, 应为13位")
@@ -62,7 +95,7 @@ class ServiceDescFlight:
 
     def _generate_tax_type(self) -> str:
         """生成2位的税费类型、从XF、MF中随机取一个"""
-        tax_type = random.choice(['XF', 'MF'])
+        tax_type = self.tokens.pick(('XF', 'MF'))
         if len(tax_type) != 2:
             raise ValueError(f"税费类型长度错误: {len(tax_type)}, 应为2位")
         return tax_type
@@ -70,8 +103,8 @@ class ServiceDescFlight:
     def _generate_flight_number(self) -> str:
         """生成4位航班号,格式:1个字母+3个数字
         """
-        letter = random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-        numbers = ''.join(random.choices('0123456789', k=3))
+        letter = self.tokens.letters(1)
+        numbers = self.tokens.digits(3)
         flight_number = letter + numbers
         if len(flight_number) != 4:
             raise ValueError(f"航班号长度错误: {len(flight_number)}, 应为4位")
@@ -82,23 +115,18 @@ class ServiceDescFlight:
         fields = []
 
         # 1. SD_FLIGHT_DEPARTURE_DATE：8位，必须包含第一个航段的出发日期
-        departure_date = datetime.now() + timedelta(days=random.randint(1, 30))
+        departure_date = self.clock.now() + timedelta(days=self.tokens.number(1, 30))
         fields.append(departure_date.strftime("%Y%m%d"))
 
         # 2. SD_FLIGHT_ORIGIN_LOCATION：3位，从IATA_code.yaml中随机取一个，需补足3位
-        valid_codes = [code for code in self.iata_codes if len(code.strip()) == 3]
-        if not valid_codes:
-            # 如果没有找到合适的出发地代码，生成一个随机的3位代码
-            origin_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3))
-        else:
-            origin_code = random.choice(valid_codes).strip()
+        origin_code = self._random_iata_code()
         fields.append(origin_code)
 
         # 3. SD_FLIGHT_CRS：4位，默认4个空格
         fields.append(" " * 4)
 
         # 4. SD_FLIGHT_PASSENGER_COUNT：2位，01-10之间随机取值
-        passenger_count = f"{random.randint(1,10):02d}"
+        passenger_count = f"{self.tokens.number(1, 10):02d}"
         if len(passenger_count) != 2:
             raise ValueError(f"乘客数量长度错误: {len(passenger_count)}, 应为2位")
         fields.append(passenger_count)
@@ -109,28 +137,18 @@ class ServiceDescFlight:
             fields.append(self._generate_tax_type())          # TAX_N_TYPE：2位
 
         # 10. SD_FLIGHT_SEG_1_DESTINATION：3位，从IATA_code.yaml中随机取一个（不能与出发地相同），需补足3位
-        valid_codes = [code for code in self.iata_codes if len(code.strip()) == 3 and code.strip() != origin_code]
-        if not valid_codes:
-            # 如果没有找到合适的目的地代码，生成一个随机的3位代码
-            dest_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3))
-        else:
-            dest_code = random.choice(valid_codes).strip()
+        dest_code = self._random_iata_code(exclude=origin_code)
         fields.append(dest_code)
 
         # 11. SD_FLIGHT_SEG_1_AIRLINE：3位，从IATA_code.yaml中随机取一个，需补足3位
-        valid_codes = [code for code in self.iata_codes if len(code.strip()) == 3]
-        if not valid_codes:
-            # 如果没有找到合适的航空公司代码，生成一个随机的3位代码
-            airline_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3))
-        else:
-            airline_code = random.choice(valid_codes).strip()
+        airline_code = self._random_iata_code()
         fields.append(airline_code)
 
         # 12. SD_FLIGHT_SEG_1_FLIGHT：4位，生成航班号
         fields.append(self._generate_flight_number())
 
         # 13. SD_FLIGHT_SEG_1_CLASS：1位，随机取一个舱位代码（字母）
-        class_code = random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        class_code = self.tokens.letters(1)
         if len(class_code) != 1:
             raise ValueError(f"舱位代码长度错误: {len(class_code)}, 应为1位")
         fields.append(class_code)
@@ -145,7 +163,7 @@ class ServiceDescFlight:
         fields.append("0")
 
         # 16. SD_FLIGHT_TICKET_IND：在U和E里面随机选一个
-        fields.append(random.choice("UE"))
+        fields.append(self.tokens.pick("UE"))
 
         # 17. SD_FLIGHT_TOUR_CODE：15位空格
         fields.append(" " * 15)
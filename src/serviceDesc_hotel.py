@@ -10,28 +10,41 @@ Hotel Service Description Generator
 """
 
 import os
-import yaml
-import random
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from utils.clock import SystemClock
+from utils.line_dictionary import load_word_list
+from utils.random_tokens import RandomTokens
 
 
 class ServiceDescHotel:
     """酒店服务描述生成器类"""
     
-    def __init__(self, config_dir: str = "config"):
-        """初始化生成器"""
+    def __init__(self, config_dir: str = "config", doc_numbers=None, clock=None, tokens=None):
+        """初始化生成器
+        Args:
+            config_dir: 配置目录
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
         dict_dir = os.path.join(config_dir, "dictionaries")
         
-        # 加载酒店和城市信息
-        with open(os.path.join(dict_dir, "hotel_names.yaml"), 'r', encoding='utf-8') as f:
-            hotel_data = yaml.safe_load(f)
-            self.hotel_names = hotel_data['hotel_names']
-            self.city_names = hotel_data['city_names']
+        # 加载酒店和城市信息（存在 hotel_names.dict / city_names.dict 行字典时优先使用）
+        self.hotel_names = load_word_list(dict_dir, "hotel_names.yaml", "hotel_names")
+        self.city_names = load_word_list(dict_dir, "hotel_names.yaml", "city_names")
     
     def generate_document_number(self) -> str:
         """【第6个参数,30位】生成文档号"""
-        # 生成规则：长度固定30，88+8位随机数字+20位空格
-        doc_number = "888" + "".join([str(random.randint(0, 9)) for _ in range(7)]) + " " * 20
+        # 生成规则：长度固定30，888+7位随机数字+20位空格
+        if self.doc_numbers is not None:
+            digits = self.doc_numbers.next_token("hotel")
+        else:
+            digits = self.tokens.digits(7)
+        doc_number = "888" + digits + " " * 20
         return doc_number[:30]
     
     def generate_service_description(self, amount: float) -> str:
@@ -42,16 +55,16 @@ class ServiceDescHotel:
         fields.append("  ")
         
         # 2. CONTRACT_NUMBER合同号 (30位)
-        fields.append(datetime.now().strftime("%Y%m%d%H%M%S").ljust(30))
+        fields.append(self.clock.now().strftime("%Y%m%d%H%M%S").ljust(30))
         
         # 3. SD_HOTEL_NAME酒店名称 (30位)
-        fields.append(random.choice(self.hotel_names).ljust(30))
+        fields.append(self.tokens.pick(self.hotel_names).ljust(30))
         
         # 4. CHECK_IN_REASON住宿原因指示符 (1位)
         fields.append(" ")
         
         # 5. CHECK_IN_DATE入住日期 (8位)
-        fields.append(datetime.now().strftime("%Y%m%d"))
+        fields.append(self.clock.now().strftime("%Y%m%d"))
         
         # 6. CHECK_IN_TIME入住时间 (4位)
         fields.append("0000")
@@ -60,10 +73,10 @@ class ServiceDescHotel:
         fields.append("   ")
         
         # 8. LOCATION_CITY城市名称 (20位)
-        fields.append(random.choice(self.city_names).ljust(20))
+        fields.append(self.tokens.pick(self.city_names).ljust(20))
         
         # 9. CHECK_OUT_DATE退房日期 (8位)
-        checkout_date = datetime.now() + timedelta(days=2)
+        checkout_date = self.clock.now() + timedelta(days=2)
         fields.append(checkout_date.strftime("%Y%m%d"))
         
         # 10. CHECK_OUT_TIME退房时间 (4位)
@@ -4,16 +4,31 @@
 其他业务描述生成器
 """
 
-import random
+from utils.clock import SystemClock
+from utils.random_tokens import RandomTokens
 
 class ServiceDescOther:
     """其他业务描述生成器类"""
 
+    def __init__(self, doc_numbers=None, clock=None, tokens=None):
+        """初始化
+        Args:
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
+
     def generate_document_number(self) -> str:
         """【第6个参数,30位】生成文档号
         格式:88 + 8位随机数字 + 20位空格
         """
-        random_number = str(random.randint(10000000, 99999999))  # 8位随机数字
+        if self.doc_numbers is not None:
+            random_number = self.doc_numbers.next_token("standard")  # 8位唯一数字
+        else:
+            random_number = str(self.tokens.number(10000000, 99999999))  # 8位随机数字
         doc_number = f"88{random_number}" + " " * 20
         return doc_number[:30]
 
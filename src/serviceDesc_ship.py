@@ -1,19 +1,32 @@
-import random
-from datetime import datetime, timedelta
-from utils.city_utils import CityUtils
+from datetime import timedelta
+from utils.city_utils import CityRegistry
+from utils.clock import SystemClock
+from utils.random_tokens import RandomTokens
 
 class ServiceDescShip:
     """邮轮服务描述生成器类"""
 
-    def __init__(self, config_dir: str = "config"):
-        """初始化"""
-        self.city_utils = CityUtils(config_dir)
+    def __init__(self, config_dir: str = "config", doc_numbers=None, clock=None, tokens=None):
+        """初始化
+        Args:
+            config_dir: 配置目录
+            doc_numbers: 唯一文档号分配器(UniqueDocumentNumbers)，为空时使用随机文档号
+            clock: 时钟，为空时使用系统时间
+            tokens: 随机令牌服务(RandomTokens)，为空时新建
+        """
+        self.doc_numbers = doc_numbers
+        self.clock = clock or SystemClock()
+        self.tokens = tokens or RandomTokens()
+        self.cities = CityRegistry.for_config(config_dir)
 
     def generate_document_number(self) -> str:
         """【第6个参数,30位】生成文档号
         格式:88 + 8位随机数字 + 20位空格
         """
-        random_number = str(random.randint(10000000, 99999999))  # 8位随机数字
+        if self.doc_numbers is not None:
+            random_number = self.doc_numbers.next_token("standard")  # 8位唯一数字
+        else:
+            random_number = str(self.tokens.number(10000000, 99999999))  # 8位随机数字
         doc_number = f"88{random_number}" + " " * 20
         return doc_number[:30]
 
@@ -25,30 +38,28 @@ class ServiceDescShip:
         fields.append("DREAMSEA" + " " * 22)
 
         # 2. SD_SHIP_DEPARTURE_DATE：8位，YYYYMMDD
-        fields.append(datetime.now().strftime("%Y%m%d"))
+        fields.append(self.clock.now().strftime("%Y%m%d"))
 
         # 3. SD_SHIP_ORIGIN_LOCATION_CODE：3位，固定为3个空格
         fields.append(" " * 3)
 
         # 4. SD_SHIP_ORIGIN_CITY：20位，从字典取值+补空格
-        # 获取出发和到达城市
-        origin_city, dest_city = self.city_utils.get_random_cities(2)
-        origin_code, origin_name = origin_city
-        fields.append(self.city_utils.format_city_name(origin_name))
+        # 获取出发和到达城市（城市名已预先补齐为20位）
+        (origin_code, origin_city), (dest_code, dest_city) = self.cities.sample_pairs(2, self.tokens)
+        fields.append(origin_city)
 
         # 5. SD_SHIP_PASSENGER_COUNT：2位，01-99随机
-        fields.append(f"{random.randint(1, 99):02d}")
+        fields.append(f"{self.tokens.number(1, 99):02d}")
 
         # 6. SD_SHIP_ARRIVAL_DATE：8位，出发日期+3天
-        arrival_date = datetime.now() + timedelta(days=3)
+        arrival_date = self.clock.now() + timedelta(days=3)
         fields.append(arrival_date.strftime("%Y%m%d"))
 
         # 7. SD_SHIP_ARRIVAL_LOCATION_CODE：3位，固定为3个空格
         fields.append(" " * 3)
 
         # 8. SD_SHIP_ARRIVAL_CITY：20位
-        dest_code, dest_name = dest_city
-        fields.append(self.city_utils.format_city_name(dest_name))
+        fields.append(dest_city)
 
         # 9. SD_SHIP_1：45位，VERYGOOD+37空格
         fields.append("VERYGOOD" + " " * 37)
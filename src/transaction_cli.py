@@ -10,17 +10,45 @@ This module provides a command-line interface for generating transaction data fi
 
 import sys
 import os
+import time
 import argparse
+import json
+from contextlib import redirect_stdout
+from datetime import datetime
 from typing import Dict, List, Any
 
 from full_txn_merger import FullTransactionMerger
+from batch_runner import BatchRunner, load_batch_config, build_backfill_jobs, write_backfill_manifest
+from checkpoint import RUN_MANIFEST_SUFFIX
+from fault_injection import FaultInjector, inject_faults
+from linked_scenarios import LinkedScenario
+from progress import PROGRESS_REPORTERS
+from record_sort import sort_files, SORTED_FILE_SUFFIX, DEFAULT_MEMORY as DEFAULT_SORT_MEMORY
+from duplicate_scanner import DuplicateScanner, SCAN_KEYS, DEFAULT_SCAN_KEYS, DEFAULT_MEMORY as DEFAULT_SCAN_MEMORY, format_report
+from generation_profile import GenerationProfile, PROFILE_FILE_SUFFIX, MAX_FIELD_VALUES, build_profile, format_profile
+from galaxy_layout import MAX_RECORDS_PER_FILE
+from file_cache import GenerationCache, CACHE_MODES, DEFAULT_MAX_BYTES, parse_size
+from parallel_writer import ParallelFileWriter
+from utils.clock import FixedClock
+from utils.line_dictionary import build_line_dictionary, read_source_entries
 from txn_errors import (
     TransactionError, ConfigError, FileTypeError,
     BusinessTypeError, CardNumberError, FormatError
 )
 
+# 流式输出的写缓冲区大小
+STREAM_BUFFER_SIZE = 1024 * 1024
+
 def run_cli():
     """命令行接口入口函数"""
+    # 工具子命令: python3 generate.py <子命令> ...
+    if len(sys.argv) > 1 and sys.argv[1] in TOOL_COMMANDS:
+        try:
+            TOOL_COMMANDS[sys.argv[1]](sys.argv[2:])
+        except Exception as e:
+            _exit_with_error(e)
+        return
+    
     parser = argparse.ArgumentParser(
         description="交易数据生成器 - 生成指定格式的交易数据文件",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -35,29 +63,153 @@ def run_cli():
 3. 指定输出文件名:
    python3 generate.py -t B --count 3 -o custom_name
 
+4. 文档号唯一模式:
+   python3 generate.py -t M --count 5000 --unique-doc-numbers
+
+5. 使用JSON配置文件批量生成 (支持 // 注释和任务列表，多个任务并发执行):
+   python3 generate.py --config sample_config.json --workers 4
+
+6. 流式输出到标准输出，直接通过管道压缩或计算校验和 (状态信息输出到标准错误):
+   python3 generate.py -t M --count 9999 --stdout | gzip > big.txt.gz
+   python3 generate.py -t M --count 9999 --stdout --no-control-file | sha256sum
+
+7. 生成异常路径测试文件 (1%记录有效期非法，文件尾记录数错误):
+   python3 generate.py -t M --count 5000 --faults bad_expiry=0.01,wrong_trailer_count
+
+8. 可复现生成 (指定种子时时钟固定在处理日期，结果按参数缓存，再次运行直接复用):
+   python3 generate.py -t M --count 9999 --seed 42 --date 2026-09-01
+   python3 generate.py -t M --count 9999 --seed 42 --date 2026-09-01 --no-cache
+
+   定期写入检查点，任务被中断后从检查点继续 (指定种子和日期时结果与未中断的运行完全相同):
+   python3 generate.py -t M --count 9999 --seed 42 --date 2026-09-01 --checkpoint-every 2000 -o big
+   python3 generate.py -t M --count 9999 --seed 42 --date 2026-09-01 --checkpoint-every 2000 -o big --resume
+
+   多进程并行生成单个文件 (预分配输出文件，各进程将记录直接写入最终位置):
+   python3 generate.py -t M --count 9999 --parallel-write 4
+
+9. 生成退款/冲正记录 (5%的记录关联之前的销售记录，状态文件使多次运行之间也能关联):
+   python3 generate.py -t M --count 9999 --link-rate 0.05 --link-state output/links.jsonl
+
+10. 多合作方一次生成 (每个合作方一个文件，PARTNER_ID和卡号取自 card_numbers.yaml 的 card_partners):
+   python3 generate.py --partners MA=5000,B=200
+   python3 generate.py --partners              # 使用 card_partners 中各合作方配置的 count
+
+11. 按样本文件的数据分布生成 (先从样本文件构建画像，再按画像大批量生成):
+   python3 generate.py profile samples/prod_sample.txt -o prod.profile.json
+   python3 generate.py -t M --count 9999 --profile prod.profile.json
+
+工具子命令 (python3 generate.py <子命令> --help 查看详细参数):
+   build-dict       将名称列表构建为内存映射行字典(.dict)
+   build-card-pool  批量生成通过Luhn校验的唯一卡号池(.npy)
+   lookup           通过索引文件按流水号/文档号/卡号查找记录
+   inject-faults    按规则直接改坏已有文件中指定比例的记录
+   backfill         按日期范围并发生成历史文件(每个处理日期一个)
+   sort             按日期/卡号/流水号等定长键外部排序文件(可合并多个文件)
+   merge            合并多个相同文件类型的文件(重新生成文件头和文件尾)
+   split            按记录数/字节大小/交易类型拆分文件
+   scan-duplicates  跨文件扫描重复的流水号/文档号(Bloom过滤器 + 精确确认)
+   profile          扫描样本文件构建生成画像(类型比例/金额直方图/日期偏移/城市频数)
+
 注意: 请在项目根目录下执行命令
         """
     )
     
-    # 必选参数
-    parser.add_argument('-t', '--file-type', choices=['B', 'M'], required=True,
+    # 必选参数 (二选一)
+    parser.add_argument('-t', '--file-type', choices=['B', 'M'],
                        help='文件类型: B (BSP) 或 M (MA)')
+    parser.add_argument('--config',
+                       help='JSON任务配置文件 (支持 // 注释，可包含多个任务)')
     
     # 可选参数
     parser.add_argument('--count', type=int, default=1,
-                       help='生成的交易记录数量，范围1-9999 (默认: 1)')
+                       help=f'生成的交易记录数量，范围1-{MAX_RECORDS_PER_FILE} (文件尾记录数为5位，更多记录请用 --config / backfill 分为多个文件，默认: 1)')
     parser.add_argument('-o', '--output',
                        help='输出文件名 (不含扩展名)')
+    parser.add_argument('--no-control-file', action='store_true',
+                       help='不生成对账控制文件 (<输出文件>.control.json)')
+    parser.add_argument('--index', action='store_true',
+                       help='生成记录索引文件 (<输出文件>.idx)，用于按流水号/文档号/卡号快速定位记录')
+    parser.add_argument('--partners', nargs='?', const='',
+                       help='多合作方生成，如 MA=5000,B=200；不带值时使用 card_numbers.yaml 中各合作方的 count')
+    parser.add_argument('--workers', type=int,
+                       help='批量任务的并发进程数 (默认: CPU核数)')
+    parser.add_argument('--unique-doc-numbers', action='store_true',
+                       help='启用文档号唯一模式，保证同一次运行内文档号不重复')
+    parser.add_argument('--run-key',
+                       help='文档号唯一模式的运行密钥 (默认随机生成；指定 --seed 时为 seed-<种子>)。'
+                            '只保证同一次运行内不重复，不同运行重用同一个密钥会重新发放相同的文档号')
+    parser.add_argument('--link-rate', type=float,
+                       help='关联记录(退款/冲正)占全部记录的比例，如 0.05')
+    parser.add_argument('--reversal-share', type=float, default=0.3,
+                       help='关联记录中冲正的比例，其余为退款 (默认: 0.3)')
+    parser.add_argument('--link-reservoir', type=int, default=10000,
+                       help='每种交易类型保留的销售记录数 (默认: 10000)')
+    parser.add_argument('--link-state',
+                       help='关联场景状态文件，存在时加载，生成后写回，使多次运行之间也能关联 (配合 --config 时只能单进程运行)')
+    parser.add_argument('--seed', type=int,
+                       help='随机种子，指定时时钟固定在 --date/--time，相同参数生成完全相同的文件并使用缓存')
+    parser.add_argument('--date',
+                       help='处理日期 YYYY-MM-DD (默认: 今天)，文件头、文件名及记录中的日期均按该日期派生')
+    parser.add_argument('--time', default='09:00:00',
+                       help='与 --date/--seed 配合使用的时刻 HH:MM:SS (默认: 09:00:00)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='不使用生成结果缓存 (仅在指定 --seed 时才会使用缓存)')
+    parser.add_argument('--cache-dir',
+                       help='缓存目录 (默认: 环境变量 GALAXY_CACHE_DIR 或 ~/.cache/gen_galaxy_file)')
+    parser.add_argument('--cache-max-size', type=parse_size, default=DEFAULT_MAX_BYTES,
+                       help='缓存总大小上限，超过时按最近使用时间淘汰，如 500M、20G (默认: 10G)')
+    parser.add_argument('--cache-mode', choices=CACHE_MODES, default='copy',
+                       help='缓存命中时的输出方式: copy 复制 / link 硬链接 / return 只输出缓存路径 (默认: copy)')
+    parser.add_argument('--checkpoint-every', type=int,
+                       help='每隔约该记录数写入检查点 (<输出文件>.ckpt)，中断后可用 --resume 继续；'
+                            '配合 --config 时每个文件各自写检查点，并在运行清单 (<配置名>.run.json) 中记录已完成的文件')
+    parser.add_argument('--resume', action='store_true',
+                       help='从检查点继续中断的生成 (未指定 -o 时使用输出目录中该文件类型最近的检查点；'
+                            '配合 --config 时按运行清单跳过已完成的文件，配合 --partners 时使用最近的多合作方检查点)')
+    parser.add_argument('--profile',
+                       help='生成画像文件 (由 profile 子命令从样本文件构建)，交易类型/金额/日期/城市等按画像分布抽样')
+    parser.add_argument('--parallel-write', type=int, metavar='N',
+                       help='以N个进程并行生成单个文件，记录直接写入预分配文件的最终位置 (不支持故障注入/关联记录/检查点)')
+    parser.add_argument('--progress', choices=list(PROGRESS_REPORTERS),
+                       help='在标准错误输出进度: bar (单行刷新的进度条) 或 json (每个事件一行JSON)')
+    parser.add_argument('--stdout', action='store_true',
+                       help='将文件内容流式输出到标准输出，状态信息输出到标准错误')
+    parser.add_argument('--output-fd', type=int,
+                       help='将文件内容流式输出到指定的文件描述符 (如 3)')
+    parser.add_argument('--faults',
+                       help='故障注入规格，如 bad_expiry=0.01,non_numeric_amount=0.005,wrong_trailer_count')
+    parser.add_argument('--fault-seed', type=int,
+                       help='故障注入的随机种子')
     
     args = parser.parse_args()
+    if not args.file_type and not args.config and args.partners is None:
+        parser.error("必须指定 -t/--file-type、--config 或 --partners")
+    if args.stdout or args.output_fd is not None:
+        if args.config or args.partners is not None:
+            parser.error("--stdout/--output-fd 不能与 --config/--partners 同时使用")
+        if args.checkpoint_every is not None or args.resume or args.parallel_write:
+            parser.error("--stdout/--output-fd 不能与 --checkpoint-every/--resume/--parallel-write 同时使用"
+                         "（无法截断或定位写入已输出的数据）")
+        run_stream(args)
+        return
     
     try:
+        if args.config:
+            run_batch(args)
+            return
+        if args.partners is not None:
+            run_partners(args)
+            return
+        
         # 验证交易记录数量
-        if args.count < 1 or args.count > 9999:
-            raise ConfigError(f"交易记录数量必须在1-9999之间，当前值: {args.count}")
+        _check_count(args.count)
             
         # 初始化生成器
-        merger = FullTransactionMerger()
+        merger = _create_merger(args)
+        
+        if args.parallel_write:
+            run_parallel_write(args, merger)
+            return
         
         # 准备业务配置
         business_configs = [{
@@ -66,39 +218,612 @@ def run_cli():
         }]
         
         # 生成文件
-        filepath = merger.generate_file(
+        generate = lambda: merger.generate_file(
             file_type=args.file_type,
             count=args.count,
-            output_filename=args.output
+            output_filename=args.output,
+            write_control=not args.no_control_file,
+            write_index=args.index,
+            faults=_fault_injector(args),
+            progress=_progress_reporter(args),
+            seed=args.seed,
+            checkpoint_every=args.checkpoint_every,
+            resume=args.resume
         )
-    except FileNotFoundError as e:
+        if args.seed is None or args.no_cache or args.link_state:
+            # 结果不可复现(未指定种子，或依赖关联场景状态文件)时不使用缓存
+            generate()
+            return
+        
+        cache = GenerationCache(args.cache_dir, args.cache_max_size, args.cache_mode)
+        filepath = merger.output_path(args.file_type, args.output)
+        result = cache.get_or_generate(_cache_params(args, merger, filepath), merger.config_dir,
+                                       filepath, generate)
+        if result["hit"]:
+            print(f"\n♻️ 缓存命中: {result['path']}")
+        else:
+            print(f"    💾 已存入缓存: {result['key'][:16]}")
+    except Exception as e:
+        _exit_with_error(e)
+
+def run_parallel_write(args, merger: FullTransactionMerger):
+    """并行定位写入生成单个文件（结果依赖进程数，不使用缓存）"""
+    if args.parallel_write < 1:
+        raise ConfigError(f"并行写入进程数必须大于0: {args.parallel_write}")
+    if args.faults or args.link_rate or args.checkpoint_every or args.resume:
+        raise ConfigError("--parallel-write 不能与 --faults/--link-rate/--checkpoint-every/--resume 同时使用")
+    ParallelFileWriter(merger, args.parallel_write).generate_file(
+        file_type=args.file_type,
+        count=args.count,
+        output_filename=args.output,
+        write_control=not args.no_control_file,
+        write_index=args.index,
+        seed=args.seed,
+        progress=_progress_reporter(args)
+    )
+
+def _linked_options(args) -> Dict[str, Any]:
+    """命令行参数转换为关联交易场景参数，未指定 --link-rate 时为空"""
+    if not args.link_rate:
+        return None
+    return {
+        "rate": args.link_rate,
+        "reversal_share": args.reversal_share,
+        "reservoir_size": args.link_reservoir,
+        "state_path": args.link_state,
+    }
+
+def _fault_injector(args):
+    """按 --faults 创建故障注入器；未指定 --fault-seed 时沿用 --seed"""
+    if not args.faults:
+        return None
+    fault_seed = args.fault_seed if args.fault_seed is not None else args.seed
+    return FaultInjector(args.faults, fault_seed)
+
+def _cache_params(args, merger: FullTransactionMerger, filepath: str) -> Dict[str, Any]:
+    """决定生成结果的全部参数（缓存键）"""
+    params = {
+        "file_type": args.file_type,
+        "count": args.count,
+        "output": os.path.basename(filepath),
+        "seed": args.seed,
+        "clock": merger.clock.now().isoformat(),
+        "unique_doc_numbers": args.unique_doc_numbers,
+        "run_key": merger.doc_numbers.run_key if merger.doc_numbers else None,
+        "faults": args.faults,
+        "fault_seed": args.fault_seed if args.fault_seed is not None else args.seed,
+        "linked": _linked_options(args),
+        "index": args.index,
+        "control": not args.no_control_file,
+    }
+    if merger.profile is not None:
+        params["profile"] = merger.profile.digest
+    return params
+
+def _progress_reporter(args):
+    """按 --progress 创建进度回调（输出到标准错误），未指定时为空"""
+    return PROGRESS_REPORTERS[args.progress]() if args.progress else None
+
+def _create_clock(args):
+    """按 --seed/--date 创建时钟：指定种子时时钟固定不推进，只指定日期时从该日期的时刻开始推进"""
+    if args.seed is None and not args.date:
+        return None
+    day = args.date or datetime.now().strftime("%Y-%m-%d")
+    return FixedClock.for_date(day, args.time, advance=args.seed is None)
+
+def _create_merger(args) -> FullTransactionMerger:
+    """按命令行参数创建合并器"""
+    run_key = args.run_key
+    if run_key is None and args.seed is not None:
+        # 指定种子时文档号唯一模式的密钥也由种子派生，保证可复现
+        run_key = f"seed-{args.seed}"
+    merger = FullTransactionMerger(
+        unique_doc_numbers=args.unique_doc_numbers,
+        run_key=run_key,
+        clock=_create_clock(args)
+    )
+    linked = _linked_options(args)
+    if linked:
+        merger.use_linked_scenario(LinkedScenario(**linked))
+    if args.profile:
+        merger.use_profile(GenerationProfile.load(args.profile))
+    return merger
+
+def _check_count(count: int):
+    """校验单个文件的交易记录数量（文件尾记录数为5位，更大的运行需分为多个文件）"""
+    if not 1 <= count <= MAX_RECORDS_PER_FILE:
+        raise ConfigError(f"交易记录数量必须在1-{MAX_RECORDS_PER_FILE}之间，当前值: {count}，"
+                          f"更多记录请通过 --config 批量任务或 backfill 分为多个文件")
+
+def run_stream(args):
+    """流式输出模式：数据写入标准输出或指定文件描述符，其余输出全部转到标准错误"""
+    fd = sys.stdout.fileno() if args.stdout else args.output_fd
+    with redirect_stdout(sys.stderr):
+        try:
+            _check_count(args.count)
+            merger = _create_merger(args)
+            with os.fdopen(fd, 'w', encoding='utf-8', buffering=STREAM_BUFFER_SIZE, closefd=False) as stream:
+                merger.generate_file(
+                    file_type=args.file_type,
+                    count=args.count,
+                    output_filename=args.output,
+                    write_control=not args.no_control_file,
+                    write_index=args.index,
+                    faults=_fault_injector(args),
+                    output_stream=stream,
+                    progress=_progress_reporter(args),
+                    seed=args.seed
+                )
+        except BrokenPipeError:
+            # 下游提前关闭管道(如 head)，避免解释器退出时再次写入报错
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, fd)
+            print("❌ 输出管道已关闭", file=sys.stderr)
+            sys.exit(1)
+        except Exception as e:
+            _exit_with_error(e)
+
+def _exit_with_error(e: Exception):
+    """打印错误信息并以非零状态退出"""
+    if isinstance(e, FileNotFoundError):
         print(f"❌ 文件未找到: {e}")
-        sys.exit(1)
-    except FileTypeError as e:
+    elif isinstance(e, FileTypeError):
         print(f"❌ 文件类型错误: {e}")
         print("支持的文件类型: B (BSP) 或 M (MA)")
-        sys.exit(1)
-    except BusinessTypeError as e:
+    elif isinstance(e, BusinessTypeError):
         print(f"❌ 业务类型错误: {e}")
-        print("当前支持的业务类型: hotel")
-        sys.exit(1)
-    except ConfigError as e:
+        print("支持的业务类型: hotel, train, car, ship, fee, other, flight")
+    elif isinstance(e, ConfigError):
         print(f"❌ 配置错误: {e}")
         print("请检查参数是否正确")
-        sys.exit(1)
-    except FormatError as e:
+    elif isinstance(e, FormatError):
         print(f"❌ 格式错误: {e}")
-        sys.exit(1)
-    except CardNumberError as e:
+    elif isinstance(e, CardNumberError):
         print(f"❌ 卡号错误: {e}")
         print("请检查卡号配置是否正确")
-        sys.exit(1)
-    except Exception as e:
+    else:
         print(f"❌ 未预期的错误: {e}")
         print("如果问题持续存在，请联系开发人员")
         import traceback
         traceback.print_exc()
+    sys.exit(1)
+
+def run_batch(args):
+    """按JSON任务配置批量生成文件"""
+    jobs, options = load_batch_config(args.config)
+    runner = BatchRunner(
+        workers=args.workers or options.get("workers"),
+        unique_doc_numbers=args.unique_doc_numbers or options.get("unique_doc_numbers", False),
+        run_key=args.run_key or options.get("run_key"),
+        write_control=not args.no_control_file,
+        linked=_linked_options(args) or options.get("linked"),
+        progress=args.progress or options.get("progress"),
+        seed=args.seed if args.seed is not None else options.get("seed")
+    )
+    
+    run_manifest = None
+    if args.checkpoint_every is not None or args.resume:
+        config_name = os.path.splitext(os.path.basename(args.config))[0]
+        run_manifest = os.path.join(runner.merger.output_dir, config_name + RUN_MANIFEST_SUFFIX)
+    
+    start = time.perf_counter()
+    results = runner.run(jobs, run_manifest=run_manifest, checkpoint_every=args.checkpoint_every,
+                         resume=args.resume)
+    runner.print_summary(results, time.perf_counter() - start)
+    if run_manifest is not None:
+        print(f"    📄 运行清单: {run_manifest}")
+    
+    if any(result["error"] is not None for result in results):
+        sys.exit(1)
+
+def parse_partner_counts(spec: str) -> Dict[str, int]:
+    """解析多合作方规格 "MA=5000,B=200"，空字符串表示使用配置中的记录数"""
+    partner_counts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        code, sep, count = item.partition("=")
+        if not sep or not count.strip().isdigit():
+            raise ConfigError(f"合作方规格错误，应为 合作方=记录数: {item}")
+        partner_counts[code.strip()] = int(count)
+    return partner_counts
+
+def run_partners(args):
+    """多合作方一次生成：每个合作方一个文件"""
+    merger = _create_merger(args)
+    merger.generate_partner_files(
+        partner_counts=parse_partner_counts(args.partners),
+        write_control=not args.no_control_file,
+        progress=_progress_reporter(args),
+        seed=args.seed,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume
+    )
+
+def run_build_dict_cli(argv: List[str]):
+    """build-dict 子命令：构建内存映射行字典"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py build-dict",
+        description="将名称列表(文本文件每行一条，或YAML中的列表)构建为内存映射行字典(.dict)，"
+                    "条目只能是ASCII字符；已知字典(如 traveller_names / card_pans_B)按输出文件名校验对应记录字段的宽度",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py build-dict names.txt -o config/dictionaries/traveller_names.dict
+   python3 generate.py build-dict config/dictionaries/hotel_names.yaml --key hotel_names \\
+       -o config/dictionaries/hotel_names.dict
+   python3 generate.py build-dict iata.txt --length 3 -o config/dictionaries/IATA_code.dict
+        """
+    )
+    parser.add_argument('source', help='源文件: 文本文件(每行一条) 或 YAML文件(配合 --key)')
+    parser.add_argument('-o', '--output', required=True, help='输出的 .dict 文件路径')
+    parser.add_argument('--key', help='YAML源文件中列表对应的键名')
+    parser.add_argument('--length', type=int, help='只保留指定长度的条目 (如IATA代码为3)')
+    args = parser.parse_args(argv)
+    
+    entries = read_source_entries(args.source, args.key)
+    if args.length:
+        entries = (entry for entry in entries if len(entry) == args.length)
+    
+    start = time.perf_counter()
+    count = build_line_dictionary(entries, args.output)
+    print(f"✅ 字典构建成功: {args.output}")
+    print(f"    📊 条目数: {count}, 耗时: {time.perf_counter() - start:.2f}s")
+
+def run_build_card_pool_cli(argv: List[str]):
+    """build-card-pool 子命令：批量生成卡号池"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py build-card-pool",
+        description="按BIN范围批量生成唯一且通过Luhn校验的卡号池(.npy)，每张卡带独立有效期",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py build-card-pool --bin 557726:16 --bin 222300:16:0.5 --count 10000000 \\
+       -o config/dictionaries/pools/ma_cards.npy
+   python3 generate.py build-card-pool --bin 1888:15 --count 100000 -o config/dictionaries/pools/b_cards.npy
+然后在 card_numbers.yaml 的 card_pools 中配置卡号池路径和抽样分布
+        """
+    )
+    parser.add_argument('--bin', action='append', required=True, dest='bins',
+                       help='BIN范围，格式 BIN:卡号长度[:权重]，可重复指定')
+    parser.add_argument('--count', type=int, required=True, help='卡号总数')
+    parser.add_argument('--expiry-from', default='2701', help='最早有效期 YYMM (默认: 2701)')
+    parser.add_argument('--expiry-to', default='3912', help='最晚有效期 YYMM (默认: 3912)')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    parser.add_argument('-o', '--output', required=True, help='输出的 .npy 文件路径')
+    args = parser.parse_args(argv)
+    
+    from card_pool import generate_card_pool, save_card_pool  # 依赖numpy
+    
+    bin_ranges = []
+    for spec in args.bins:
+        parts = spec.split(':')
+        if len(parts) not in (2, 3) or not parts[1].isdigit():
+            raise ConfigError(f"BIN范围格式错误，应为 BIN:卡号长度[:权重]: {spec}")
+        item = {"bin": parts[0], "length": int(parts[1])}
+        if len(parts) == 3:
+            item["weight"] = float(parts[2])
+        bin_ranges.append(item)
+    
+    start = time.perf_counter()
+    pool = generate_card_pool(bin_ranges, args.count, args.expiry_from, args.expiry_to, args.seed)
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+    save_card_pool(pool, args.output, bin_ranges)
+    print(f"✅ 卡号池生成成功: {args.output}")
+    print(f"    📊 卡号数: {len(pool)}, BIN范围数: {len(bin_ranges)}, 耗时: {time.perf_counter() - start:.2f}s")
+
+def run_lookup_cli(argv: List[str]):
+    """lookup 子命令：通过索引文件查找记录"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py lookup",
+        description="通过生成时写入的索引文件(<文件>.idx)按键查找记录",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py -t M --count 5000 --index -o big
+   python3 generate.py lookup output/big.txt --serial GALAXYSERIAL20250911155416001
+   python3 generate.py lookup output/big.txt --doc 8812345678
+   python3 generate.py lookup output/big.txt --card 5577267765251118
+        """
+    )
+    parser.add_argument('file', help='交易数据文件路径')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--serial', help='TRANSACTION_SERIAL_NUMBER')
+    group.add_argument('--doc', help='DOCUMENT_NUMBER')
+    group.add_argument('--card', help='CARD_NUMBER')
+    args = parser.parse_args(argv)
+    
+    from record_index import RecordIndex
+    
+    if args.serial:
+        kind, value = "serial", args.serial
+    elif args.doc:
+        kind, value = "document", args.doc
+    else:
+        kind, value = "card", args.card
+    
+    with RecordIndex(args.file) as index:
+        start = time.perf_counter()
+        records = index.lookup(kind, value)
+        elapsed = time.perf_counter() - start
+    
+    for ordinal, record in records:
+        print(f"#{ordinal}: {record}")
+    print(f"🔎 找到 {len(records)} 条记录，耗时 {elapsed * 1e6:.0f}μs", file=sys.stderr)
+
+def run_inject_faults_cli(argv: List[str]):
+    """inject-faults 子命令：直接改坏已有文件中的记录"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py inject-faults",
+        description="以内存映射方式直接修改已有交易数据文件，按规则改坏指定比例的记录",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+支持的规则 (规则名[:参数]=比例):
+   bad_expiry                  EXPIRY_DATE 月份改为 13-99
+   non_numeric_amount[:位数]   TRANSACTION_AMOUNT 中混入字母 (默认3位)
+   short_service_description[:位数]  SERVICE_DESCRIPTION 缩短 (默认10位)
+   non_flight_type             B文件中交易类型改为非F类型
+   wrong_trailer_count[:偏移]  文件尾记录数错误 (文件级规则，不需要比例)
+
+使用示例:
+   python3 generate.py inject-faults output/big.txt --faults bad_expiry=0.01,wrong_trailer_count:-1
+   python3 generate.py inject-faults output/b.txt --faults non_flight_type=0.05 --seed 7
+        """
+    )
+    parser.add_argument('file', help='交易数据文件路径 (原地修改)')
+    parser.add_argument('--faults', required=True, help='故障注入规格')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    args = parser.parse_args(argv)
+    
+    injector = FaultInjector(args.faults, args.seed)
+    start = time.perf_counter()
+    summary = inject_faults(args.file, injector)
+    manifest_path = injector.write_manifest(args.file)
+    print(f"✅ 故障注入成功: {args.file}")
+    for name, ordinals in summary["records"].items():
+        print(f"    💥 {name}: {len(ordinals)} 条记录")
+    for name in summary["file_rules"]:
+        print(f"    💥 {name}: 文件尾")
+    print(f"    📄 清单: {manifest_path}, 耗时: {time.perf_counter() - start:.2f}s")
+
+def run_backfill_cli(argv: List[str]):
+    """backfill 子命令：按日期范围并发生成历史文件"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py backfill",
+        description="按日期范围每天生成一个文件，文件头、文件名及记录中的日期均按该处理日期派生",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py backfill -t M --from 2026-09-01 --to 2026-09-30 --count 5000 --workers 8
+   python3 generate.py backfill -t B --from 20260901 --to 20260907 --count 1000 --unique-doc-numbers
+        """
+    )
+    parser.add_argument('-t', '--file-type', choices=['B', 'M'], required=True,
+                       help='文件类型: B (BSP) 或 M (MA)')
+    parser.add_argument('--from', dest='start', required=True, help='起始处理日期 (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', required=True, help='结束处理日期，包含当天 (YYYY-MM-DD)')
+    parser.add_argument('--count', type=int, required=True, help='每天的交易记录数量')
+    parser.add_argument('--workers', type=int, help='并发进程数 (默认: CPU核数)')
+    parser.add_argument('--unique-doc-numbers', action='store_true',
+                       help='启用文档号唯一模式，保证所有日期的文件内文档号不重复')
+    parser.add_argument('--run-key', help='文档号唯一模式的运行密钥 (默认随机生成)。'
+                                          '只保证同一次运行内不重复，不同运行重用同一个密钥会重新发放相同的文档号')
+    parser.add_argument('--no-control-file', action='store_true', help='不生成对账控制文件')
+    parser.add_argument('--manifest', help='清单文件路径 (默认: output/backfill_<起始>_<结束>.manifest.json)')
+    parser.add_argument('--checkpoint-every', type=int,
+                       help='每个文件每隔约该记录数写入检查点，并在运行清单 (<清单文件名去掉.json>.run.json) 中记录已完成的文件')
+    parser.add_argument('--resume', action='store_true',
+                       help='按运行清单继续中断的补数：跳过已完成的文件，未完成的文件从检查点继续')
+    args = parser.parse_args(argv)
+    
+    _check_count(args.count)
+    jobs = build_backfill_jobs(args.start, args.end, args.file_type, args.count)
+    runner = BatchRunner(
+        workers=args.workers,
+        unique_doc_numbers=args.unique_doc_numbers,
+        run_key=args.run_key,
+        write_control=not args.no_control_file
+    )
+    
+    first_date, last_date = jobs[0]["processing_date"], jobs[-1]["processing_date"]
+    manifest_path = args.manifest or os.path.join(
+        runner.merger.output_dir, f"backfill_{first_date}_{last_date}.manifest.json")
+    run_manifest = None
+    if args.checkpoint_every is not None or args.resume:
+        run_manifest = os.path.splitext(manifest_path)[0] + RUN_MANIFEST_SUFFIX
+    
+    start = time.perf_counter()
+    results = runner.run(jobs, run_manifest=run_manifest, checkpoint_every=args.checkpoint_every,
+                         resume=args.resume)
+    runner.print_summary(results, time.perf_counter() - start)
+    
+    write_backfill_manifest(results, manifest_path, file_type=args.file_type,
+                            start=first_date, end=last_date, count_per_day=args.count)
+    print(f"    📄 补数清单: {manifest_path}")
+    
+    if any(result["error"] is not None for result in results):
         sys.exit(1)
 
+def run_sort_cli(argv: List[str]):
+    """sort 子命令：按定长键外部排序交易数据文件"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py sort",
+        description="按 PURCHASE_DATE / CARD_NUMBER 等定长键对记录做外部归并排序，文件头和文件尾保持不变，"
+                    "多个滚动文件合并排序为一个输出文件",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+排序键: date (PURCHASE_DATE), card (CARD_NUMBER), serial, document, type, amount，或任意记录字段名
+
+使用示例:
+   python3 generate.py sort output/big.txt --key date,card
+   python3 generate.py sort output/part1.txt output/part2.txt --key card -o output/by_card.txt
+   python3 generate.py sort output/huge.txt --key date --memory 512M --workers 8 --tmp-dir /mnt/scratch
+        """
+    )
+    parser.add_argument('files', nargs='+', help='交易数据文件路径')
+    parser.add_argument('--key', default='date', help='排序键，逗号分隔的多个键按顺序比较 (默认: date)')
+    parser.add_argument('-o', '--output', help='输出文件路径 (默认: <第一个文件>.sorted)')
+    parser.add_argument('--memory', type=parse_size, default=DEFAULT_SORT_MEMORY,
+                       help='生成有序段时的总内存预算，如 256M、2G (默认: 256M)')
+    parser.add_argument('--workers', type=int, help='并行生成有序段的进程数 (默认: CPU核数)')
+    parser.add_argument('--tmp-dir', help='临时段文件目录 (默认: 输出文件所在目录)')
+    args = parser.parse_args(argv)
+    
+    output = args.output or args.files[0] + SORTED_FILE_SUFFIX
+    try:
+        start = time.perf_counter()
+        count = sort_files(args.files, output, args.key, args.memory, args.workers, args.tmp_dir)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        _exit_with_error(e)
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 排序完成: {output}")
+    print(f"    📊 {count} 条记录, 耗时 {elapsed:.2f}s ({rate:,.0f} 记录/秒)")
+
+def run_merge_cli(argv: List[str]):
+    """merge 子命令：合并多个已生成的文件"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py merge",
+        description="将多个相同文件类型的文件中的记录按顺序合并为一个文件，写入新的文件头和重新计算的文件尾",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py merge output/part_001 output/part_002 output/part_003 -o output/merged.txt
+        """
+    )
+    parser.add_argument('files', nargs='+', help='交易数据文件路径 (文件类型必须相同)')
+    parser.add_argument('-o', '--output', required=True, help='输出文件路径')
+    args = parser.parse_args(argv)
+    
+    from file_merge_split import FileMergeSplit
+    
+    try:
+        start = time.perf_counter()
+        result = FileMergeSplit().merge(args.files, args.output)
+    except Exception as e:
+        _exit_with_error(e)
+    print(f"✅ 合并完成: {result['path']}")
+    print(f"    📊 {len(args.files)} 个文件, {result['count']} 条记录, 耗时 {time.perf_counter() - start:.2f}s")
+
+def run_split_cli(argv: List[str]):
+    """split 子命令：拆分已生成的文件"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py split",
+        description="将一个文件按记录数、字节大小或交易类型拆分为多个文件，每个文件写入新的文件头和重新计算的文件尾",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py split output/big.txt --records 1000
+   python3 generate.py split output/big.txt --bytes 5M -o output/part
+   python3 generate.py split output/big.txt --by-type
+        """
+    )
+    parser.add_argument('file', help='交易数据文件路径')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--records', type=int, help='每个文件的记录数')
+    group.add_argument('--bytes', type=parse_size, help='每个文件的最大字节数 (含文件头和文件尾)，如 5M')
+    group.add_argument('--by-type', action='store_true', help='按交易类型拆分，每种类型一个文件')
+    parser.add_argument('-o', '--output-prefix', help='输出文件名前缀 (默认: 输入文件路径)')
+    args = parser.parse_args(argv)
+    
+    from file_merge_split import FileMergeSplit
+    
+    if args.by_type:
+        mode, size = "type", None
+    elif args.bytes:
+        mode, size = "bytes", args.bytes
+    else:
+        mode, size = "records", args.records
+    try:
+        start = time.perf_counter()
+        parts = FileMergeSplit().split(args.file, args.output_prefix, mode, size)
+    except Exception as e:
+        _exit_with_error(e)
+    print(f"✅ 拆分完成: {len(parts)} 个文件, 耗时 {time.perf_counter() - start:.2f}s")
+    for part in parts:
+        print(f"    📄 {part['path']}: {part['count']} 条记录")
+
+def run_scan_duplicates_cli(argv: List[str]):
+    """scan-duplicates 子命令：跨文件扫描重复的流水号/文档号"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py scan-duplicates",
+        description="以Bloom过滤器(固定内存)扫描多个文件中重复的键，第二遍精确确认并列出重复记录的文件和序号",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py scan-duplicates output/APGPay.*
+   python3 generate.py scan-duplicates output/*.txt --keys serial --memory 2G --workers 8 --report dups.json
+
+存在重复时以状态码1退出，可直接用于CI检查
+        """
+    )
+    parser.add_argument('files', nargs='+', help='交易数据文件路径')
+    parser.add_argument('--keys', default=','.join(DEFAULT_SCAN_KEYS),
+                       help=f'扫描的键，逗号分隔: {", ".join(SCAN_KEYS)} (默认: serial,document)')
+    parser.add_argument('--memory', type=parse_size, default=DEFAULT_SCAN_MEMORY,
+                       help='Bloom过滤器总内存预算，如 512M、4G (默认: 512M)')
+    parser.add_argument('--workers', type=int, help='并行读取的进程数 (默认: CPU核数)')
+    parser.add_argument('--report', help='将完整结果写入JSON文件')
+    parser.add_argument('--limit', type=int, default=20, help='每个键最多列出的重复值数 (默认: 20)')
+    args = parser.parse_args(argv)
+    
+    try:
+        start = time.perf_counter()
+        scanner = DuplicateScanner([key.strip() for key in args.keys.split(",") if key.strip()],
+                                   args.memory, args.workers)
+        result = scanner.scan(args.files)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        _exit_with_error(e)
+    for line in format_report(result, args.limit):
+        print(line)
+    print(f"    ⏱️ 耗时 {elapsed:.2f}s ({result['records'] / elapsed if elapsed > 0 else 0:,.0f} 记录/秒)")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"    📄 结果: {args.report}")
+    if any(result["duplicates"].values()):
+        sys.exit(1)
+
+def run_profile_cli(argv: List[str]):
+    """profile 子命令：扫描样本文件构建生成画像"""
+    parser = argparse.ArgumentParser(
+        prog="generate.py profile",
+        description="一遍扫描样本文件的定长字段，构建交易类型比例、金额直方图、购买日期偏移和城市/IATA等字段频数的生成画像",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+   python3 generate.py profile samples/prod_sample.txt -o prod.profile.json
+   python3 generate.py profile samples/*.txt -o prod.profile.json --max-values 1000
+   python3 generate.py -t M --count 9999 --profile prod.profile.json
+        """
+    )
+    parser.add_argument('files', nargs='+', help='样本文件路径 (可以是多个文件)')
+    parser.add_argument('-o', '--output', help=f'画像文件路径 (默认: <第一个样本文件>{PROFILE_FILE_SUFFIX})')
+    parser.add_argument('--max-values', type=int, default=MAX_FIELD_VALUES,
+                       help=f'每个字段频数表保留的取值数，其余合计为"其他" (默认: {MAX_FIELD_VALUES})')
+    args = parser.parse_args(argv)
+    
+    output = args.output or args.files[0] + PROFILE_FILE_SUFFIX
+    start = time.perf_counter()
+    profile = build_profile(args.files, output, args.max_values)
+    elapsed = time.perf_counter() - start
+    for line in format_profile(profile):
+        print(line)
+    print(f"✅ 画像已写入: {output} (耗时 {elapsed:.2f}s)")
+
+# 工具子命令注册表
+TOOL_COMMANDS = {
+    "build-dict": run_build_dict_cli,
+    "build-card-pool": run_build_card_pool_cli,
+    "lookup": run_lookup_cli,
+    "inject-faults": run_inject_faults_cli,
+    "backfill": run_backfill_cli,
+    "sort": run_sort_cli,
+    "merge": run_merge_cli,
+    "split": run_split_cli,
+    "scan-duplicates": run_scan_duplicates_cli,
+    "profile": run_profile_cli,
+}
+
 if __name__ == "__main__":
     run_cli()
@@ -2,6 +2,6 @@
 工具类包
 """
 
-from .city_utils import CityUtils
+from .city_utils import CityRegistry, CityUtils
 
-__all__ = ['CityUtils']
+__all__ = ['CityRegistry', 'CityUtils']
@@ -3,65 +3,135 @@
 """
 城市工具类
 提供城市相关的公共方法，如获取城市三字码、城市名称等
+
+城市数据按配置目录索引：每个配置目录只解析一次，解析结果保存为
+三字码<->城市名的双向哈希表和预先补齐宽度的城市名，查询为O(1)，
+随机抽取k个不重复城市为O(k)。
+注册表被多个生成器共用，随机抽取时由调用方传入自己的随机令牌服务(RandomTokens)，
+指定种子时结果可复现；不传入时使用 random 模块（兼容旧接口）。
 """
 
 import os
 import random
+import threading
 import yaml
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+# 业务描述中城市名字段的标准宽度
+CITY_NAME_WIDTH = 20
+
 
-class CityUtils:
-    """城市工具类"""
-    _instance = None
-    _initialized = False
+class CityRegistry:
+    """城市注册表类（按配置目录缓存）"""
+    _registries: Dict[str, "CityRegistry"] = {}
+    _lock = threading.Lock()
 
-    def __new__(cls, config_dir: str = "config"):
-        """单例模式，确保只有一个实例"""
-        if cls._instance is None:
-            cls._instance = super(CityUtils, cls).__new__(cls)
-        return cls._instance
+    @classmethod
+    def for_config(cls, config_dir: str = "config") -> "CityRegistry":
+        """获取指定配置目录的城市注册表，同一目录只加载一次
+        Args:
+            config_dir: 配置目录
+        Returns:
+            CityRegistry: 该配置目录对应的城市注册表
+        """
+        key = os.path.abspath(config_dir)
+        registry = cls._registries.get(key)
+        if registry is None:
+            with cls._lock:
+                registry = cls._registries.get(key)
+                if registry is None:
+                    registry = cls(config_dir)
+                    cls._registries[key] = registry
+        return registry
 
     def __init__(self, config_dir: str = "config"):
-        """初始化，加载城市数据
-        使用单例模式，避免重复加载城市数据
+        """初始化，加载并索引城市数据
+        一般通过 CityRegistry.for_config() 获取，避免重复加载
         """
-        if not self._initialized:
-            self.config_dir = config_dir
-            self._city_data = self._load_city_data()
-            self._city_pairs = self._parse_city_pairs()
-            CityUtils._initialized = True
+        self.config_dir = config_dir
+        self._codes: List[str] = []
+        self._names: List[str] = []
+        self._padded_names: List[str] = []
+        self._name_by_code: Dict[str, str] = {}
+        self._code_by_name: Dict[str, str] = {}
+        for code, value in self._load_city_data().items():
+            # value 格式可能是 "Shanghai  # 上海"
+            city_name = str(value).split('#')[0].strip() if value else ""
+            if not city_name:
+                continue
+            self._codes.append(code)
+            self._names.append(city_name)
+            self._padded_names.append(city_name.ljust(CITY_NAME_WIDTH)[:CITY_NAME_WIDTH])
+            self._name_by_code[code] = city_name
+            self._code_by_name.setdefault(city_name, code)
+        self._city_pairs: List[Tuple[str, str]] = list(zip(self._codes, self._names))
 
     def _load_city_data(self) -> dict:
         """加载城市数据文件"""
         city_file = os.path.join(self.config_dir, "dictionaries", "city_number.yaml")
         with open(city_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+            return yaml.safe_load(f) or {}
 
-    def _parse_city_pairs(self) -> List[Tuple[str, str]]:
-        """解析城市数据为(三字码, 城市名)对的列表"""
-        city_pairs = []
-        for code, value in self._city_data.items():
-            # value 格式可能是 "Shanghai  # 上海"
-            city_name = value.split('#')[0].strip()
-            if city_name:
-                city_pairs.append((code, city_name))
-        return city_pairs
+    def __len__(self) -> int:
+        return len(self._codes)
 
-    def get_random_city(self) -> Tuple[str, str]:
+    def sample_indices(self, count: int, tokens=None) -> List[int]:
+        """随机抽取指定数量的不重复城市下标（Floyd算法，O(k)）
+        Args:
+            count: 需要抽取的数量，超过城市总数时取城市总数
+            tokens: 随机令牌服务(RandomTokens)，为空时使用 random 模块
+        Returns:
+            List[int]: 城市下标列表（顺序随机）
+        """
+        number = tokens.number if tokens is not None else random.randint
+        total = len(self._codes)
+        count = min(count, total)
+        selected = set()
+        indices = []
+        for upper in range(total - count, total):
+            index = number(0, upper)
+            if index in selected:
+                index = upper
+            selected.add(index)
+            indices.append(index)
+        # 打乱顺序 (Fisher-Yates)
+        for i in range(len(indices) - 1, 0, -1):
+            j = number(0, i)
+            indices[i], indices[j] = indices[j], indices[i]
+        return indices
+
+    def sample_pairs(self, count: int, tokens=None) -> List[Tuple[str, str]]:
+        """随机抽取指定数量的不重复城市，返回(三字码, 补齐宽度的城市名)
+        Args:
+            count: 需要抽取的数量
+            tokens: 随机令牌服务(RandomTokens)，为空时使用 random 模块
+        Returns:
+            List[Tuple[str, str]]: [(三字码, 20位城市名), ...]
+        """
+        codes, padded = self._codes, self._padded_names
+        return [(codes[i], padded[i]) for i in self.sample_indices(count, tokens)]
+
+    def get_random_city(self, tokens=None) -> Tuple[str, str]:
         """随机获取一个城市的三字码和名称
+        Args:
+            tokens: 随机令牌服务(RandomTokens)，为空时使用 random 模块
         Returns:
             Tuple[str, str]: (城市三字码, 城市名称)，如 ("SHA", "Shanghai")
         """
+        if tokens is not None:
+            return tokens.pick(self._city_pairs)
         return random.choice(self._city_pairs)
 
-    def get_random_cities(self, count: int = 2) -> List[Tuple[str, str]]:
+    def get_random_cities(self, count: int = 2, tokens=None) -> List[Tuple[str, str]]:
         """随机获取指定数量的不重复城市
         Args:
             count: 需要获取的城市数量
+            tokens: 随机令牌服务(RandomTokens)，为空时使用 random 模块
         Returns:
             List[Tuple[str, str]]: [(城市三字码1, 城市名称1), (城市三字码2, 城市名称2), ...]
         """
-        return random.sample(self._city_pairs, min(count, len(self._city_pairs)))
+        pairs = self._city_pairs
+        return [pairs[i] for i in self.sample_indices(count, tokens)]
 
     def get_city_by_code(self, code: str) -> Optional[str]:
         """根据城市三字码获取城市名称
@@ -70,10 +140,7 @@ class CityUtils:
         Returns:
             Optional[str]: 城市名称，如果找不到则返回 None
         """
-        value = self._city_data.get(code)
-        if value:
-            return value.split('#')[0].strip()
-        return None
+        return self._name_by_code.get(code)
 
     def get_code_by_city(self, city_name: str) -> Optional[str]:
         """根据城市名称获取城市三字码
@@ -82,11 +149,7 @@ class CityUtils:
         Returns:
             Optional[str]: 城市三字码，如果找不到则返回 None
         """
-        city_name = city_name.strip()
-        for code, value in self._city_data.items():
-            if value.split('#')[0].strip() == city_name:
-                return code
-        return None
+        return self._code_by_name.get(city_name.strip())
 
     def get_all_cities(self) -> List[Tuple[str, str]]:
         """获取所有城市的三字码和名称
@@ -95,7 +158,7 @@ class CityUtils:
         """
         return self._city_pairs.copy()
 
-    def format_city_name(self, city_name: str, width: int = 20) -> str:
+    def format_city_name(self, city_name: str, width: int = CITY_NAME_WIDTH) -> str:
         """格式化城市名称，使其固定宽度（右侧补空格）
         Args:
             city_name: 城市名称
@@ -104,3 +167,8 @@ class CityUtils:
             str: 格式化后的城市名称
         """
         return city_name.ljust(width)
+
+
+def CityUtils(config_dir: str = "config") -> CityRegistry:
+    """兼容旧接口：返回指定配置目录的城市注册表"""
+    return CityRegistry.for_config(config_dir)
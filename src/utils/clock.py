@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时钟工具
+所有生成器通过 clock.now() 获取当前时间，而不是直接调用 datetime.now()：
+- SystemClock: 系统时间（默认）
+- FixedClock: 固定在指定时刻（可随运行时间推进），用于补数时按处理日期生成历史文件
+"""
+
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Union
+
+from txn_errors import ConfigError
+
+
+class SystemClock:
+    """系统时钟"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class FixedClock:
+    """固定时钟：从指定时刻开始，advance 为真时随实际运行时间推进（流水号等时间戳保持递增）"""
+
+    def __init__(self, moment: datetime, advance: bool = True):
+        self.moment = moment
+        self.advance = advance
+        self._started = time.monotonic()
+
+    @classmethod
+    def for_date(cls, day: Union[date, str], time_of_day: str = "09:00:00",
+                 advance: bool = True) -> "FixedClock":
+        """创建指定日期某一时刻的时钟
+        Args:
+            day: 日期或 YYYY-MM-DD / YYYYMMDD 字符串
+            time_of_day: HH:MM:SS
+        """
+        if isinstance(day, str):
+            day = parse_date(day)
+        try:
+            clock_time = datetime.strptime(time_of_day, "%H:%M:%S").time()
+        except ValueError:
+            raise ConfigError(f"时间格式错误，应为HH:MM:SS: {time_of_day}")
+        return cls(datetime.combine(day, clock_time), advance)
+
+    def now(self) -> datetime:
+        if not self.advance:
+            return self.moment
+        return self.moment + timedelta(seconds=time.monotonic() - self._started)
+
+    def __getstate__(self):
+        # 跨进程传递时从新进程开始计时
+        return {"moment": self.moment, "advance": self.advance}
+
+    def __setstate__(self, state):
+        self.__init__(state["moment"], state["advance"])
+
+
+def parse_date(value: str) -> date:
+    """解析 YYYY-MM-DD 或 YYYYMMDD 格式的日期"""
+    for fmt in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ConfigError(f"日期格式错误，应为YYYY-MM-DD或YYYYMMDD: {value}")
+
+
+def date_range(start: Union[date, str], end: Union[date, str]) -> List[date]:
+    """闭区间日期列表"""
+    if isinstance(start, str):
+        start = parse_date(start)
+    if isinstance(end, str):
+        end = parse_date(end)
+    if end < start:
+        raise ConfigError(f"日期范围错误: {start} - {end}")
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+带注释的JSON配置读取工具
+支持 // 风格的行注释（字符串内的 // 不受影响）
+"""
+
+import json
+from typing import Any
+
+from txn_errors import ConfigError
+
+
+def strip_json_comments(text: str) -> str:
+    """去除JSON文本中的 // 注释
+    Args:
+        text: 带注释的JSON文本
+    Returns:
+        str: 去除注释后的JSON文本
+    """
+    result = []
+    in_string = False
+    escaped = False
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if in_string:
+            result.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            i += 1
+        elif char == '"':
+            in_string = True
+            result.append(char)
+            i += 1
+        elif text.startswith("//", i):
+            # 跳过到行尾，保留换行符以便报错行号准确
+            end = text.find("\n", i)
+            i = length if end == -1 else end
+        else:
+            result.append(char)
+            i += 1
+    return "".join(result)
+
+
+def load_json_with_comments(path: str) -> Any:
+    """读取带 // 注释的JSON配置文件
+    Args:
+        path: 配置文件路径
+    Returns:
+        Any: 解析后的JSON对象
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        return json.loads(strip_json_comments(text))
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"配置文件格式错误 {path}: {e}")
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存映射行字典
+Memory-mapped Line Dictionary
+
+大字典（百万级姓名、数十万酒店、大批量卡号）使用带偏移索引的行文件格式：
+
+    [8字节魔数 GXDICT01][8字节条目数N][(N+1)个8字节偏移][数据区: 每条一行, UTF-8]
+
+文件以只读方式内存映射，按随机下标读取偏移后切片解码，不为每个条目创建Python对象；
+并行运行时多个进程映射同一文件，通过操作系统页缓存共享。
+
+条目会按原样（补空格/补0）写入定长记录，构建和加载时校验：所有条目只能是ASCII字符，
+已知字典(DICT_ENTRY_RULES)的条目长度不能超过对应的记录字段，卡号字典只能是数字。
+"""
+
+import mmap
+import operator
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import yaml
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from txn_errors import ConfigError
+
+DICT_MAGIC = b"GXDICT01"
+DICT_SUFFIX = ".dict"
+_HEADER = struct.Struct("<8sQ")
+_OFFSET = struct.Struct("<Q")
+_OFFSET_PAIR = struct.Struct("<QQ")
+# 加载时逐块校验数据区的块大小
+_CHECK_BLOCK = 16 * 1024 * 1024
+# 加载时逐块校验条目长度的偏移个数（每块 8MB）
+_OFFSET_BLOCK = 1024 * 1024
+
+# 已知字典名 -> (最短, 最长, 是否只含数字)，与使用该字典的记录字段宽度一致
+DICT_ENTRY_RULES = {
+    "traveller_names": (1, 30, False),  # TRAVELLER_NAME (30位)
+    "hotel_names": (1, 30, False),      # SD_HOTEL_NAME (30位)
+    "city_names": (1, 20, False),       # LOCATION_CITY (20位)
+    "IATA_code": (3, 3, False),         # 3位IATA代码
+    "card_pans_B": (15, 15, True),      # "0000" + 卡号 = CARD_NUMBER (19位)
+    "card_pans_MA": (16, 16, True),     # "000" + 卡号 = CARD_NUMBER (19位)
+}
+
+
+def check_entry(entry: str, rule: Optional[Tuple[int, int, bool]] = None, source: str = ""):
+    """校验单个条目：只能是ASCII字符，指定规则时校验长度和是否只含数字"""
+    if not entry.isascii():
+        raise ConfigError(f"字典条目只能包含ASCII字符(记录按字节定长): {entry!r} ({source})")
+    if rule is not None:
+        min_width, max_width, digits = rule
+        if not min_width <= len(entry) <= max_width:
+            width = max_width if min_width == max_width else f"{min_width}-{max_width}"
+            raise ConfigError(f"字典条目长度必须为{width}位: {entry!r} ({source})")
+        if digits and not entry.isdigit():
+            raise ConfigError(f"字典条目只能包含数字: {entry!r} ({source})")
+
+
+class LineDictionary(Sequence):
+    """内存映射行字典类（只读序列，可直接用于 random.choice）"""
+
+    def __init__(self, path: str):
+        """打开并映射字典文件
+        Args:
+            path: .dict 文件路径
+        """
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise ConfigError(f"字典文件格式错误: {self.path}")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != DICT_MAGIC:
+            self._mm.close()
+            raise ConfigError(f"字典文件格式错误(魔数不匹配): {self.path}")
+        self._count = count
+        self._data_start = _HEADER.size + _OFFSET.size * (count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if not isinstance(index, int):
+            raise TypeError(f"字典下标必须是整数: {index!r}")
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = _OFFSET_PAIR.unpack_from(self._mm, _HEADER.size + _OFFSET.size * index)
+        # 每个条目以换行符结尾，切片时去掉
+        return self._mm[self._data_start + start:self._data_start + end - 1].decode("utf-8")
+
+    def _entry_lengths(self) -> Iterator[Tuple[int, List[int]]]:
+        """按块返回条目长度(含换行符，即相邻偏移之差): (块内第一个条目的下标, 长度列表)
+        直接读取映射中的偏移表（小端机器上为零拷贝视图），不复制整张表
+        """
+        for first in range(0, self._count, _OFFSET_BLOCK):
+            last = min(first + _OFFSET_BLOCK, self._count)
+            start = _HEADER.size + _OFFSET.size * first
+            end = _HEADER.size + _OFFSET.size * (last + 1)
+            if sys.byteorder == "little":
+                with memoryview(self._mm) as view, view[start:end].cast("Q") as offsets:
+                    lengths = list(map(operator.sub, offsets[1:], offsets[:-1]))
+            else:
+                offsets = array("Q", self._mm[start:end])
+                offsets.byteswap()
+                lengths = list(map(operator.sub, offsets[1:], offsets[:-1]))
+            yield first, lengths
+
+    def validate(self, rule: Optional[Tuple[int, int, bool]] = None):
+        """校验全部条目（见 check_entry），按块扫描偏移表和数据区，不逐条解码"""
+        if self._count == 0:
+            return
+        if rule is not None:
+            min_width, max_width, _ = rule
+            for first, lengths in self._entry_lengths():
+                if min(lengths) < min_width + 1 or max(lengths) > max_width + 1:
+                    index = next(i for i, length in enumerate(lengths)
+                                 if not min_width + 1 <= length <= max_width + 1)
+                    check_entry(self[first + index], rule, self.path)
+        digits = rule is not None and rule[2]
+        data_end = self._data_start + _OFFSET.unpack_from(self._mm, self._data_start - _OFFSET.size)[0]
+        for start in range(self._data_start, data_end, _CHECK_BLOCK):
+            block = self._mm[start:min(start + _CHECK_BLOCK, data_end)]
+            if block.translate(None, b"0123456789\n") if digits else not block.isascii():
+                # 定位到具体条目以便报错
+                for entry in self:
+                    check_entry(entry, rule, self.path)
+
+    def choice(self) -> str:
+        """随机取一个条目"""
+        return self[random.randrange(self._count)]
+
+    def close(self):
+        """关闭内存映射"""
+        self._mm.close()
+
+    def __getstate__(self):
+        # 跨进程传递时只传路径，子进程重新映射同一文件
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+
+def dict_rule(path: str) -> Optional[Tuple[int, int, bool]]:
+    """按字典文件名(不含扩展名)查找条目规则，未知字典返回 None"""
+    return DICT_ENTRY_RULES.get(os.path.splitext(os.path.basename(path))[0])
+
+
+def build_line_dictionary(entries: Iterable[str], dest_path: str,
+                          rule: Optional[Tuple[int, int, bool]] = None) -> int:
+    """将条目写入行字典文件（流式写入，适用于千万级条目）
+    Args:
+        entries: 条目迭代器，每个条目不能包含换行符
+        dest_path: 输出 .dict 文件路径
+        rule: 条目规则 (最短, 最长, 是否只含数字)，为空时按文件名查找 DICT_ENTRY_RULES
+    Returns:
+        int: 写入的条目数
+    """
+    rule = rule or dict_rule(dest_path)
+    offsets = array("Q", [0])
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    with tempfile.TemporaryFile(dir=dest_dir) as data:
+        position = 0
+        for entry in entries:
+            if "\n" in entry:
+                raise ConfigError(f"字典条目不能包含换行符: {entry!r}")
+            check_entry(entry, rule, dest_path)
+            encoded = entry.encode("utf-8") + b"\n"
+            data.write(encoded)
+            position += len(encoded)
+            offsets.append(position)
+        count = len(offsets) - 1
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        data.seek(0)
+        tmp_path = dest_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(_HEADER.pack(DICT_MAGIC, count))
+            offsets.tofile(out)
+            shutil.copyfileobj(data, out, 1024 * 1024)
+    os.replace(tmp_path, dest_path)
+    return count
+
+
+def read_source_entries(source_path: str, key: str = None) -> Iterable[str]:
+    """读取字典源文件的条目
+    - YAML文件且指定key: 读取该key下的列表
+    - 其他文本文件: 每行一个条目（忽略空行和 # 注释行），流式读取
+    """
+    if key:
+        with open(source_path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        if key not in data:
+            raise ConfigError(f"字典源文件中没有找到 {key}: {source_path}")
+        for entry in data[key]:
+            yield str(entry)
+        return
+    with open(source_path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = line.strip()
+            if entry and not entry.startswith("#"):
+                yield entry
+
+
+def load_word_list(dict_dir: str, yaml_file: str, key: str) -> Union[List[str], LineDictionary]:
+    """加载字典列表：优先使用 {key}.dict 行字典，否则读取YAML文件中的列表
+    Args:
+        dict_dir: 字典目录
+        yaml_file: YAML字典文件名
+        key: 列表对应的键名（同时也是行字典的文件名）
+    Returns:
+        列表或行字典，两者都支持 len() / 下标访问 / random.choice
+    """
+    dict_path = os.path.join(dict_dir, key + DICT_SUFFIX)
+    if os.path.exists(dict_path):
+        return load_line_dictionary(dict_path)
+    yaml_path = os.path.join(dict_dir, yaml_file)
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        words = [str(entry) for entry in yaml.safe_load(f)[key]]
+    rule = DICT_ENTRY_RULES.get(key)
+    for entry in words:
+        check_entry(entry, rule, f"{yaml_path}: {key}")
+    return words
+
+
+def load_line_dictionary(path: str) -> LineDictionary:
+    """打开行字典并按文件名对应的规则校验全部条目"""
+    words = LineDictionary(path)
+    words.validate(dict_rule(path))
+    return words
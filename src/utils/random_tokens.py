@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+随机令牌服务
+Random Token Service
+
+各生成器不再逐个字符调用 random 拼接随机串，而是从批量填充的缓冲中按定长切片取用：
+- 数字/字母/字母数字串: 一次取一大块随机字节(getrandbits)，按字母表映射为字符（丢弃会产生偏差的字节值，分布均匀）
+- 字典抽样和整数范围: 一次取一批32位随机数，按 (随机数 * 字典大小) >> 32 映射为下标
+- 浮点数(金额、别名表抽样等): 同一批32位随机数除以 2^32，精度为 2^-32
+随机源为带种子的 random.Random，reseed 后同样的取用顺序得到同样的结果；
+缓冲每个线程各一份（与 CardSampler 相同），只有补充缓冲时加锁使用共享的随机源。
+"""
+
+import random
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+DIGITS = "0123456789"
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+ALPHANUMERICS = DIGITS + LETTERS
+
+# 每次补充的字符数 / 下标随机数个数
+BUFFER_CHARS = 65536
+BUFFER_WORDS = 4096
+
+# 32位无符号整数的数组类型
+_WORD_TYPE = "I" if array("I").itemsize == 4 else "L"
+
+
+def _byte_mapping(alphabet: str):
+    """字节值 -> 字母表字符的映射表，以及需要丢弃的字节值（使每个字符的概率相同）"""
+    size = len(alphabet)
+    if not 1 <= size <= 256:
+        raise ValueError(f"字母表长度必须在1-256之间: {size}")
+    limit = 256 - 256 % size
+    table = bytes(alphabet.encode("ascii")[value % size] for value in range(256))
+    return table, bytes(range(limit, 256))
+
+
+class RandomTokens:
+    """随机令牌服务类：批量填充随机缓冲，按定长切片返回随机串、字典元素和整数"""
+
+    def __init__(self, seed: Optional[int] = None, buffer_chars: int = BUFFER_CHARS,
+                 buffer_words: int = BUFFER_WORDS):
+        self.rng = random.Random(seed)
+        self.buffer_chars = buffer_chars
+        self.buffer_words = buffer_words
+        self._mappings: Dict[str, Any] = {}
+        # 缓冲每个线程各一份，取用不加锁；只有补充缓冲时加锁使用共享的随机源
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def reseed(self, seed: Optional[int]):
+        """重置随机种子并丢弃所有线程的缓冲"""
+        with self._lock:
+            self.rng = random.Random(seed)
+            self._local = threading.local()
+
+    @property
+    def _buffers(self) -> Dict[str, List[Any]]:
+        """当前线程的字符缓冲: 字母表 -> [随机串, 已取用位置]"""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
+
+    @_buffers.setter
+    def _buffers(self, buffers: Dict[str, List[Any]]):
+        self._local.buffers = buffers
+
+    def _random_bytes(self, size: int) -> bytes:
+        """size 个随机字节（调用方持有锁）"""
+        return self.rng.getrandbits(8 * size).to_bytes(size, "little")
+
+    def _fill_text(self, alphabet: str, width: int) -> str:
+        """生成至少 width 个字符的随机串"""
+        mapping = self._mappings.get(alphabet)
+        if mapping is None:
+            mapping = self._mappings[alphabet] = _byte_mapping(alphabet)
+        table, rejected = mapping
+        size = max(self.buffer_chars, width)
+        chunks = []
+        total = 0
+        with self._lock:
+            while total < size:
+                chunk = self._random_bytes(size).translate(table, rejected)
+                chunks.append(chunk)
+                total += len(chunk)
+        return b"".join(chunks).decode("ascii")
+
+    def token(self, alphabet: str, width: int) -> str:
+        """从字母表中随机取 width 个字符"""
+        try:
+            entry = self._local.buffers[alphabet]
+        except (AttributeError, KeyError):
+            entry = None
+        if entry is None or entry[1] + width > len(entry[0]):
+            entry = self._buffers[alphabet] = [self._fill_text(alphabet, width), 0]
+        position = entry[1]
+        entry[1] = position + width
+        return entry[0][position:position + width]
+
+    def digits(self, width: int) -> str:
+        """width 位随机数字"""
+        return self.token(DIGITS, width)
+
+    def letters(self, width: int) -> str:
+        """width 位随机大写字母"""
+        return self.token(LETTERS, width)
+
+    def alphanumerics(self, width: int) -> str:
+        """width 位随机数字和大写字母"""
+        return self.token(ALPHANUMERICS, width)
+
+    def _fill_words(self) -> List[int]:
+        """一批32位随机数（倒序存放，从尾部取用）"""
+        with self._lock:
+            words = array(_WORD_TYPE, self._random_bytes(4 * self.buffer_words)).tolist()
+        words.reverse()
+        return words
+
+    def _word(self) -> int:
+        """一个32位随机数"""
+        local = self._local
+        try:
+            return local.words.pop()
+        except (AttributeError, IndexError):
+            local.words = self._fill_words()
+            return local.words.pop()
+
+    def index(self, size: int) -> int:
+        """[0, size) 范围内的随机下标（size 不超过2^32）"""
+        return (self._word() * size) >> 32
+
+    def random(self) -> float:
+        """[0, 1) 范围内的随机浮点数"""
+        return self._word() / 4294967296
+
+    def uniform(self, low: float, high: float) -> float:
+        """[low, high) 范围内均匀分布的随机浮点数"""
+        return low + (high - low) * self.random()
+
+    def pick(self, sequence: Sequence[Any]) -> Any:
+        """从序列（列表、字符串或行字典）中随机取一个元素，序列为空时抛出 IndexError"""
+        return sequence[self.index(len(sequence))]
+
+    def number(self, low: int, high: int) -> int:
+        """[low, high] 范围内的随机整数（含两端）"""
+        return low + self.index(high - low + 1)
+
+    def getstate(self) -> Dict[str, Any]:
+        """随机源及当前线程缓冲的状态（可JSON序列化，用于检查点）"""
+        return {
+            "rng": self.rng.getstate(),
+            # 字符缓冲只保存未取用的部分
+            "buffers": {alphabet: [text[position:], 0] for alphabet, (text, position) in self._buffers.items()},
+            "words": list(getattr(self._local, "words", [])),
+        }
+
+    def setstate(self, state: Dict[str, Any]):
+        """恢复 getstate 保存的状态（经过JSON往返后元组会变成列表）"""
+        version, internal, gauss = state["rng"]
+        self.rng.setstate((version, tuple(internal), gauss))
+        self._buffers = {alphabet: list(entry) for alphabet, entry in state["buffers"].items()}
+        self._local.words = list(state["words"])
+
+    def __getstate__(self):
+        # 锁和线程局部缓冲不能跨进程传递，只保留当前线程的缓冲
+        state = self.__dict__.copy()
+        del state["_local"], state["_lock"]
+        state["buffers"] = self._buffers
+        state["words"] = getattr(self._local, "words", [])
+        return state
+
+    def __setstate__(self, state):
+        buffers = state.pop("buffers", {})
+        words = state.pop("words", [])
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffers = buffers
+        self._local.words = words
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+唯一号码生成工具
+提供基于带密钥置换（Feistel网络 + cycle-walking）的无碰撞号码生成：
+计数器 0, 1, 2, ... 经过置换映射到号段内的"随机"号码，
+不同计数器必然得到不同号码，因此无需在内存中保存已发放的号码。
+
+注意: 号码只由运行密钥和计数器决定，计数器不跨进程持久化，每次运行都从0开始。
+同一个运行密钥只在一次运行(一次命令调用，包括其检查点恢复)内保证不重复；
+在另一次运行中重用同一个密钥会重新发放相同的号码（指定种子复现文件时正是利用这一点），
+需要多次运行之间也不重复时，每次运行必须使用不同的密钥。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from txn_errors import ConfigError
+
+_MASK64 = (1 << 64) - 1
+_DIGITS = "0123456789"
+_ALNUM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class KeyedPermutation:
+    """带密钥的置换：[0, domain_size) 上的双射"""
+
+    def __init__(self, domain_size: int, key: bytes, rounds: int = 4):
+        """初始化置换
+        Args:
+            domain_size: 号段大小
+            key: 置换密钥
+            rounds: Feistel轮数（偶数）
+        """
+        if domain_size < 1:
+            raise ConfigError(f"号段大小必须大于0，当前值: {domain_size}")
+        self.domain_size = domain_size
+        bits = max((domain_size - 1).bit_length(), 2)
+        # 非平衡Feistel：左右两半位数可以不同，保证 2^bits < 2 * domain_size
+        u = bits // 2
+        self._v = bits - u
+        self._v_mask = (1 << self._v) - 1
+        # 每轮: (轮密钥, 本轮输出的位掩码)，偶数轮输出u位，奇数轮输出v位
+        self._rounds = tuple(
+            (int.from_bytes(hashlib.blake2b(key + bytes([i]), digest_size=8).digest(), "big"),
+             (1 << (u if i % 2 == 0 else self._v)) - 1)
+            for i in range(rounds)
+        )
+
+    def _encrypt(self, x: int) -> int:
+        """在 [0, 2^bits) 上做一次Feistel加密，轮函数为64位乘法混合"""
+        a, b = x >> self._v, x & self._v_mask
+        for round_key, mask in self._rounds:
+            y = ((b ^ round_key) * 0x9E3779B97F4A7C15) & _MASK64
+            a, b = b, (a + (y ^ (y >> 31))) & mask
+        return (a << self._v) | b
+
+    def permute(self, x: int) -> int:
+        """将 x 映射为号段内的另一个值（cycle-walking直到落回号段内）"""
+        if not 0 <= x < self.domain_size:
+            raise ConfigError(f"置换输入超出号段: {x}，号段大小: {self.domain_size}")
+        y = self._encrypt(x)
+        while y >= self.domain_size:
+            y = self._encrypt(y)
+        return y
+
+
+class UniqueNumberSequence:
+    """唯一号码序列：计数器 + 带密钥置换
+    多个进程使用相同密钥、不同分片(shard)时，各自发放的号码互不重叠。
+    """
+
+    def __init__(self, domain_size: int, key: bytes, shard: int = 0, shard_count: int = 1):
+        if not 0 <= shard < shard_count:
+            raise ConfigError(f"分片编号错误: {shard}，分片总数: {shard_count}")
+        self.permutation = KeyedPermutation(domain_size, key)
+        self.shard = shard
+        self.shard_count = shard_count
+        self.issued = 0
+        # 已发放数上限（由 UniqueDocumentNumbers.slice 设置），为空时只受号段大小限制
+        self.limit = None
+
+    def reserve(self) -> int:
+        """占用下一个计数器（置换前的序号）"""
+        index = self.issued * self.shard_count + self.shard
+        if index >= self.permutation.domain_size:
+            raise ConfigError(f"号段已耗尽，号段大小: {self.permutation.domain_size}")
+        if self.limit is not None and self.issued >= self.limit:
+            raise ConfigError(f"预留的号码块已用完: {self.limit}")
+        self.issued += 1
+        return index
+
+    def next(self) -> int:
+        """获取下一个唯一号码"""
+        return self.permutation.permute(self.reserve())
+
+
+class UniqueDocumentNumbers:
+    """文档号唯一模式的号码分配器
+    每种文档号格式对应一个号段，同一次运行(run_key相同)中所有文件、所有进程共享号段。
+    计数器不持久化：不同运行重用同一个 run_key 会重新发放相同的号码（见模块说明）。
+    """
+
+    # 号段名称: (号段大小, 位数, 字符集)
+    SPACES: Dict[str, Tuple[int, int, str]] = {
+        "hotel": (10 ** 7, 7, _DIGITS),             # 酒店: 888 + 7位数字
+        "standard": (9 * 10 ** 7, 8, _DIGITS),      # 火车/租车/邮轮/服务费/其他: 88 + 8位数字
+        "flight_m": (10 ** 10, 10, _DIGITS),        # M文件机票: 888 + 10位数字
+        "flight_b": (36 ** 7, 7, _ALNUM),           # B文件机票: IATA + 7位filekey + 空格
+        "flight_digits": (10 ** 8, 8, _DIGITS),     # 其他机票: IATA + 8位数字filekey
+    }
+
+    def __init__(self, run_key: Optional[str] = None, shard: int = 0, shard_count: int = 1):
+        """初始化分配器
+        Args:
+            run_key: 运行密钥，同一次多文件运行应使用相同的值，不同运行不能重用；为空时随机生成
+            shard: 当前分片编号（并行运行时每个进程一个）
+            shard_count: 分片总数
+        """
+        self.run_key = run_key if run_key is not None else os.urandom(16).hex()
+        self.shard = shard
+        self.shard_count = shard_count
+        self._sequences: Dict[str, UniqueNumberSequence] = {}
+        # 多个线程共用同一个分配器时，发放号码加锁
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _sequence(self, space: str) -> UniqueNumberSequence:
+        sequence = self._sequences.get(space)
+        if sequence is None:
+            if space not in self.SPACES:
+                raise ConfigError(f"未知的文档号号段: {space}")
+            domain_size = self.SPACES[space][0]
+            key = f"{self.run_key}:{space}".encode("utf-8")
+            sequence = UniqueNumberSequence(domain_size, key, self.shard, self.shard_count)
+            self._sequences[space] = sequence
+        return sequence
+
+    def reserve_block(self, size: int) -> Dict[str, int]:
+        """为每个号段占用接下来 size 个计数器（每条记录最多一个文档号），供并行写入的各范围分段使用
+        Returns:
+            Dict[str, int]: 号段名称 -> 块起始的已发放数
+        """
+        with self._lock:
+            starts = {}
+            for space in self.SPACES:
+                sequence = self._sequence(space)
+                starts[space] = sequence.issued
+                sequence.issued += size
+        return starts
+
+    def slice(self, starts: Dict[str, int], offset: int, size: int) -> "UniqueDocumentNumbers":
+        """取出 reserve_block 占用的块中 [offset, offset + size) 部分，作为独立的分配器（供一个工作进程使用）"""
+        part = UniqueDocumentNumbers(self.run_key, self.shard, self.shard_count)
+        for space, start in starts.items():
+            sequence = part._sequence(space)
+            sequence.issued = start + offset
+            sequence.limit = start + offset + size
+        return part
+
+    def next_token(self, space: str) -> str:
+        """获取指定号段的下一个唯一号码（定长字符串）"""
+        # 只有占用计数器需要加锁，置换计算在锁外进行
+        with self._lock:
+            sequence = self._sequence(space)
+            index = sequence.reserve()
+        value = sequence.permutation.permute(index)
+        _, width, alphabet = self.SPACES[space]
+        if space == "standard" and value >= 8 * 10 ** 7:
+            # 跳过8开头的号段：88 + 8xxxxxxx 会与酒店的 888 + 7位数字重叠
+            value += 10 ** 7
+        if alphabet is _DIGITS:
+            return f"{value:0{width}d}"
+        base = len(alphabet)
+        chars = []
+        for _ in range(width):
+            value, digit = divmod(value, base)
+            chars.append(alphabet[digit])
+        return "".join(reversed(chars))